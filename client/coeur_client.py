@@ -2,42 +2,159 @@
 # CLIENT FTAM - COEUR LOGIQUE
 # =================================================================
 import socket
-import json
 import os
 import base64
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from commun.constantes import *
+from commun.compression import ALGORITHMES, ESSAIS_COMPRESSION, compresser, decompresser, est_deja_compresse
+from commun.integrite import crc_bloc, nouvelle_empreinte, empreinte_fichier
+from commun.trames import LecteurTrames, envoyer_pdu
+
+# Primitives à réponse unique, sans flux ni transfert : elles seules peuvent être pipelinées
+PRIMITIVES_PIPELINE = {F_SELECT, F_DELETE, F_SET_PERMISSIONS}
 
 
 class ClientFTAM:
     """ Classe implémentant la logique métier du protocole FTAM côté client et encapsule les méthodes de connexion, de transfert et de gestion de session """
 
-    def __init__(self):
+    def __init__(self, binaire=True, taille_bloc=TAILLE_BLOC_PROPOSEE, fenetre=FENETRE_FLUX, compression=True):
         """ Initialise un client avec une socket inactive et un état de session vierge """
         self.socket = None
+        self.lecteur = None
         self.est_connecte = False
         self.session_id = None
         self.utilisateur = None
+        self.ip = None
+        self.mdp = None  # Conservé pour ouvrir les sessions d'un téléchargement parallèle
         self.role = None
         self.etat_actuel = "IDLE"
+        self.binaire_souhaite = binaire
+        self.binaire = False
+        self.taille_bloc_souhaitee = taille_bloc
+        self.taille_bloc = TAILLE_BLOC
+        self.fenetre = fenetre
+        self.compression_souhaitee = compression
+        self.compression = None  # Algorithme retenu par le serveur, None = blocs bruts
+        # Pipelining (soumettre) : identifiant -> (primitive, Future) des requêtes sans réponse
+        self.en_vol = {}
+        self.identifiants = itertools.count(1)
+        self.places_en_vol = threading.BoundedSemaphore(REQUETES_EN_VOL)
+        self.en_vol_lock = threading.Lock()
+        self.envoi_lock = threading.Lock()
+        self.lecture_fond = None  # Thread lisant les réponses tant que des requêtes sont en vol
 
-    def envoyer_requete(self, primitive, params=None):
-        """ Envoie une requête (PDU) au serveur et attend une réponse """
+    def envoyer_requete(self, primitive, params=None, donnees=None):
+        """ Envoie une requête (PDU) au serveur et attend une réponse
+        Les données binaires éventuelles voyagent brutes dans la même trame (mode binaire négocié) """
         if not self.socket:
             return {"erreur": "Non connecté"}
+        # Les réponses des requêtes pipelinées passent avant : la socket redevient à nous seuls
+        self.attendre_en_vol()
         try:
             requete = {K_PRIM: primitive, K_PARA: params or {}}
-            self.socket.send(json.dumps(requete).encode())
+            envoyer_pdu(self.socket, requete, donnees)
+        except Exception as e:
+            return {"erreur": f"Erreur réseau : {e}"}
+        reponse = self.recevoir_reponse()
+        if reponse.get(K_CODE) == SUCCES:
+            self.mettre_a_jour_etat(primitive)
+        return reponse
+
+    def recevoir_reponse(self):
+        """ Lit la prochaine PDU envoyée par le serveur (plusieurs PDU se suivent en mode flux)
+        Après un timeout ou une erreur, la connexion est fermée : une réponse arrivée en retard
+        serait sinon prise pour celle de la requête suivante """
+        if not self.socket:
+            return {"erreur": "Non connecté"}
+        try:
             self.socket.settimeout(5.0)
-            reponse_data = self.socket.recv(4096).decode()
-            reponse = json.loads(reponse_data)
-            if reponse.get(K_CODE) == SUCCES:
-                self.mettre_a_jour_etat(primitive)
+            reponse, donnees_recues = self.lecteur.recevoir_trame()
+            if reponse is None:
+                self.abandonner_connexion()
+                return {"erreur": "Connexion fermée par le serveur"}
+            if donnees_recues is not None:
+                reponse["donnees"] = donnees_recues
             return reponse
         except socket.timeout:
+            self.abandonner_connexion()
             return {"erreur": "Le serveur ne répond pas (Timeout)"}
         except Exception as e:
+            self.abandonner_connexion()
             return {"erreur": f"Erreur réseau : {e}"}
 
+    def abandonner_connexion(self):
+        """ Ferme une connexion dont le fil des réponses n'est plus sûr ; le client repasse déconnecté """
+        if self.socket:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+        self.socket = None
+        self.lecteur = None
+        self.est_connecte = False
+        self.etat_actuel = "IDLE"
+
+    def soumettre(self, primitive, params=None):
+        """ Envoie une requête sans attendre sa réponse et retourne un Future (résultat : la réponse)
+        Jusqu'à REQUETES_EN_VOL requêtes restent en vol ; un thread de fond associe les réponses par identifiant """
+        if primitive not in PRIMITIVES_PIPELINE:
+            raise ValueError(f"{primitive} ne peut pas être pipelinée")
+        futur = Future()
+        if not self.socket:
+            futur.set_result({"erreur": "Non connecté"})
+            return futur
+        self.places_en_vol.acquire()
+        identifiant = next(self.identifiants)
+        with self.en_vol_lock:
+            self.en_vol[identifiant] = (primitive, futur)
+            if self.lecture_fond is None:
+                self.lecture_fond = threading.Thread(target=self.lire_reponses, daemon=True)
+                self.lecture_fond.start()
+        try:
+            with self.envoi_lock:
+                envoyer_pdu(self.socket, {K_PRIM: primitive, K_PARA: params or {}, K_ID: identifiant})
+        except Exception as e:
+            self.conclure(identifiant, {"erreur": f"Erreur réseau : {e}"})
+        return futur
+
+    def conclure(self, identifiant, reponse):
+        """ Donne sa réponse à une requête en vol et libère sa place """
+        with self.en_vol_lock:
+            primitive, futur = self.en_vol.pop(identifiant, (None, None))
+        if futur is None:
+            return
+        self.places_en_vol.release()
+        if reponse.get(K_CODE) == SUCCES:
+            self.mettre_a_jour_etat(primitive)
+        futur.set_result(reponse)
+
+    def lire_reponses(self):
+        """ Thread de fond : lit les réponses tant que des requêtes sont en vol, puis s'arrête """
+        while True:
+            with self.en_vol_lock:
+                if not self.en_vol:
+                    self.lecture_fond = None
+                    return
+            reponse = self.recevoir_reponse()
+            if "erreur" in reponse:
+                # Connexion perdue ou serveur muet : toutes les requêtes en vol échouent
+                for identifiant in list(self.en_vol):
+                    self.conclure(identifiant, reponse)
+                continue
+            self.conclure(reponse.get(K_ID), reponse)
+
+    def attendre_en_vol(self):
+        """ Attend les réponses de toutes les requêtes pipelinées et l'arrêt du thread de fond """
+        lecture = self.lecture_fond
+        if lecture is not None and lecture is not threading.current_thread():
+            lecture.join()
+
+    def accorder_credit(self, blocs, recu):
+        """ Rend au serveur des crédits de flux F-READ et lui indique l'offset déjà écrit """
+        envoyer_pdu(self.socket, {K_PRIM: F_READ, K_PARA: {"credit": blocs, "recu": recu}})
+
     def mettre_a_jour_etat(self, primitive):
         """ Met à jour l'état actuel de la machine à états """
         if primitive == F_INITIALIZE:
@@ -56,27 +173,52 @@ class ClientFTAM:
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((ip, PORT_DEFAUT))
-            res = self.envoyer_requete(F_INITIALIZE, {"user": utilisateur, "mdp": mdp})
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.lecteur = LecteurTrames(self.socket)
+            res = self.envoyer_requete(
+                F_INITIALIZE,
+                {
+                    "user": utilisateur,
+                    "mdp": mdp,
+                    "binaire": self.binaire_souhaite,
+                    "taille_bloc": self.taille_bloc_souhaitee,
+                    "compression": ALGORITHMES if self.compression_souhaitee else [],
+                },
+            )
             if res.get(K_CODE) == SUCCES:
                 self.session_id = res.get("session_id")
                 self.role = res.get("role")
+                self.binaire = res.get("binaire", False)
+                self.taille_bloc = res.get("taille_bloc", TAILLE_BLOC)
+                self.compression = res.get("compression")
                 self.est_connecte = True
                 self.utilisateur = utilisateur
+                self.ip = ip
+                self.mdp = mdp
                 return {"succes": f"Connecté avec succès en tant que {utilisateur} ({self.role})"}
             else:
-                self.socket.close()
-                self.socket = None
+                self.abandonner_connexion()
+                if res.get(K_CODE) == ERREUR_SURCHARGE:
+                    return {"erreur": res.get(K_MESS)}
                 return {"erreur": "Échec d'authentification"}
         except Exception as e:
             return {"erreur": f"Connexion impossible : {e}"}
 
-    def lister_fichiers(self):
-        """ Liste les fichiers distants """
-        res = self.envoyer_requete(F_SELECT, {"nom": "."})
-        if res.get(K_CODE) == SUCCES:
-            return {"fichiers": res.get("fichiers", [])}
-        else:
-            return {"erreur": "Impossible de lister les fichiers"}
+    def lister_fichiers(self, prefixe="", limite=None):
+        """ Liste les fichiers distants, page par page
+        Avec une limite, seule la première page est retournée avec le curseur "suivant" """
+        fichiers = []
+        params = {"nom": ".", "prefixe": prefixe}
+        if limite:
+            params["limite"] = limite
+        while True:
+            res = self.envoyer_requete(F_SELECT, params)
+            if res.get(K_CODE) != SUCCES:
+                return {"erreur": "Impossible de lister les fichiers"}
+            fichiers.extend(res.get("fichiers", []))
+            if limite or not res.get("suivant"):
+                return {"fichiers": fichiers, "suivant": res.get("suivant")}
+            params["apres"] = res["suivant"]
 
     def telecharger(self, nom_f, offset=0):
         """ Télécharge un fichier distant, reprend automatiquement si offset fourni """
@@ -95,21 +237,38 @@ class ClientFTAM:
         if not os.path.exists(dossier_utilisateur):
             os.makedirs(dossier_utilisateur)
 
-        mode_ouverture = "ab" if offset > 0 else "wb"
         chemin_fichier = os.path.join(dossier_utilisateur, nom_f)
+        reprise = offset > 0 and os.path.exists(chemin_fichier)
+        mode_ouverture = "r+b" if reprise else "wb"
+        # Empreinte calculée au fil de l'écriture, comparée à celle annoncée par F-OPEN
+        empreinte = empreinte_fichier(chemin_fichier, offset) if reprise else nouvelle_empreinte()
+        offset = offset if reprise else 0
 
         with open(chemin_fichier, mode_ouverture) as f:
-            if offset > 0:
+            if reprise:
+                # Tout ce qui dépasse le point de reprise du serveur sera renvoyé
+                f.truncate(offset)
                 f.seek(offset)
             telecharge = offset
+            # Flux F-READ : le serveur envoie une fenêtre de blocs d'avance,
+            # le client rend du crédit au fil de l'écriture
+            seuil_credit = max(1, self.fenetre // 2)
+            consommes = 0
+            res = self.envoyer_requete(F_READ, {"flux": True, "fenetre": self.fenetre, "offset": offset})
             while True:
-                res = self.envoyer_requete(F_READ)
                 if not res:
                     return {"erreur": "Erreur de lecture"}
                 if res.get(K_STAT) == "DONNÉES":
-                    bloc = base64.b64decode(res.get("data"))
+                    bloc = self.extraire_bloc(res)
+                    if bloc is None:
+                        return {"erreur": f"Bloc corrompu à l'offset {res.get('offset')}"}
                     f.write(bloc)
+                    empreinte.update(bloc)
                     telecharge += len(bloc)
+                    consommes += 1
+                    if consommes >= seuil_credit:
+                        self.accorder_credit(consommes, telecharge)
+                        consommes = 0
                     if self.taille_fichier > 0:
                         pourcent = (telecharge / self.taille_fichier) * 100
                         print( f"Téléchargé : {telecharge} / {self.taille_fichier} bytes ({pourcent:.2f}%)",end="\r",)
@@ -117,26 +276,174 @@ class ClientFTAM:
                     print(f"Téléchargement de '{nom_f}' terminé. Total : {telecharge} bytes")
                     break
                 else:
-                    return {"erreur": res.get(K_MESS)}
+                    return {"erreur": res.get(K_MESS) or res.get("erreur")}
+                res = self.recevoir_reponse()
+        self.mettre_a_jour_etat(F_READ)
+        if res_open.get("empreinte") and empreinte.hexdigest() != res_open["empreinte"]:
+            return {"erreur": f"Empreinte de '{nom_f}' différente de celle du serveur"}
         return {"succes": f"Téléchargement de '{nom_f}' terminé"}
 
+    def telecharger_parallele(self, nom_f, nb_flux=NB_FLUX_PARALLELES):
+        """ Télécharge un fichier par plages d'octets sur plusieurs sessions simultanées
+        Chaque plage est écrite à sa place (os.pwrite) dans un fichier local préalloué """
+        if nb_flux <= 1 or not hasattr(os, "pwrite"):
+            return self.telecharger(nom_f)
+
+        res_select = self.envoyer_requete(F_SELECT, {"nom": nom_f})
+        if not res_select or res_select.get(K_CODE) != SUCCES:
+            return {"erreur": f"Fichier '{nom_f}' introuvable sur le serveur."}
+        # Identifiant commun à toutes les sessions : le journal d'accès du serveur
+        # y rattache le résumé de chaque plage
+        transfert = os.urandom(8).hex()
+        res_open = self.envoyer_requete(F_OPEN, {"transfert": transfert})
+        if not res_open or res_open.get(K_CODE) != SUCCES:
+            return {"erreur": "Impossible d'ouvrir le fichier distant."}
+        self.taille_fichier = taille = res_open.get("taille", 0)
+
+        # Plages contiguës alignées sur la taille de bloc, une par session
+        taille_plage = -(-taille // nb_flux)
+        taille_plage = max(1, -(-taille_plage // self.taille_bloc)) * self.taille_bloc
+        plages = [(debut, min(taille_plage, taille - debut)) for debut in range(0, taille, taille_plage)]
+        plages = plages or [(0, 0)]
+
+        # La session courante lit la première plage, les autres sont ouvertes pour l'occasion
+        sessions = [self]
+        try:
+            for _ in plages[1:]:
+                session = ClientFTAM(
+                    self.binaire_souhaite, self.taille_bloc_souhaitee, self.fenetre, self.compression_souhaitee
+                )
+                if "erreur" in session.connecter(self.ip, self.utilisateur, self.mdp):
+                    break
+                sessions.append(session)
+                if (
+                    session.envoyer_requete(F_SELECT, {"nom": nom_f}).get(K_CODE) != SUCCES
+                    or session.envoyer_requete(F_OPEN, {"transfert": transfert}).get(K_CODE) != SUCCES
+                ):
+                    sessions.pop().quitter()
+                    break
+            if len(sessions) < len(plages):
+                # Serveur saturé ou fichier verrouillé entre-temps : repli sur la seule session courante,
+                # qui resélectionne le fichier et rend ainsi le verrou de sa première ouverture
+                print(f"[Info] Sessions supplémentaires indisponibles : téléchargement de '{nom_f}' sur un seul flux")
+                for session in sessions[1:]:
+                    session.quitter()
+                del sessions[1:]
+                return self.telecharger(nom_f)
+
+            dossier_utilisateur = os.path.join("telechargements", self.utilisateur)
+            os.makedirs(dossier_utilisateur, exist_ok=True)
+            chemin_fichier = os.path.join(dossier_utilisateur, nom_f)
+            fd = os.open(chemin_fichier, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                if taille and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, taille)
+                else:
+                    os.ftruncate(fd, taille)
+                with ThreadPoolExecutor(max_workers=len(plages)) as pool:
+                    erreurs = list(
+                        pool.map(
+                            lambda session, plage: session.recevoir_plage(fd, *plage),
+                            sessions,
+                            plages,
+                        )
+                    )
+            finally:
+                os.close(fd)
+        finally:
+            for session in sessions[1:]:
+                session.quitter()
+
+        erreurs = [e for e in erreurs if e]
+        if erreurs:
+            return {"erreur": erreurs[0]}
+        # Les plages arrivent dans le désordre : l'empreinte est calculée sur le fichier reconstitué
+        if res_open.get("empreinte") and empreinte_fichier(chemin_fichier).hexdigest() != res_open["empreinte"]:
+            return {"erreur": f"Empreinte de '{nom_f}' différente de celle du serveur"}
+        print(f"Téléchargement de '{nom_f}' terminé ({len(plages)} flux). Total : {taille} bytes")
+        return {"succes": f"Téléchargement de '{nom_f}' terminé"}
+
+    def recevoir_plage(self, fd, debut, longueur):
+        """ Reçoit la plage [debut, debut + longueur[ du fichier ouvert et l'écrit à sa place dans fd
+        Retourne None si la plage est complète, sinon le message d'erreur """
+        seuil_credit = max(1, self.fenetre // 2)
+        consommes = 0
+        recu = debut
+        res = self.envoyer_requete(
+            F_READ, {"flux": True, "fenetre": self.fenetre, "offset": debut, "longueur": longueur}
+        )
+        while True:
+            if res.get(K_STAT) == "DONNÉES":
+                bloc = self.extraire_bloc(res)
+                if bloc is None:
+                    return f"Bloc corrompu à l'offset {res.get('offset')}"
+                os.pwrite(fd, bloc, res["offset"])
+                recu += len(bloc)
+                consommes += 1
+                if consommes >= seuil_credit:
+                    self.accorder_credit(consommes, recu)
+                    consommes = 0
+            elif res.get(K_STAT) == "FIN":
+                self.mettre_a_jour_etat(F_READ)
+                return None
+            else:
+                return res.get(K_MESS) or res.get("erreur") or "Erreur de lecture"
+            res = self.recevoir_reponse()
+
+    def extraire_bloc(self, res):
+        """ Retourne les octets d'une réponse DONNÉES, brute (mode binaire) ou encodée en base64,
+        décompressés si le serveur a compressé le bloc ; None si le CRC du bloc ne correspond pas """
+        if "donnees" in res:
+            bloc = res["donnees"]
+        else:
+            bloc = base64.b64decode(res.get("data"))
+        if res.get("compression"):
+            bloc = decompresser(res["compression"], bloc, self.taille_bloc)
+        if "crc" in res and crc_bloc(bloc) != res["crc"]:
+            return None
+        return bloc
+
     def reprendre_telechargement(self, nom_fichier):
         """ Permet de reprendre un téléchargement à partir de l'offset fourni par le serveur """
-        res = self.envoyer_requete(F_RECOVER)
+        res = self.envoyer_requete(F_RECOVER, {"nom": nom_fichier})
         if res.get(K_CODE) == SUCCES:
             offset = int(res.get("offset", 0))
+            if offset and not self.copie_partielle_valide(nom_fichier, res):
+                print("[INFO] Copie locale différente de celle du serveur : téléchargement depuis le début")
+                offset = 0
             print(f"[INFO] Reprise à partir de {offset} octets")
             return self.telecharger(nom_fichier, offset=offset)
         else:
             return {"erreur": res.get(K_MESS)}
 
+    def copie_partielle_valide(self, nom_fichier, res):
+        """ Vérifie la copie locale d'un téléchargement interrompu à l'aide du CRC de son dernier bloc
+        (annoncé par F-RECOVER), sans relire tout le fichier """
+        chemin_fichier = os.path.join("telechargements", self.utilisateur, nom_fichier)
+        offset = int(res.get("offset", 0))
+        debut = int(res.get("debut_crc", offset))
+        try:
+            if os.path.getsize(chemin_fichier) < offset:
+                return False
+            with open(chemin_fichier, "rb") as f:
+                f.seek(debut)
+                return "crc" not in res or crc_bloc(f.read(offset - debut)) == res["crc"]
+        except OSError:
+            return False
+
     def quitter(self):
         """ Ferme proprement la session FTAM """
         if self.socket and self.est_connecte:
             self.envoyer_requete(F_TERMINATE)
             self.socket.close()
+        self.attendre_en_vol()
         self.socket = None
+        self.lecteur = None
         self.est_connecte = False
+        self.mdp = None
+        self.compression = None
+        self.binaire = False
+        self.taille_bloc = TAILLE_BLOC
         self.etat_actuel = "IDLE"
         print(f"[Info] Fermeture de la session cliente .....")
 
@@ -148,37 +455,106 @@ class ClientFTAM:
         else:
             return {"erreur": res.get(K_MESS)}
 
-    def uploader(self, chemin_local, nom_distant, permissions_read=None, permissions_delete=None):
-        """ Upload d'un fichier local vers le serveur par blocs """
+    def uploader(self, chemin_local, nom_distant, permissions_read=None, permissions_delete=None, offset=0):
+        """ Upload d'un fichier local vers le serveur par blocs, repris à offset si fourni
+        Les blocs sont envoyés en flux : le client n'attend un acquittement que lorsque sa fenêtre est pleine """
         if not os.path.exists(chemin_local):
             return {"erreur": f"Fichier local '{chemin_local}' introuvable"}
 
+        res = self.envoyer_requete(
+            F_WRITE, {"nom": nom_distant, "flux": True, "fenetre": self.fenetre, "offset": offset}
+        )
+        if res.get(K_CODE) != SUCCES:
+            return {"erreur": res.get(K_MESS) or res.get("erreur")}
+
         taille = os.path.getsize(chemin_local)
-        envoye = 0
-        with open(chemin_local, "rb") as f:
-            while bloc := f.read(TAILLE_BLOC):
-                bloc_b64 = base64.b64encode(bloc).decode("utf-8")
-                res = self.envoyer_requete(
-                    F_WRITE, {"nom": nom_distant, "data": bloc_b64}
-                )
-                if res.get(K_CODE) != SUCCES:
-                    return {"erreur": res.get(K_MESS)}
-                envoye += len(bloc)
-                pourcent = (envoye / taille) * 100
-                print(f"Upload : {envoye}/{taille} bytes ({pourcent:.2f}%)", end="\r")
+        envoye = offset
+        # Empreinte du fichier local, comparée à celle que le serveur calcule à la réception
+        empreinte = empreinte_fichier(chemin_local, offset)
+        blocs_envoyes = 0
+        blocs_acquittes = 0
+        rejet = None  # Premier bloc refusé par le serveur : l'envoi s'arrête là
+        # Les blocs sont compressés tant qu'ils y gagnent (jamais pour un format déjà compressé)
+        essais = ESSAIS_COMPRESSION if self.compression and not est_deja_compresse(chemin_local) else 0
+        try:
+            with open(chemin_local, "rb") as f:
+                f.seek(offset)
+                while not rejet and (bloc := f.read(self.taille_bloc)):
+                    empreinte.update(bloc)
+                    compresse = compresser(self.compression, bloc) if essais else None
+                    if essais:
+                        essais = ESSAIS_COMPRESSION if compresse else essais - 1
+                    params = {"nom": nom_distant, "crc": crc_bloc(bloc)}
+                    if compresse:
+                        self.envoyer_bloc(dict(params, compression=self.compression), compresse)
+                    else:
+                        self.envoyer_bloc(params, bloc)
+                    blocs_envoyes += 1
+                    while blocs_envoyes - blocs_acquittes >= self.fenetre:
+                        res = self.recevoir_reponse()
+                        if "erreur" in res:
+                            return res
+                        if res.get(K_STAT) != "ACK":
+                            rejet = res
+                            break
+                        blocs_acquittes = res.get("blocs", blocs_acquittes)
+                    envoye += len(bloc)
+                    pourcent = (envoye / taille) * 100
+                    print(f"Upload : {envoye}/{taille} bytes ({pourcent:.2f}%)", end="\r")
 
-        params_fin = {"nom": nom_distant, "fin": True}
-        if permissions_read is not None:
-            params_fin["permissions_read"] = permissions_read
-        if permissions_delete is not None:
-            params_fin["permissions_delete"] = permissions_delete
+            if rejet:
+                # Le serveur écarte les blocs encore en route jusqu'à cette conclusion
+                params_fin = {"nom": nom_distant, "annuler": True}
+            else:
+                # Le serveur compare son empreinte à celle-ci avant de publier le fichier
+                params_fin = {"nom": nom_distant, "fin": True, "empreinte": empreinte.hexdigest()}
+                if permissions_read is not None:
+                    params_fin["permissions_read"] = permissions_read
+                if permissions_delete is not None:
+                    params_fin["permissions_delete"] = permissions_delete
+            envoyer_pdu(self.socket, {K_PRIM: F_WRITE, K_PARA: params_fin})
+        except Exception as e:
+            return {"erreur": f"Erreur réseau : {e}"}
 
-        res_fin = self.envoyer_requete(F_WRITE, params_fin)
+        # Les derniers acquittements par lot (et un éventuel rejet) précèdent la réponse finale :
+        # tous sont lus pour laisser la connexion synchronisée
+        res_fin = self.recevoir_reponse()
+        while res_fin.get(K_STAT) in ("ACK", "REJET"):
+            if res_fin[K_STAT] == "REJET":
+                rejet = rejet or res_fin
+            res_fin = self.recevoir_reponse()
+        if rejet:
+            return {"erreur": f"Upload interrompu à l'offset {rejet.get('offset')} : {rejet.get(K_MESS)}"}
         if res_fin.get(K_CODE) == SUCCES:
+            if res_fin.get("empreinte") and res_fin["empreinte"] != empreinte.hexdigest():
+                return {"erreur": f"Empreinte de '{nom_distant}' différente sur le serveur"}
             print(f"\nUpload de '{nom_distant}' terminé.")
             return {"succes": f"Fichier '{nom_distant}' uploadé avec succès"}
         else:
-            return {"erreur": res_fin.get(K_MESS)}
+            return {"erreur": res_fin.get(K_MESS) or res_fin.get("erreur")}
+
+    def offset_upload(self, nom_distant):
+        """ Octets déjà reçus par le serveur pour un upload interrompu, None s'il n'y en a pas """
+        res = self.envoyer_requete(F_RECOVER, {"sens": "ecriture", "nom": nom_distant})
+        if res.get(K_CODE) == SUCCES:
+            return int(res.get("offset", 0))
+        return None
+
+    def reprendre_upload(self, chemin_local, nom_distant, permissions_read=None, permissions_delete=None):
+        """ Reprend un upload interrompu à l'offset confirmé par le serveur """
+        if not os.path.exists(chemin_local):
+            return {"erreur": f"Fichier local '{chemin_local}' introuvable"}
+        offset = min(self.offset_upload(nom_distant) or 0, os.path.getsize(chemin_local))
+        print(f"[INFO] Reprise de l'upload à partir de {offset} octets")
+        return self.uploader(chemin_local, nom_distant, permissions_read, permissions_delete, offset=offset)
+
+    def envoyer_bloc(self, params, bloc):
+        """ Envoie un bloc F-WRITE sans attendre de réponse (brut en mode binaire, sinon en base64) """
+        if self.binaire:
+            envoyer_pdu(self.socket, {K_PRIM: F_WRITE, K_PARA: params}, bloc)
+        else:
+            params = dict(params, data=base64.b64encode(bloc).decode("utf-8"))
+            envoyer_pdu(self.socket, {K_PRIM: F_WRITE, K_PARA: params})
 
     def set_permissions(self, nom_fichier, permissions_read=None, permissions_delete=None ):
         """ Modifie les permissions d'un fichier existant, aucune permission n'est spécifiée, retourne une erreur """
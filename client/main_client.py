@@ -160,9 +160,18 @@ def ajouter_fichier(client):
             permissions_delete = [u.strip() for u in delete_input.split(",")]
 
     client.envoyer_requete(F_SELECT, {"nom": nom_distant}) 
-    res = client.uploader(
-        chemin_local, nom_distant, permissions_read, permissions_delete
-    )
+    deja_recu = client.offset_upload(nom_distant)
+    reprise = False
+    if deja_recu:
+        reprise = input(f"Un upload interrompu de {deja_recu} octets existe. Le reprendre ? (o/n) : ").strip().lower() == "o"
+    if reprise:
+        res = client.reprendre_upload(
+            chemin_local, nom_distant, permissions_read, permissions_delete
+        )
+    else:
+        res = client.uploader(
+            chemin_local, nom_distant, permissions_read, permissions_delete
+        )
     if "erreur" in res:
         print(f"[ERREUR] {res['erreur']}")
     else:
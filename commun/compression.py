@@ -0,0 +1,72 @@
+# =================================================================
+# COMPRESSION DES BLOCS DE DONNÉES (NÉGOCIÉE À F-INITIALIZE)
+# =================================================================
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Dépendance facultative : zlib reste toujours disponible
+    zstandard = None
+
+# Algorithmes connus, par ordre de préférence
+ALGORITHMES = (["zstd"] if zstandard else []) + ["zlib"]
+
+NIVEAU_ZLIB = 6
+NIVEAU_ZSTD = 3
+# Un bloc n'est envoyé compressé que s'il gagne au moins ce ratio
+RATIO_UTILE = 0.9
+# Après ce nombre de blocs incompressibles consécutifs, le reste du fichier part tel quel
+ESSAIS_COMPRESSION = 4
+
+# Formats déjà compressés : inutile d'essayer
+EXTENSIONS_COMPRESSEES = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic", ".heif",
+    ".mp3", ".mp4", ".m4a", ".mov", ".avi", ".mkv", ".ogg",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".docx", ".xlsx", ".pptx", ".odt",
+}
+
+
+def negocier(proposes):
+    """ Retourne le premier algorithme proposé par le client que l'on sait traiter, None sinon """
+    if not isinstance(proposes, list):
+        return None
+    for algo in proposes:
+        if algo in ALGORITHMES:
+            return algo
+    return None
+
+
+def est_deja_compresse(nom):
+    """ Indique si le nom désigne un format déjà compressé """
+    return os.path.splitext(nom or "")[1].lower() in EXTENSIONS_COMPRESSEES
+
+
+def compresser(algo, donnees):
+    """ Retourne le bloc compressé, ou None si la compression ne fait pas gagner assez """
+    if algo == "zstd":
+        resultat = zstandard.ZstdCompressor(level=NIVEAU_ZSTD).compress(donnees)
+    else:
+        resultat = zlib.compress(donnees, NIVEAU_ZLIB)
+    if len(resultat) > len(donnees) * RATIO_UTILE:
+        return None
+    return resultat
+
+
+def decompresser(algo, donnees, taille_max):
+    """ Décompresse un bloc reçu, sans jamais produire plus de taille_max octets """
+    if algo == "zlib":
+        decompresseur = zlib.decompressobj()
+        resultat = decompresseur.decompress(donnees, taille_max)
+        if decompresseur.unconsumed_tail or not decompresseur.eof:
+            raise ValueError(f"Bloc compressé invalide ou supérieur à {taille_max} octets")
+        return resultat
+    if algo == "zstd" and zstandard:
+        if zstandard.frame_content_size(donnees) > taille_max:
+            raise ValueError(f"Bloc compressé supérieur à {taille_max} octets")
+        resultat = zstandard.ZstdDecompressor().decompress(donnees, max_output_size=taille_max)
+        if len(resultat) > taille_max:
+            raise ValueError(f"Bloc compressé supérieur à {taille_max} octets")
+        return resultat
+    raise ValueError(f"Compression '{algo}' non négociée")
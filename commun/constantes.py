@@ -12,7 +12,16 @@ F_SET_PERMISSIONS = "F-SET-PERMISSIONS"
 # --- Configuration Réseau ---
 PORT_DEFAUT = 2121
 ADRESSE_ECOUTE = "0.0.0.0"
-TAILLE_BLOC = 1024
+TAILLE_BLOC = 1024  # Taille par défaut (clients ne proposant pas de taille)
+TAILLE_BLOC_MIN = 4 * 1024  # Bornes de la taille de bloc négociée à F-INITIALIZE
+TAILLE_BLOC_MAX = 4 * 1024 * 1024
+TAILLE_BLOC_PROPOSEE = 256 * 1024  # Taille proposée par défaut par le client
+TAILLE_PAGE_LISTE = 1000  # Nombre maximal de noms par réponse F-SELECT "."
+FENETRE_FLUX = 8  # Nombre de blocs F-READ envoyés d'avance en mode flux
+NB_FLUX_PARALLELES = 4  # Sessions ouvertes par le client pour un téléchargement parallèle
+REQUETES_EN_VOL = 64  # Requêtes pipelinées par le client (soumettre) en attente de réponse
+TAILLE_MAX_TRAME = 16 * 1024 * 1024  # Taille maximale d'une PDU tramée
+DELAI_VERROU = 2.0  # Attente maximale (s) d'un verrou de fichier avant de répondre 423
 
 # Codes de statut
 SUCCES = 200
@@ -20,6 +29,7 @@ ERREUR_AUTH = 401
 ERREUR_DROITS = 403
 ERREUR_NON_TROUVE = 404
 ERREUR_VERROU = 423
+ERREUR_SURCHARGE = 503
 
 # Clés de structure 
 K_PRIM = "primitive"
@@ -27,13 +37,14 @@ K_PARA = "parametres"
 K_STAT = "statut"
 K_CODE = "code"
 K_MESS = "message"
+K_ID = "id"  # Identifiant facultatif choisi par le client, renvoyé tel quel dans la réponse
 
 # États de la Machine à États
 ETATS = ["IDLE", "INITIALIZED", "SELECTED", "OPEN"]
 
 # --- Structures de donnes echnger ---
-# Modèle de requête
-REQ_STRUCT = {"primitive": "", "parametres": {}}
+# Modèle de requête ("id" facultatif : plusieurs requêtes en vol sur une même connexion)
+REQ_STRUCT = {"primitive": "", "parametres": {}, "id": None}
 
-# Modèle de réponse 
-RES_STRUCT = {"statut": "", "code": 0, "message": ""}
+# Modèle de réponse ("id" présent si la requête en portait un)
+RES_STRUCT = {"statut": "", "code": 0, "message": "", "id": None}
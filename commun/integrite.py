@@ -0,0 +1,34 @@
+# =================================================================
+# CONTRÔLE D'INTÉGRITÉ DES TRANSFERTS (CRC PAR BLOC, EMPREINTE DU FICHIER)
+# =================================================================
+import hashlib
+import zlib
+
+TAILLE_EMPREINTE = 32  # BLAKE2b sur 256 bits
+TAILLE_LECTURE = 1024 * 1024
+
+
+def nouvelle_empreinte():
+    """ Empreinte BLAKE2b incrémentale d'un fichier (update() au fil des blocs, hexdigest() à la fin) """
+    return hashlib.blake2b(digest_size=TAILLE_EMPREINTE)
+
+
+def crc_bloc(donnees):
+    """ Somme de contrôle d'un bloc (données décompressées) """
+    return zlib.crc32(donnees)
+
+
+def empreinte_fichier(chemin, taille=None, empreinte=None):
+    """ Ajoute à empreinte (nouvelle par défaut) les taille premiers octets du fichier (tout s'il vaut None)
+    Retourne l'empreinte, à compléter ou à conclure par hexdigest() """
+    empreinte = empreinte or nouvelle_empreinte()
+    reste = taille
+    with open(chemin, "rb") as f:
+        while reste is None or reste > 0:
+            morceau = f.read(TAILLE_LECTURE if reste is None else min(TAILLE_LECTURE, reste))
+            if not morceau:
+                break
+            empreinte.update(morceau)
+            if reste is not None:
+                reste -= len(morceau)
+    return empreinte
@@ -0,0 +1,135 @@
+# =================================================================
+# COUCHE DE TRAMAGE DES PDU
+# =================================================================
+import json
+import os
+import select
+import socket
+import struct
+
+from commun.constantes import TAILLE_MAX_TRAME
+
+# En-tête de trame (ordre réseau) :
+#   - longueur de l'en-tête de contrôle JSON (4 octets)
+#   - longueur des données binaires brutes qui le suivent (4 octets, 0 si aucune)
+ENTETE_TRAME = struct.Struct("!II")
+
+
+# Indique au noyau que la suite de la trame arrive (en-tête et données partent ensemble)
+MSG_MORE = getattr(socket, "MSG_MORE", 0)
+
+
+class ErreurTrame(Exception):
+    """ Levée lorsqu'une trame reçue est invalide ou dépasse la taille autorisée """
+
+
+class PlageFichier:
+    """ Données d'une trame lues directement dans un fichier ouvert, envoyées sans copie (sendfile)
+    Le fichier fournit fileno() et lire(offset, taille) pour les systèmes sans sendfile """
+
+    __slots__ = ("fichier", "offset", "longueur")
+
+    def __init__(self, fichier, offset, longueur):
+        self.fichier = fichier
+        self.offset = offset
+        self.longueur = longueur
+
+    def __len__(self):
+        return self.longueur
+
+
+def encoder_pdu(pdu, taille_donnees=0):
+    """ Sérialise une PDU en en-tête de trame suivi du JSON de contrôle """
+    charge = json.dumps(pdu).encode()
+    if len(charge) + taille_donnees > TAILLE_MAX_TRAME:
+        raise ErreurTrame(f"PDU trop volumineuse ({len(charge) + taille_donnees} octets)")
+    return ENTETE_TRAME.pack(len(charge), taille_donnees) + charge
+
+
+def _envoyer_morceaux(sock, morceaux):
+    """ Envoie plusieurs tampons d'un seul appel (scatter/gather) sans les concaténer """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(morceaux))
+        return
+    vues = [memoryview(m).cast("B") for m in morceaux if len(m)]
+    while vues:
+        envoye = sock.sendmsg(vues)
+        while vues and envoye >= len(vues[0]):
+            envoye -= len(vues.pop(0))
+        if vues and envoye:
+            vues[0] = vues[0][envoye:]
+
+
+def envoyer_pdu(sock, pdu, donnees=None):
+    """ Envoie une PDU complète, éventuellement suivie de données binaires brutes """
+    if not donnees:
+        sock.sendall(encoder_pdu(pdu))
+        return
+    if isinstance(donnees, PlageFichier) and not hasattr(os, "sendfile"):
+        donnees = donnees.fichier.lire(donnees.offset, donnees.longueur)
+    if isinstance(donnees, PlageFichier):
+        # Le noyau copie le fichier vers la socket : pas de lecture en espace utilisateur
+        sock.sendall(encoder_pdu(pdu, len(donnees)), MSG_MORE)
+        envoye = sock.sendfile(donnees.fichier, donnees.offset, donnees.longueur)
+        if envoye != donnees.longueur:
+            raise ErreurTrame(f"Fichier tronqué pendant l'envoi ({envoye}/{donnees.longueur} octets)")
+        return
+    _envoyer_morceaux(sock, [encoder_pdu(pdu, len(donnees)), donnees])
+
+
+class LecteurTrames:
+    """ Tampon de réassemblage qui découpe le flux TCP en PDU complètes """
+
+    def __init__(self, sock, taille_recv=65536):
+        self.sock = sock
+        self.taille_recv = taille_recv
+        self.tampon = bytearray()
+
+    def _remplir(self, n):
+        """ Lit la socket jusqu'à disposer d'au moins n octets, False si fermeture """
+        while len(self.tampon) < n:
+            morceau = self.sock.recv(max(self.taille_recv, n - len(self.tampon)))
+            if not morceau:
+                return False
+            self.tampon += morceau
+        return True
+
+    def _lire_donnees(self, n):
+        """ Extrait n octets de données brutes, en lisant directement dans leur tampon final """
+        donnees = bytearray(n)
+        deja = min(n, len(self.tampon))
+        donnees[:deja] = self.tampon[:deja]
+        del self.tampon[:deja]
+        vue = memoryview(donnees)
+        while deja < n:
+            recu = self.sock.recv_into(vue[deja:])
+            if not recu:
+                return None
+            deja += recu
+        return donnees
+
+    def donnees_en_attente(self):
+        """ Indique, sans bloquer, si des octets sont déjà disponibles en lecture """
+        if self.tampon:
+            return True
+        lisibles, _, _ = select.select([self.sock], [], [], 0)
+        return bool(lisibles)
+
+    def recevoir_trame(self):
+        """ Retourne (pdu, donnees) pour la prochaine trame, (None, None) si fermeture """
+        if not self._remplir(ENTETE_TRAME.size):
+            return None, None
+        taille_json, taille_donnees = ENTETE_TRAME.unpack_from(self.tampon)
+        if taille_json + taille_donnees > TAILLE_MAX_TRAME:
+            raise ErreurTrame(f"Trame annoncée trop volumineuse ({taille_json + taille_donnees} octets)")
+        fin = ENTETE_TRAME.size + taille_json
+        if not self._remplir(fin):
+            return None, None
+        pdu = json.loads(bytes(self.tampon[ENTETE_TRAME.size:fin]))
+        del self.tampon[:fin]
+        donnees = None
+        if taille_donnees:
+            donnees = self._lire_donnees(taille_donnees)
+            if donnees is None:
+                return None, None
+        return pdu, donnees
@@ -1,25 +1,189 @@
+import bisect
 import json
 import os
+import sqlite3
+import threading
+import time
 
+from serveur.gestion_fichiers import preparer_empreinte, signature_document, verifier_existence
+
+# Ancien stockage des droits, importé une seule fois à la création de la base
 META_PATH = os.path.join(os.path.dirname(__file__), "stockage", ".meta.json")
+# Base SQLite (mode WAL), hors de la racine servie pour ne pas être téléchargeable
+BASE_PATH = os.path.join(os.path.dirname(__file__), "meta.db")
+VERSION_SCHEMA = 2
+
+# Intervalle (s) entre deux vérifications des modifications externes de la base
+VALIDITE_CACHE = 1.0
+
+# Cache des métadonnées partagé par toutes les sessions du processus.
+# Chaque entrée est remplacée d'un bloc et jamais modifiée en place, ce qui permet
+# aux lecteurs de consulter une entrée sans prendre de verrou.
+_CACHE = {"meta": None, "data_version": None, "verifie_le": 0.0, "version": 0}
+# Protège la connexion SQLite (partagée) et le parcours du cache
+META_LOCK = threading.Lock()
+_BASE = {"connexion": None}
+
+# Index inversé : utilisateur -> liste triée des fichiers présents qu'il peut lire.
+# Reconstruit quand le cache est rechargé depuis la base, mis à jour fichier
+# par fichier (indexer_fichier / desindexer_fichier) pour les écritures du serveur.
+_INDEX = {"version": None, "lisibles": {}}
+INDEX_LOCK = threading.Lock()
+
+
+def _migrer(conn):
+    """ Crée ou met à jour le schéma ; .meta.json est importé si la base est neuve (une seule fois) """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fichiers ("
+                " nom TEXT PRIMARY KEY, owner TEXT,"
+                " lecture TEXT NOT NULL, suppression TEXT NOT NULL)"
+            )
+            if os.path.exists(META_PATH):
+                with open(META_PATH, "r") as f:
+                    ancien = json.load(f)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO fichiers (nom, owner, lecture, suppression) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            nom,
+                            entree.get("owner"),
+                            json.dumps(entree["permissions"].get("read", [])),
+                            json.dumps(entree["permissions"].get("delete", [])),
+                        )
+                        for nom, entree in ancien.items()
+                    ],
+                )
+        if version < 2:
+            # Empreinte BLAKE2b du contenu et signature (stat) de la version empreintée
+            conn.execute("ALTER TABLE fichiers ADD COLUMN empreinte TEXT")
+            conn.execute("ALTER TABLE fichiers ADD COLUMN signature TEXT")
+        if version < VERSION_SCHEMA:
+            conn.execute(f"PRAGMA user_version = {VERSION_SCHEMA}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _connexion():
+    """ Retourne la connexion à la base, ouverte au premier accès (META_LOCK tenu) """
+    if _BASE["connexion"] is None:
+        conn = sqlite3.connect(BASE_PATH, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        _migrer(conn)
+        _BASE["connexion"] = conn
+    return _BASE["connexion"]
+
+
+def _entree(owner, lecture, suppression, empreinte=None, signature=None):
+    return {
+        "owner": owner,
+        "permissions": {"read": list(lecture), "delete": list(suppression)},
+        "empreinte": empreinte,
+        "signature": signature,
+    }
+
+
+def _meta_en_cache():
+    """ Retourne les métadonnées en cache (lecture seule), rechargées si un autre processus a écrit """
+    maintenant = time.monotonic()
+    if _CACHE["meta"] is not None and maintenant - _CACHE["verifie_le"] < VALIDITE_CACHE:
+        return _CACHE["meta"]
+    with META_LOCK:
+        conn = _connexion()
+        # data_version ne change qu'avec les transactions des autres connexions
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if _CACHE["meta"] is None or data_version != _CACHE["data_version"]:
+            _CACHE["meta"] = {
+                nom: _entree(owner, json.loads(lecture), json.loads(suppression), empreinte, signature)
+                for nom, owner, lecture, suppression, empreinte, signature in conn.execute(
+                    "SELECT nom, owner, lecture, suppression, empreinte, signature FROM fichiers"
+                )
+            }
+            _CACHE["data_version"] = data_version
+            _CACHE["version"] += 1
+        _CACHE["verifie_le"] = maintenant
+        return _CACHE["meta"]
+
+
+def creer_meta(nom_fichier, owner, lecture, suppression):
+    """ Enregistre un nouveau fichier ; sans effet (False) si le fichier est déjà connu """
+    _meta_en_cache()
+    with META_LOCK:
+        curseur = _connexion().execute(
+            "INSERT OR IGNORE INTO fichiers (nom, owner, lecture, suppression) VALUES (?, ?, ?, ?)",
+            (nom_fichier, owner, json.dumps(lecture), json.dumps(suppression)),
+        )
+        if curseur.rowcount == 0:
+            return False
+        _CACHE["meta"][nom_fichier] = _entree(owner, lecture, suppression)
+        return True
+
 
+def modifier_permissions(nom_fichier, owner, lecture, suppression):
+    """ Remplace les droits d'un fichier si owner en est bien le propriétaire
+    La vérification et l'écriture forment une seule requête : pas de mise à jour perdue """
+    _meta_en_cache()
+    with META_LOCK:
+        curseur = _connexion().execute(
+            "UPDATE fichiers SET lecture = ?, suppression = ? WHERE nom = ? AND owner = ?",
+            (json.dumps(lecture), json.dumps(suppression), nom_fichier, owner),
+        )
+        if curseur.rowcount == 0:
+            return False
+        ancienne = _CACHE["meta"].get(nom_fichier) or {}
+        _CACHE["meta"][nom_fichier] = _entree(
+            owner, lecture, suppression, ancienne.get("empreinte"), ancienne.get("signature")
+        )
+        return True
 
-def charger_meta():
-    if not os.path.exists(META_PATH):
-        return {}
-    with open(META_PATH, "r") as f:
-        return json.load(f)
+
+def lire_empreinte(nom_fichier, signature):
+    """ Empreinte enregistrée du fichier, None si elle manque ou concerne une autre version (signature) """
+    entree = _meta_en_cache().get(nom_fichier)
+    if entree and entree.get("signature") == signature:
+        return entree.get("empreinte")
+    return None
+
+
+def enregistrer_empreinte(nom_fichier, empreinte, signature):
+    """ Mémorise l'empreinte du contenu d'un fichier connu pour la version décrite par signature """
+    _meta_en_cache()
+    with META_LOCK:
+        _connexion().execute(
+            "UPDATE fichiers SET empreinte = ?, signature = ? WHERE nom = ?",
+            (empreinte, signature, nom_fichier),
+        )
+        entree = _CACHE["meta"].get(nom_fichier)
+        if entree:
+            # Les entrées du cache sont remplacées, jamais modifiées en place
+            _CACHE["meta"][nom_fichier] = dict(entree, empreinte=empreinte, signature=signature)
+
+
+def preparer_empreintes():
+    """ Au démarrage, fait calculer en arrière-plan les empreintes manquantes ou périmées
+    (documents déposés ou modifiés hors du serveur) avant que les clients ne les ouvrent """
+    for nom_fichier, entree in list(_meta_en_cache().items()):
+        signature = signature_document(nom_fichier)
+        if signature is not None and entree.get("signature") != signature:
+            preparer_empreinte(nom_fichier, None, enregistrer_empreinte)
 
 
 def peut_lire(utilisateur, nom_fichier):
-    meta = charger_meta()
+    meta = _meta_en_cache()
     if nom_fichier not in meta:
         return False
     return utilisateur in meta[nom_fichier]["permissions"].get("read", [])
 
 
 def peut_supprimer(utilisateur, nom_fichier):
-    meta = charger_meta()
+    meta = _meta_en_cache()
     if nom_fichier not in meta:
         return False
     return utilisateur in meta[nom_fichier]["permissions"].get("delete", [])
@@ -28,10 +192,74 @@ def peut_supprimer(utilisateur, nom_fichier):
 def peut_ecrire(utilisateur, nom_fichier):
     """ Vérifie si l'utilisateur peut écrire/créer un fichier
     Retourne True si :
-    - Le fichier n'existe pas encore 
+    - Le fichier n'existe pas encore
     - OU l'utilisateur a les droits de suppression
     """
-    meta = charger_meta()
+    meta = _meta_en_cache()
     if nom_fichier not in meta:
-        return True 
+        return True
     return utilisateur in meta[nom_fichier]["permissions"].get("delete", [])
+
+
+def _index_a_jour():
+    """ Retourne l'index de lecture, reconstruit si les métadonnées ont été rechargées (INDEX_LOCK tenu) """
+    meta = _meta_en_cache()
+    if _INDEX["version"] != _CACHE["version"]:
+        with META_LOCK:
+            entrees = list(meta.items())
+        lisibles = {}
+        for nom, entree in entrees:
+            if verifier_existence(nom):
+                for utilisateur in entree["permissions"].get("read", []):
+                    lisibles.setdefault(utilisateur, []).append(nom)
+        for noms in lisibles.values():
+            noms.sort()
+        _INDEX["lisibles"] = lisibles
+        _INDEX["version"] = _CACHE["version"]
+    return _INDEX["lisibles"]
+
+
+def _retirer(noms, nom):
+    position = bisect.bisect_left(noms, nom)
+    if position < len(noms) and noms[position] == nom:
+        del noms[position]
+
+
+def desindexer_fichier(nom):
+    """ Retire un fichier (supprimé) de l'index de lecture de tous les utilisateurs """
+    with INDEX_LOCK:
+        for noms in _index_a_jour().values():
+            _retirer(noms, nom)
+
+
+def indexer_fichier(nom):
+    """ Met l'index à jour pour un fichier créé ou dont les droits de lecture ont changé """
+    with INDEX_LOCK:
+        index = _index_a_jour()
+        for noms in index.values():
+            _retirer(noms, nom)
+        entree = _meta_en_cache().get(nom)
+        if entree and verifier_existence(nom):
+            for utilisateur in entree["permissions"].get("read", []):
+                bisect.insort(index.setdefault(utilisateur, []), nom)
+
+
+def lister_lisibles(utilisateur, prefixe="", apres=None, limite=None):
+    """ Retourne (page, suivant) : les fichiers lisibles par l'utilisateur, triés par nom
+    - prefixe : ne garde que les noms commençant par ce préfixe
+    - apres   : curseur, la page commence strictement après ce nom
+    - suivant : curseur de la page suivante, None s'il n'y en a plus """
+    with INDEX_LOCK:
+        noms = _index_a_jour().get(utilisateur, [])
+        debut = bisect.bisect_left(noms, prefixe or "")
+        if apres is not None:
+            debut = max(debut, bisect.bisect_right(noms, apres))
+        page = []
+        for position in range(debut, len(noms)):
+            nom = noms[position]
+            if prefixe and not nom.startswith(prefixe):
+                break
+            if limite is not None and len(page) >= limite:
+                return page, page[-1]
+            page.append(nom)
+        return page, None
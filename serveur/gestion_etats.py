@@ -3,35 +3,47 @@
 # =================================================================
 from commun.constantes import *
 
+# Transitions : primitive -> {état de départ autorisé: état atteint quand la primitive réussit}
+# None : la primitive laisse l'état inchangé (la fin d'une lecture ramène à SELECTED)
+TRANSITIONS = {
+    F_INITIALIZE: {"IDLE": "INITIALIZED"},
+    F_SELECT: {"INITIALIZED": "SELECTED", "SELECTED": "SELECTED", "OPEN": "SELECTED"},
+    F_OPEN: {"SELECTED": "OPEN"},
+    F_READ: {"OPEN": None},
+    # Reprise d'un téléchargement ; la consultation d'un upload ne change pas l'état
+    F_RECOVER: {"INITIALIZED": "OPEN", "SELECTED": "OPEN"},
+    F_TERMINATE: {"INITIALIZED": "IDLE", "SELECTED": "IDLE", "OPEN": "IDLE"},
+    F_DELETE: {"INITIALIZED": None, "SELECTED": None},
+    F_WRITE: {"INITIALIZED": None, "SELECTED": None},
+    F_SET_PERMISSIONS: {"INITIALIZED": None, "SELECTED": None},
+}
+
+# Table précalculée (état, primitive) -> état suivant : une seule recherche par requête,
+# quel que soit le nombre de primitives
+TABLE_ETATS = {
+    (etat, primitive): suivant
+    for primitive, departs in TRANSITIONS.items()
+    for etat, suivant in departs.items()
+}
+_ETATS = frozenset(ETATS)
+
 
 class MachineEtats:
     def __init__(self):
         self.etat_actuel = "IDLE"
 
     def transitionner(self, nouvel_etat):
-        if nouvel_etat in ETATS:
+        if nouvel_etat in _ETATS:
             self.etat_actuel = nouvel_etat
             return True
         return False
 
     def peut_executer(self, primitive):
         """ Vérifie si la primitive demandée est autorisée selon l'état actuel """
-        if primitive == F_INITIALIZE:
-            return self.etat_actuel == "IDLE"
-        elif primitive == F_SELECT:
-            return self.etat_actuel in ["INITIALIZED", "SELECTED", "OPEN"]
-        elif primitive == F_OPEN:
-            return self.etat_actuel == "SELECTED"
-        elif primitive == F_READ:
-            return self.etat_actuel == "OPEN"
-        elif primitive == F_RECOVER:
-            return self.etat_actuel in ["INITIALIZED","SELECTED"]
-        elif primitive == F_TERMINATE:
-            return self.etat_actuel != "IDLE"
-        elif primitive == F_DELETE:
-            return self.etat_actuel in ["INITIALIZED", "SELECTED"]
-        elif primitive == F_WRITE:
-            return self.etat_actuel in ["INITIALIZED", "SELECTED"]
-        elif primitive == F_SET_PERMISSIONS:
-            return self.etat_actuel in ["INITIALIZED", "SELECTED"]
-        return False
+        return (self.etat_actuel, primitive) in TABLE_ETATS
+
+    def avancer(self, primitive):
+        """ Applique la transition d'une primitive qui vient de réussir depuis l'état actuel """
+        suivant = TABLE_ETATS.get((self.etat_actuel, primitive))
+        if suivant:
+            self.etat_actuel = suivant
@@ -1,30 +1,384 @@
 # =================================================================
 # GESTIONNAIRE DU SYSTÈME DE FICHIERS VIRTUEL
 # =================================================================
+import hashlib
+import mmap
 import os
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from commun.compression import compresser
+from commun.integrite import TAILLE_LECTURE, crc_bloc, nouvelle_empreinte
+from serveur.journalisation import logger_erreur
 
 # Dossier racine 
 RACINE = os.path.abspath("./serveur/stockage/") 
 
+# Cache des descripteurs : les fichiers ouverts sont partagés entre sessions (lectures par os.pread).
+# Seuls les descripteurs inutilisés comptent dans la limite et sont fermés par ordre LRU.
+TAILLE_CACHE_FICHIERS = 128
+# Cache des résultats de stat, revalidés au plus une fois par seconde
+TAILLE_CACHE_STAT = 4096
+VALIDITE_STAT = 1.0
+# Au-delà de cette taille, un document lu est projeté en mémoire (mmap) et partagé :
+# les blocs sont servis comme tranches de la projection, sans copie par session
+SEUIL_MMAP = 4 * 1024 * 1024
+# Blocs préparés des fichiers lus (CRC, version compressée), partagés entre lecteurs (LRU) :
+# limite sur les octets compressés gardés et sur le nombre d'entrées
+TAILLE_CACHE_BLOCS = 64 * 1024 * 1024
+NB_MAX_BLOCS = 65536
+# Tables des CRC par bloc (4 octets par bloc) : un bloc servi par sendfile n'est jamais relu pour son CRC
+TAILLE_CACHE_CRC = 16 * 1024 * 1024
+
+_OUVERTS = {}  # nom -> FichierPartage en service
+_LIBRES = OrderedDict()  # nom -> FichierPartage sans lecteur, du plus ancien au plus récent
+_STATS = OrderedDict()  # nom -> (os.stat_result ou None, horodatage)
+CACHE_FICHIERS_LOCK = threading.Lock()
+
+# (nom, signature, offset, taille, algo) -> (crc, bloc compressé ou None s'il ne gagne rien)
+_BLOCS = OrderedDict()
+_VOLUME_BLOCS = [0]
+# (signature, taille de bloc) -> array des CRC des blocs successifs
+_CRCS = OrderedDict()
+_VOLUME_CRCS = [0]
+CACHE_BLOCS_LOCK = threading.Lock()
+
+# Empreintes à calculer hors des sessions, une à la fois par un thread dédié : (nom, taille de bloc, rappel)
+_A_CALCULER = queue.Queue()
+_EN_CALCUL = set()  # (nom, taille de bloc) déjà confiés au thread
+_CALCULATEUR = [None]
+CALCUL_LOCK = threading.Lock()
+
+
+class FichierPartage:
+    """ Descripteur de fichier partagé par toutes les sessions qui lisent le même document """
+
+    def __init__(self, nom, fd):
+        self.nom = nom
+        self.fd = fd
+        st = os.fstat(fd)
+        self.taille = st.st_size
+        self.signature = _signature(st)
+        self.references = 0
+        self.obsolete = False
+        self.carte = None  # Projection mmap, créée à la première lecture, rendue sans lecteur
+
+    def fileno(self):
+        return self.fd
+
+    def vue(self, offset, taille):
+        """ Tranche (memoryview) de la projection partagée, None si le document est trop petit
+        La tranche est à relâcher (release) avant de rendre le fichier """
+        if self.taille < SEUIL_MMAP:
+            return None
+        if self.carte is None:
+            with CACHE_FICHIERS_LOCK:
+                if self.carte is None:
+                    self.carte = mmap.mmap(self.fd, self.taille, access=mmap.ACCESS_READ)
+        return memoryview(self.carte)[offset : offset + taille]
+
+    def lire(self, offset, taille):
+        """ Lecture positionnelle : sans seek, donc sûre entre threads """
+        return os.pread(self.fd, taille, offset)
+
+    def lire_dans(self, offset, tampon):
+        """ Lit dans un tampon réutilisable, retourne le nombre d'octets lus """
+        if hasattr(os, "preadv"):
+            return os.preadv(self.fd, [tampon], offset)
+        donnees = os.pread(self.fd, len(tampon), offset)
+        tampon[: len(donnees)] = donnees
+        return len(donnees)
+
+    def liberer_carte(self):
+        """ Rend la projection (CACHE_FICHIERS_LOCK tenu, plus aucun lecteur) """
+        if self.carte is not None:
+            try:
+                self.carte.close()
+            except BufferError:
+                # Une tranche est encore référencée : la projection partira avec elle
+                pass
+            self.carte = None
+
+    def fermer(self):
+        self.liberer_carte()
+        os.close(self.fd)
+
+
+def _signature(st):
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+def texte_signature(signature):
+    """ Forme texte d'une signature de fichier, conservée avec son empreinte dans les métadonnées """
+    return "-".join(str(valeur) for valeur in signature)
+
+def _chemin(nom):
+    chemin_complet = os.path.abspath(os.path.join(RACINE, nom))
+    if not chemin_complet.startswith(RACINE):
+        raise PermissionError("Accès interdit hors du stockage sécurisé")
+    return chemin_complet
+
+def _stat(nom):
+    """ stat du document (None s'il n'existe pas), servi depuis le cache tant qu'il est récent """
+    maintenant = time.monotonic()
+    with CACHE_FICHIERS_LOCK:
+        entree = _STATS.get(nom)
+        if entree and maintenant - entree[1] < VALIDITE_STAT:
+            _STATS.move_to_end(nom)
+            return entree[0]
+    try:
+        st = os.stat(_chemin(nom))
+    except FileNotFoundError:
+        st = None
+    with CACHE_FICHIERS_LOCK:
+        _STATS[nom] = (st, maintenant)
+        _STATS.move_to_end(nom)
+        while len(_STATS) > TAILLE_CACHE_STAT:
+            _STATS.popitem(last=False)
+    return st
+
 def verifier_existence(nom):
     """ Vérifie la présence d'un document avant sélection """
     if not nom: return False
-    chemin_complet = os.path.abspath(os.path.join(RACINE, nom))
-    if not chemin_complet.startswith(RACINE):
+    try:
+        return _stat(nom) is not None
+    except PermissionError:
         return False
-    return os.path.exists(chemin_complet)
 
-def lire_bloc(nom, offset, taille=1024):
-    """ Extrait une portion de données à partir d'une position précise """
-    chemin_complet = os.path.abspath(os.path.join(RACINE, nom))
-    if not chemin_complet.startswith(RACINE):
-        raise PermissionError("Accès interdit hors du stockage sécurisé")
+def statistiques_cache():
+    """ Occupation des caches : descripteurs en service et libres, stat, blocs préparés (entrées et octets) """
+    with CACHE_FICHIERS_LOCK:
+        stats = {"ouverts": len(_OUVERTS), "libres": len(_LIBRES), "stat": len(_STATS)}
+    stats["blocs"] = len(_BLOCS)
+    stats["blocs_octets"] = _VOLUME_BLOCS[0]
+    stats["crc_octets"] = _VOLUME_CRCS[0]
+    return stats
+
+def acquerir_fichier(nom):
+    """ Retourne le FichierPartage du document, ouvert au besoin ; à rendre avec relacher_fichier """
+    st = _stat(nom)
+    if st is None:
+        raise FileNotFoundError(nom)
+    signature = _signature(st)
+    with CACHE_FICHIERS_LOCK:
+        fichier = _OUVERTS.get(nom)
+        if fichier and fichier.signature != signature:
+            # Modifié hors du serveur depuis l'ouverture : le descripteur n'est plus réutilisé
+            _retirer(fichier)
+            fichier = None
+        if fichier:
+            _LIBRES.pop(nom, None)
+            fichier.references += 1
+            return fichier
+    nouveau = FichierPartage(nom, os.open(_chemin(nom), os.O_RDONLY))
+    with CACHE_FICHIERS_LOCK:
+        fichier = _OUVERTS.get(nom)
+        if fichier and not fichier.obsolete:
+            # Ouvert entre-temps par une autre session
+            _LIBRES.pop(nom, None)
+            nouveau.fermer()
+        else:
+            fichier = _OUVERTS[nom] = nouveau
+        fichier.references += 1
+        return fichier
+
+def relacher_fichier(fichier):
+    """ Rend un FichierPartage ; le descripteur reste en cache (LRU) tant qu'il est à jour """
+    with CACHE_FICHIERS_LOCK:
+        fichier.references -= 1
+        if fichier.references:
+            return
+        if fichier.obsolete:
+            fichier.fermer()
+            return
+        # Le descripteur reste en cache, mais pas la projection
+        fichier.liberer_carte()
+        _LIBRES[fichier.nom] = fichier
+        while len(_LIBRES) > TAILLE_CACHE_FICHIERS:
+            _, ancien = _LIBRES.popitem(last=False)
+            del _OUVERTS[ancien.nom]
+            ancien.fermer()
+
+def _retirer(fichier):
+    """ Sort un fichier du cache (CACHE_FICHIERS_LOCK tenu), fermé dès qu'il n'a plus de lecteur """
+    fichier.obsolete = True
+    _OUVERTS.pop(fichier.nom, None)
+    _LIBRES.pop(fichier.nom, None)
+    if not fichier.references:
+        fichier.fermer()
+
+def invalider_fichier(nom):
+    """ Oublie le descripteur et le stat d'un document remplacé ou supprimé """
+    with CACHE_FICHIERS_LOCK:
+        _STATS.pop(nom, None)
+        fichier = _OUVERTS.get(nom)
+        if fichier:
+            _retirer(fichier)
+
+def signature_document(nom):
+    """ Signature texte de la version actuelle du document, None s'il n'existe pas """
+    st = _stat(nom)
+    return None if st is None else texte_signature(_signature(st))
+
+def supprimer_fichier(nom):
+    """ Supprime un document du stockage """
+    os.remove(_chemin(nom))
+    invalider_fichier(nom)
+
+def _parcourir(fichier, empreinte=None, taille_bloc=None):
+    """ Lit tout le fichier une fois : met à jour empreinte si elle est fournie
+    et, avec taille_bloc, retourne la table des CRC de ses blocs (None sinon) """
+    crcs = array("I") if taille_bloc else None
+    pas = max(taille_bloc, TAILLE_LECTURE // taille_bloc * taille_bloc) if taille_bloc else TAILLE_LECTURE
+    for offset in range(0, fichier.taille, pas):
+        taille = min(pas, fichier.taille - offset)
+        vue = fichier.vue(offset, taille)
+        if vue is None:
+            vue = memoryview(fichier.lire(offset, taille))
+        with vue:
+            if empreinte is not None:
+                empreinte.update(vue)
+            if crcs is not None:
+                for debut in range(0, len(vue), taille_bloc):
+                    crcs.append(crc_bloc(vue[debut : debut + taille_bloc]))
+    return crcs
+
+def _memoriser_crcs(cle, crcs):
+    with CACHE_BLOCS_LOCK:
+        if cle not in _CRCS:
+            _CRCS[cle] = crcs
+            _VOLUME_CRCS[0] += crcs.itemsize * len(crcs)
+            while _VOLUME_CRCS[0] > TAILLE_CACHE_CRC and len(_CRCS) > 1:
+                _, ancien = _CRCS.popitem(last=False)
+                _VOLUME_CRCS[0] -= ancien.itemsize * len(ancien)
+
+def calculer_empreinte(fichier, taille_bloc=None):
+    """ Empreinte (hexadécimale) du contenu complet d'un FichierPartage
+    Avec taille_bloc, la même lecture prépare la table des CRC par bloc (voir crcs_blocs) """
+    empreinte = nouvelle_empreinte()
+    crcs = _parcourir(fichier, empreinte, taille_bloc)
+    if crcs is not None:
+        _memoriser_crcs((fichier.signature, taille_bloc), crcs)
+    return empreinte.hexdigest()
+
+def crcs_blocs(fichier, taille_bloc):
+    """ Table des CRC des blocs de taille_bloc du fichier (le dernier peut être plus court)
+    si un calcul d'empreinte l'a déjà préparée, None sinon : elle n'est jamais calculée à la demande """
+    cle = (fichier.signature, taille_bloc)
+    with CACHE_BLOCS_LOCK:
+        crcs = _CRCS.get(cle)
+        if crcs is not None:
+            _CRCS.move_to_end(cle)
+        return crcs
+
+def preparer_empreinte(nom, taille_bloc, rappel):
+    """ Confie au thread de calcul l'empreinte du document (et, avec taille_bloc, la table des CRC de ses blocs)
+    rappel(nom, empreinte, signature texte) reçoit le résultat ; une demande déjà en attente n'est pas répétée """
+    cle = (nom, taille_bloc)
+    with CALCUL_LOCK:
+        if cle in _EN_CALCUL:
+            return
+        _EN_CALCUL.add(cle)
+        if _CALCULATEUR[0] is None:
+            _CALCULATEUR[0] = threading.Thread(target=_calculer_empreintes, name="ftam-empreintes", daemon=True)
+            _CALCULATEUR[0].start()
+    _A_CALCULER.put((nom, taille_bloc, rappel))
+
+def _calculer_empreintes():
+    """ Boucle du thread de calcul : une lecture complète à la fois, sans jamais retenir une session """
+    while True:
+        nom, taille_bloc, rappel = _A_CALCULER.get()
+        try:
+            fichier = acquerir_fichier(nom)
+            try:
+                empreinte = calculer_empreinte(fichier, taille_bloc)
+                rappel(nom, empreinte, texte_signature(fichier.signature))
+            finally:
+                relacher_fichier(fichier)
+        except Exception as e:
+            logger_erreur(f"Empreinte de '{nom}' non calculée : {e}")
+        finally:
+            with CALCUL_LOCK:
+                _EN_CALCUL.discard((nom, taille_bloc))
+    crcs = _parcourir(fichier, taille_bloc=taille_bloc)
+    _memoriser_crcs(cle, crcs)
+    return crcs
+
+def preparer_bloc(fichier, offset, taille, algo=None):
+    """ Retourne (crc, compresse) pour le bloc [offset, offset + taille[ du fichier
+    compresse est le bloc compressé avec algo, None sans algo ou si le bloc est incompressible.
+    Le résultat est mis en cache : les lecteurs suivants du même fichier ne relisent pas le bloc """
+    cle = (fichier.nom, fichier.signature, offset, taille, algo)
+    with CACHE_BLOCS_LOCK:
+        if cle in _BLOCS:
+            _BLOCS.move_to_end(cle)
+            return _BLOCS[cle]
+    vue = fichier.vue(offset, taille)
+    if vue is None:
+        vue = memoryview(fichier.lire(offset, taille))
+    with vue:
+        resultat = (crc_bloc(vue), compresser(algo, vue) if algo else None)
+    with CACHE_BLOCS_LOCK:
+        if cle not in _BLOCS:
+            _BLOCS[cle] = resultat
+            _VOLUME_BLOCS[0] += len(resultat[1] or b"")
+            while _VOLUME_BLOCS[0] > TAILLE_CACHE_BLOCS or len(_BLOCS) > NB_MAX_BLOCS:
+                _, ancien = _BLOCS.popitem(last=False)
+                _VOLUME_BLOCS[0] -= len(ancien[1] or b"")
+    return resultat
+
+# Uploads en cours : écrits à part puis renommés d'un coup dans RACINE à la fin
+DOSSIER_PARTIELS = os.path.join(RACINE, ".partiels")
+
+def chemin_partiel(utilisateur, nom, transfert=""):
+    """ Chemin du fichier temporaire d'un upload (un par utilisateur, fichier et transfert) """
+    cle = hashlib.sha1(f"{utilisateur}\0{nom}\0{transfert}".encode("utf-8")).hexdigest()
+    return os.path.join(DOSSIER_PARTIELS, cle + ".part")
+
+def taille_partielle(chemin):
+    """ Nombre d'octets déjà reçus pour un upload, None s'il n'a pas commencé """
     try:
-        with open(chemin_complet, "rb") as f:
-            f.seek(offset) 
-            return f.read(taille)
+        return os.path.getsize(chemin)
     except FileNotFoundError:
         return None
-    except Exception as e:
-        print(f"[ERREUR] Lecture impossible : {e}")
-        return None
\ No newline at end of file
+
+def ouvrir_partiel(chemin, offset=0):
+    """ Ouvre le fichier temporaire d'un upload pour écrire à partir de offset (la suite est écartée) """
+    os.makedirs(DOSSIER_PARTIELS, exist_ok=True)
+    f = open(chemin, "r+b" if offset and os.path.exists(chemin) else "wb")
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+def publier_partiel(chemin, nom):
+    """ Remplace atomiquement le fichier final par l'upload terminé """
+    chemin_complet = _chemin(nom)
+    if not os.path.exists(chemin):
+        ouvrir_partiel(chemin).close()
+    with open(chemin, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(chemin, chemin_complet)
+    invalider_fichier(nom)
+
+def supprimer_partiel(chemin):
+    """ Écarte le fichier temporaire d'un upload """
+    try:
+        os.remove(chemin)
+    except FileNotFoundError:
+        pass
+
+def purger_partiels(age_max):
+    """ Supprime les uploads abandonnés depuis plus de age_max secondes """
+    limite = time.time() - age_max
+    try:
+        entrees = list(os.scandir(DOSSIER_PARTIELS))
+    except FileNotFoundError:
+        return
+    for entree in entrees:
+        try:
+            if entree.stat().st_mtime < limite:
+                os.remove(entree.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,151 @@
+# =================================================================
+# POINTS DE REPRISE PERSISTANTS (F-RECOVER)
+# =================================================================
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from serveur.gestion_fichiers import purger_partiels
+
+# Base dédiée : les écritures fréquentes des points de reprise ne doivent pas
+# faire recharger le cache des droits (gestion_droits surveille meta.db)
+BASE_REPRISES = os.path.join(os.path.dirname(__file__), "reprises.db")
+
+DUREE_VIE_REPRISE = 7 * 24 * 3600  # Un point de reprise non mis à jour expire après 7 jours
+INTERVALLE_ECRITURE = 1.0  # Les points de reprise sont écrits sur disque par lots, au plus chaque seconde
+INTERVALLE_PURGE = 3600  # Délai (s) entre deux purges des points expirés
+
+# Sens du transfert repris
+LECTURE = "lecture"
+ECRITURE = "ecriture"
+
+# Mises à jour en attente d'écriture : (utilisateur, fichier, sens, transfert) -> (offset, horodatage, empreinte)
+# ou None pour une suppression. Seule la dernière valeur de chaque transfert est écrite.
+_EN_ATTENTE = {}
+ATTENTE_LOCK = threading.Lock()
+
+# Connexion SQLite et thread d'écriture, créés au premier usage
+_BASE = {"connexion": None, "ecrivain": None, "purge": 0.0}
+BASE_LOCK = threading.Lock()
+
+
+def _connexion():
+    """ Retourne la connexion à la base des reprises (BASE_LOCK tenu) """
+    if _BASE["connexion"] is None:
+        conn = sqlite3.connect(BASE_REPRISES, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reprises ("
+            " utilisateur TEXT, fichier TEXT, sens TEXT, transfert TEXT,"
+            " offset INTEGER NOT NULL, maj REAL NOT NULL,"
+            " PRIMARY KEY (utilisateur, fichier, sens, transfert))"
+        )
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Empreinte du fichier au moment du transfert : une reprise sur une autre version repart de zéro
+            conn.execute("ALTER TABLE reprises ADD COLUMN empreinte TEXT")
+            conn.execute("PRAGMA user_version = 1")
+        _BASE["connexion"] = conn
+    return _BASE["connexion"]
+
+
+def _demarrer_ecrivain():
+    """ Lance le thread qui écrit les points de reprise par lots (ATTENTE_LOCK tenu) """
+    if _BASE["ecrivain"] is None:
+        _BASE["ecrivain"] = threading.Thread(
+            target=_boucle_ecriture, name="ftam-reprises", daemon=True
+        )
+        _BASE["ecrivain"].start()
+
+
+def _boucle_ecriture():
+    while True:
+        time.sleep(INTERVALLE_ECRITURE)
+        try:
+            vider()
+        except Exception:
+            pass
+
+
+def vider():
+    """ Écrit les mises à jour en attente en une seule transaction et purge les points expirés """
+    maintenant = time.time()
+    # Le lot est pris sous BASE_LOCK : deux lots ne peuvent pas s'écrire dans le désordre
+    with BASE_LOCK:
+        with ATTENTE_LOCK:
+            lot = dict(_EN_ATTENTE)
+            _EN_ATTENTE.clear()
+        purge = _BASE["connexion"] is not None and maintenant - _BASE["purge"] >= INTERVALLE_PURGE
+        if not lot and not purge:
+            return
+        conn = _connexion()
+        conn.execute("BEGIN")
+        try:
+            for cle, valeur in lot.items():
+                if valeur is None:
+                    conn.execute(
+                        "DELETE FROM reprises WHERE utilisateur = ? AND fichier = ? AND sens = ? AND transfert = ?",
+                        cle,
+                    )
+                else:
+                    conn.execute("INSERT OR REPLACE INTO reprises VALUES (?, ?, ?, ?, ?, ?, ?)", cle + valeur)
+            if purge or not _BASE["purge"]:
+                conn.execute("DELETE FROM reprises WHERE maj < ?", (maintenant - DUREE_VIE_REPRISE,))
+                _BASE["purge"] = maintenant
+                purge = True
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # Les mises à jour non écrites repartent en attente, sans écraser les plus récentes
+            with ATTENTE_LOCK:
+                for cle, valeur in lot.items():
+                    _EN_ATTENTE.setdefault(cle, valeur)
+            raise
+    if purge:
+        # Les uploads abandonnés expirent avec leur point de reprise
+        purger_partiels(DUREE_VIE_REPRISE)
+
+
+def enregistrer_reprise(utilisateur, fichier, sens, offset, transfert="", empreinte=None):
+    """ Note le point de reprise d'un transfert (écrit sur disque au prochain lot)
+    empreinte : empreinte du fichier transféré, si elle est connue """
+    with ATTENTE_LOCK:
+        _EN_ATTENTE[(utilisateur, fichier, sens, transfert or "")] = (int(offset), time.time(), empreinte)
+        _demarrer_ecrivain()
+
+
+def supprimer_reprise(utilisateur, fichier, sens, transfert=""):
+    """ Oublie le point de reprise d'un transfert terminé """
+    with ATTENTE_LOCK:
+        _EN_ATTENTE[(utilisateur, fichier, sens, transfert or "")] = None
+        _demarrer_ecrivain()
+
+
+def nb_reprises_en_attente():
+    """ Points de reprise notés mais pas encore écrits sur disque """
+    return len(_EN_ATTENTE)
+
+
+def lire_reprise(utilisateur, fichier=None, sens=LECTURE, transfert=None):
+    """ Retourne le point de reprise le plus récent de l'utilisateur, {"fichier", "transfert", "offset", "empreinte"}
+    fichier et transfert restreignent la recherche ; None si aucun point valide """
+    vider()
+    requete = "SELECT fichier, transfert, offset, empreinte FROM reprises WHERE utilisateur = ? AND sens = ? AND maj >= ?"
+    arguments = [utilisateur, sens, time.time() - DUREE_VIE_REPRISE]
+    if fichier is not None:
+        requete += " AND fichier = ?"
+        arguments.append(fichier)
+    if transfert is not None:
+        requete += " AND transfert = ?"
+        arguments.append(transfert)
+    with BASE_LOCK:
+        ligne = _connexion().execute(requete + " ORDER BY maj DESC LIMIT 1", arguments).fetchone()
+    if ligne is None:
+        return None
+    return {"fichier": ligne[0], "transfert": ligne[1], "offset": ligne[2], "empreinte": ligne[3]}
+
+
+# Les derniers points de reprise sont écrits à l'arrêt normal du serveur
+atexit.register(vider)
@@ -9,8 +9,33 @@ UTILISATEURS = {
     "invite": {"mdp": "guest", "role": "lecteur"}
 }
 
+# Plafonds de débit en octets/s (None = illimité)
+# Une clé "debit" dans UTILISATEURS est prioritaire sur le plafond du rôle
+# En mode threads, une session plafonnée quitte le pool d'admission pour un thread dédié ; --mode asyncio
+# reste préférable avec de nombreux clients plafonnés
+DEBIT_PAR_ROLE = {
+    "proprietaire": None,
+    "lecteur": None,
+}
+DEBIT_GLOBAL = None
+
 def authentifier(utilisateur, mdp):
     """ Vérifie les identifiants et retourne le rôle si valide """
     if utilisateur in UTILISATEURS and UTILISATEURS[utilisateur]["mdp"] == mdp:
         return UTILISATEURS[utilisateur]["role"]
-    return None
\ No newline at end of file
+    return None
+
+def debit_autorise(utilisateur):
+    """ Retourne le débit maximal (octets/s) de l'utilisateur, None s'il n'est pas limité """
+    compte = UTILISATEURS.get(utilisateur, {})
+    if "debit" in compte:
+        return compte["debit"]
+    return DEBIT_PAR_ROLE.get(compte.get("role"))
+
+def plafonds_actifs():
+    """ Indique si un plafond de débit (global, par rôle ou par compte) est configuré """
+    return bool(
+        DEBIT_GLOBAL
+        or any(DEBIT_PAR_ROLE.values())
+        or any(compte.get("debit") for compte in UTILISATEURS.values())
+    )
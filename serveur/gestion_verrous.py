@@ -0,0 +1,140 @@
+# =================================================================
+# GESTIONNAIRE DE VERROUS DE FICHIERS (LECTEURS / ÉCRIVAIN)
+# =================================================================
+import threading
+import time
+import zlib
+
+from commun.constantes import DELAI_VERROU
+
+# Les fichiers sont répartis sur plusieurs fragments, chacun avec sa propre condition :
+# l'attente sur un fichier très demandé ne bloque pas les sessions qui travaillent ailleurs.
+NB_FRAGMENTS = 16
+
+
+class _Fragment:
+    def __init__(self):
+        self.condition = threading.Condition()
+        # nom -> {"lecteurs": set(propriétaires), "ecrivain": propriétaire, "ecrivains_en_attente": n}
+        self.fichiers = {}
+
+    def etat(self, nom):
+        etat = self.fichiers.get(nom)
+        if etat is None:
+            etat = {"lecteurs": set(), "ecrivain": None, "ecrivains_en_attente": 0}
+            self.fichiers[nom] = etat
+        return etat
+
+    def nettoyer(self, nom):
+        etat = self.fichiers.get(nom)
+        if etat and not etat["lecteurs"] and etat["ecrivain"] is None and not etat["ecrivains_en_attente"]:
+            del self.fichiers[nom]
+
+
+_FRAGMENTS = [_Fragment() for _ in range(NB_FRAGMENTS)]
+
+
+def _fragment(nom):
+    return _FRAGMENTS[zlib.crc32(nom.encode("utf-8")) % NB_FRAGMENTS]
+
+
+def _attendre(fragment, condition_libre, delai):
+    """ Attend (condition du fragment tenue) que condition_libre() soit vraie, au plus delai secondes """
+    echeance = time.monotonic() + delai
+    while not condition_libre():
+        reste = echeance - time.monotonic()
+        if reste <= 0:
+            return False
+        fragment.condition.wait(reste)
+    return True
+
+
+def acquerir_lecture(nom, proprietaire, delai=DELAI_VERROU):
+    """ Verrou partagé : plusieurs sessions peuvent lire le même fichier
+    Attend qu'aucune autre session n'écrive ; retourne False si le délai expire """
+    fragment = _fragment(nom)
+    with fragment.condition:
+        etat = fragment.etat(nom)
+
+        def libre():
+            if etat["ecrivain"] not in (None, proprietaire):
+                return False
+            # Un écrivain en attente passe avant les nouveaux lecteurs
+            return proprietaire in etat["lecteurs"] or not etat["ecrivains_en_attente"]
+
+        if not _attendre(fragment, libre, delai):
+            fragment.nettoyer(nom)
+            return False
+        etat["lecteurs"].add(proprietaire)
+        return True
+
+
+def acquerir_ecriture(nom, proprietaire, delai=DELAI_VERROU):
+    """ Verrou exclusif : aucune autre session ne lit ni n'écrit le fichier
+    Retourne False si le délai expire (delai=0 : simple tentative) """
+    fragment = _fragment(nom)
+    with fragment.condition:
+        etat = fragment.etat(nom)
+
+        def libre():
+            return etat["ecrivain"] in (None, proprietaire) and not (etat["lecteurs"] - {proprietaire})
+
+        etat["ecrivains_en_attente"] += 1
+        try:
+            obtenu = _attendre(fragment, libre, delai)
+        finally:
+            etat["ecrivains_en_attente"] -= 1
+        if not obtenu:
+            fragment.nettoyer(nom)
+            # Les lecteurs retenus par cette attente peuvent repartir
+            fragment.condition.notify_all()
+            return False
+        etat["ecrivain"] = proprietaire
+        return True
+
+
+def liberer(nom, proprietaire):
+    """ Libère tous les verrous (lecture et écriture) tenus par le propriétaire sur le fichier """
+    fragment = _fragment(nom)
+    with fragment.condition:
+        etat = fragment.fichiers.get(nom)
+        if etat is None:
+            return
+        etat["lecteurs"].discard(proprietaire)
+        if etat["ecrivain"] == proprietaire:
+            etat["ecrivain"] = None
+        fragment.nettoyer(nom)
+        fragment.condition.notify_all()
+
+
+def statistiques_verrous():
+    """ Nombre de fichiers verrouillés, de lecteurs, d'écrivains et d'écrivains en attente """
+    stats = {"fichiers": 0, "lecteurs": 0, "ecrivains": 0, "ecrivains_en_attente": 0}
+    for fragment in _FRAGMENTS:
+        with fragment.condition:
+            for etat in fragment.fichiers.values():
+                stats["fichiers"] += 1
+                stats["lecteurs"] += len(etat["lecteurs"])
+                stats["ecrivains"] += etat["ecrivain"] is not None
+                stats["ecrivains_en_attente"] += etat["ecrivains_en_attente"]
+    return stats
+
+
+def liberer_tout(proprietaire):
+    """ Libère tous les verrous d'une session (fin de connexion) """
+    for fragment in _FRAGMENTS:
+        with fragment.condition:
+            noms = [
+                nom
+                for nom, etat in fragment.fichiers.items()
+                if proprietaire in etat["lecteurs"] or etat["ecrivain"] == proprietaire
+            ]
+            for nom in noms:
+                etat = fragment.fichiers[nom]
+                etat["lecteurs"].discard(proprietaire)
+                if etat["ecrivain"] == proprietaire:
+                    etat["ecrivain"] = None
+                fragment.nettoyer(nom)
+            if noms:
+                fragment.condition.notify_all()
+
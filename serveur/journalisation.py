@@ -1,19 +1,143 @@
+import atexit
+import gzip
+import itertools
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from collections import defaultdict
 
 LOG_FILE = "serveur.log"
+# Journal d'accès structuré (une ligne JSON par transfert), pour l'analyse et le dimensionnement
+ACCES_FILE = "acces.log"
+# Rotation des deux journaux
+TAILLE_MAX_JOURNAL = 50 * 1024 * 1024  # Rotation au-delà de cette taille...
+INTERVALLE_ROTATION = 24 * 3600  # ... ou au moins une fois par jour
+NB_ARCHIVES = 14  # Segments compressés conservés (serveur.log.1.gz, acces.log.1.gz, ...)
 
+# Les sessions ne font que déposer leurs messages dans une file bornée ;
+# un thread dédié (QueueListener) les formate et les écrit dans le fichier et sur la console.
+TAILLE_FILE_JOURNAL = 10000
+# Messages par bloc (F-READ / F-WRITE) : un seul sur ECHANTILLON_BLOCS est écrit
+ECHANTILLON_BLOCS = 100
 
-def configurer_journalisation():
-    """Configure le système de log (Fichier + Console)."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding="utf-8"),
-            logging.StreamHandler(),
-        ],
+_CONFIG = {"console": True, "ecouteur": None, "ecouteur_acces": None, "files": (), "perdus": 0}
+_ACCES = logging.getLogger("ftam.acces")
+_ACCES.propagate = False
+_ECHANTILLONS = defaultdict(itertools.count)
+
+
+class _QueueHandlerNonBloquant(logging.handlers.QueueHandler):
+    """ Dépose les messages sans jamais attendre : file pleine, le message est compté puis abandonné """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _CONFIG["perdus"] += 1
+
+
+class _QueueHandlerAcces(_QueueHandlerNonBloquant):
+    """ Les enregistrements d'accès gardent leur dictionnaire : le JSON est produit par le thread d'écriture """
+
+    def prepare(self, record):
+        return record
+
+
+class _FormateurJSON(logging.Formatter):
+    def format(self, record):
+        champs = {"ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S")}
+        champs.update(record.msg)
+        return json.dumps(champs, ensure_ascii=False)
+
+
+class _JournalTournant(logging.handlers.RotatingFileHandler):
+    """ Fichier tourné par taille ou par durée ; les anciens segments sont compressés en gzip.
+    La rotation a lieu dans le thread d'écriture, jamais dans celui d'une session. """
+
+    def __init__(self, chemin, taille_max, intervalle, nb_archives):
+        super().__init__(chemin, maxBytes=taille_max, backupCount=nb_archives, encoding="utf-8")
+        self.intervalle = intervalle
+        self.prochaine_rotation = time.time() + intervalle
+        self.namer = lambda nom: nom + ".gz"
+        self.rotator = _compresser_segment
+
+    def shouldRollover(self, record):
+        if time.time() >= self.prochaine_rotation:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.prochaine_rotation = time.time() + self.intervalle
+
+
+def _compresser_segment(source, destination):
+    with open(source, "rb") as entree, gzip.open(destination, "wb") as sortie:
+        shutil.copyfileobj(entree, sortie)
+    os.remove(source)
+
+
+def configurer_journalisation(niveau="INFO", console=True):
+    """Configure le système de log (Fichier + Console), écrit par un thread dédié.
+    console=False (production) coupe aussi les affichages des sessions."""
+    _CONFIG["console"] = console
+    formateur = logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
     )
+    handlers = [_JournalTournant(LOG_FILE, TAILLE_MAX_JOURNAL, INTERVALLE_ROTATION, NB_ARCHIVES)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formateur)
+
+    file = queue.Queue(maxsize=TAILLE_FILE_JOURNAL)
+    racine = logging.getLogger()
+    racine.setLevel(getattr(logging, str(niveau).upper(), logging.INFO))
+    for ancien in list(racine.handlers):
+        racine.removeHandler(ancien)
+    racine.addHandler(_QueueHandlerNonBloquant(file))
+
+    # Journal d'accès : sa propre file et son propre thread d'écriture
+    file_acces = queue.Queue(maxsize=TAILLE_FILE_JOURNAL)
+    acces = _JournalTournant(ACCES_FILE, TAILLE_MAX_JOURNAL, INTERVALLE_ROTATION, NB_ARCHIVES)
+    acces.setFormatter(_FormateurJSON())
+    _ACCES.setLevel(logging.INFO)
+    for ancien in list(_ACCES.handlers):
+        _ACCES.removeHandler(ancien)
+    _ACCES.addHandler(_QueueHandlerAcces(file_acces))
+
+    arreter_journalisation()
+    _CONFIG["files"] = (file, file_acces)
+    _CONFIG["ecouteur"] = logging.handlers.QueueListener(file, *handlers)
+    _CONFIG["ecouteur_acces"] = logging.handlers.QueueListener(file_acces, acces)
+    _CONFIG["ecouteur"].start()
+    _CONFIG["ecouteur_acces"].start()
+
+
+def arreter_journalisation():
+    """ Écrit les messages encore en file puis arrête les threads d'écriture """
+    for cle in ("ecouteur", "ecouteur_acces"):
+        if _CONFIG[cle]:
+            _CONFIG[cle].stop()
+            _CONFIG[cle] = None
+
+
+atexit.register(arreter_journalisation)
+
+
+def statistiques_journal():
+    """ Messages en attente d'écriture et messages abandonnés (file pleine) """
+    return {"en_file": sum(file.qsize() for file in _CONFIG["files"]), "perdus": _CONFIG["perdus"]}
+
+
+def afficher(message):
+    """ Affichage console d'une session, coupé en production """
+    if _CONFIG["console"]:
+        print(message)
 
 
 def logger_info(message):
@@ -24,3 +148,18 @@ def logger_info(message):
 def logger_erreur(message):
     """Log un message d'erreur."""
     logging.error(message)
+
+
+def journaliser_acces(evenement, **champs):
+    """ Ajoute un enregistrement au journal d'accès (ligne JSON), sans attendre son écriture """
+    if _ACCES.handlers:
+        _ACCES.info({"evenement": evenement, **champs})
+
+
+def logger_bloc(primitive, message):
+    """ Log un message par bloc transféré, échantillonné par primitive (1 sur ECHANTILLON_BLOCS) """
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+    rang = next(_ECHANTILLONS[primitive])
+    if rang % ECHANTILLON_BLOCS == 0:
+        logging.info(f"{message} [{primitive} : bloc n°{rang + 1}, 1 message sur {ECHANTILLON_BLOCS}]")
@@ -0,0 +1,60 @@
+# =================================================================
+# LIMITATION DE DÉBIT PAR SEAU À JETONS
+# =================================================================
+import threading
+import time
+
+from serveur.gestion_securite import DEBIT_GLOBAL, debit_autorise
+
+
+class SeauJetons:
+    """ Seau à jetons : débit moyen de `debit` octets/s avec une rafale d'au plus `capacite` octets """
+
+    def __init__(self, debit, capacite=None):
+        self.debit = float(debit)
+        self.capacite = float(capacite or debit)
+        self.jetons = self.capacite
+        self.horodatage = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consommer(self, n):
+        """ Prélève n jetons et retourne le délai (s) à respecter avant le prochain transfert
+        Le seau ne dort jamais : c'est l'appelant qui décide comment attendre """
+        with self.lock:
+            maintenant = time.monotonic()
+            self.jetons = min(
+                self.capacite, self.jetons + (maintenant - self.horodatage) * self.debit
+            )
+            self.horodatage = maintenant
+            self.jetons -= n
+            if self.jetons >= 0:
+                return 0.0
+            return -self.jetons / self.debit
+
+
+# Seau partagé par toutes les sessions (None = pas de plafond global)
+SEAU_GLOBAL = SeauJetons(DEBIT_GLOBAL) if DEBIT_GLOBAL else None
+
+
+class LimiteurDebit:
+    """ Combine le seau propre à une session et le seau global du serveur """
+
+    def __init__(self, debit_session=None):
+        self.seau_session = SeauJetons(debit_session) if debit_session else None
+
+    def consommer(self, n):
+        """ Retourne le délai imposé par le plus restrictif des deux seaux """
+        delai = 0.0
+        if self.seau_session:
+            delai = self.seau_session.consommer(n)
+        if SEAU_GLOBAL:
+            delai = max(delai, SEAU_GLOBAL.consommer(n))
+        return delai
+
+
+def creer_limiteur(utilisateur):
+    """ Retourne le limiteur de la session, ou None si elle n'est soumise à aucun plafond """
+    debit = debit_autorise(utilisateur)
+    if not debit and not SEAU_GLOBAL:
+        return None
+    return LimiteurDebit(debit)
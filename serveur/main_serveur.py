@@ -1,497 +1,310 @@
 # =================================================================
 # SERVEUR FTAM
 # =================================================================
-import os
+import argparse
 import socket
 import threading
-import json
-import base64
 import time
+from concurrent.futures import ThreadPoolExecutor
 from commun.constantes import *
-from serveur.gestion_droits import (
-    META_PATH,
-    charger_meta,
-    peut_lire,
-    peut_supprimer,
-    peut_ecrire,
-)
-from serveur.gestion_etats import MachineEtats
-from serveur.gestion_securite import authentifier
-from serveur.gestion_fichiers import verifier_existence, lire_bloc, RACINE
+from commun.trames import LecteurTrames, envoyer_pdu
+from serveur.gestion_droits import preparer_empreintes
+from serveur.gestion_securite import plafonds_actifs
+from serveur.session import FluxLecture, SessionFTAM
 from serveur.journalisation import configurer_journalisation, logger_info, logger_erreur
+from serveur.metriques import (
+    PORT_METRIQUES, SORTANTS, compter_octets, compteurs_du_thread, demarrer_serveur_metriques, enregistrer_jauge,
+    observer_requete,
+)
 
-# Dictionnaire global pour la persistance des sessions
-SESSIONS_RECOVERY = {}
-
-# Dictionnaire global pour les verrous de fichiers
-FICHIERS_VERROUS = {}
-VERROUS_LOCK = threading.Lock()  # Pour éviter les race conditions
-
-
-def gerer_client(conn, addr):
+# Admission des connexions : pool de threads borné et plafond de connexions
+TAILLE_POOL_SESSIONS = 64
+MAX_CONNEXIONS = 256  # Sessions actives + connexions en attente d'un thread
+# Connexions acceptées quand tous les threads sont pris ; au-delà, refus immédiat (503)
+FILE_ATTENTE = 8
+# Attente maximale (s) d'un thread dans cette file : au-delà, la connexion est refusée (503)
+# avant que le client n'abandonne de lui-même (il attend ses réponses 5 s)
+DELAI_FILE_ATTENTE = 2.0
+
+# Une connexion muette libère son thread : délai (s) pour la première PDU, puis entre deux PDU
+DELAI_PREMIERE_PDU = 2.0
+DELAI_INACTIVITE = 600.0
+
+# Sessions plafonnées en débit : servies hors du pool, pour que leurs attentes ne retiennent aucun
+# de ses threads ; au-delà de ce nombre, elles restent sur le thread du pool qui les a reçues
+MAX_SESSIONS_PLAFONNEES = 256
+POOL_PLAFONNEES = ThreadPoolExecutor(max_workers=MAX_SESSIONS_PLAFONNEES, thread_name_prefix="ftam-plafonnee")
+
+# Compteurs d'admission (lus par la commande console STATS)
+COMPTEURS_ADMISSION = {"actives": 0, "en_attente": 0, "acceptees": 0, "refusees": 0, "plafonnees": 0}
+ADMISSION_LOCK = threading.Lock()
+
+
+def reguler(session, volume):
+    """ Seules les sessions plafonnées attendent, les autres vont au débit du lien
+    L'attente bloque le thread de la session : un thread de POOL_PLAFONNEES, pas du pool d'admission """
+    delai = session.delai_debit(volume)
+    if delai:
+        time.sleep(delai)
+
+
+def diffuser_flux(conn, lecteur, session, flux, compteurs):
+    """ Envoie les blocs d'un flux F-READ en lisant les crédits du client au fil de l'eau
+    Retourne la requête qui a interrompu le flux, None s'il est allé à son terme """
+    while not flux.termine:
+        # Les crédits sont lus dès qu'ils arrivent, et attendus si la fenêtre est vide
+        if flux.credit == 0 or lecteur.donnees_en_attente():
+            requete, donnees_recues = lecteur.recevoir_trame()
+            if requete is None:
+                raise ConnectionError("Connexion fermée pendant le flux")
+            if not flux.accepter(requete):
+                return requete, donnees_recues
+            continue
+        bloc = flux.bloc_suivant()
+        if bloc:
+            pdu, donnees, volume = bloc
+            envoyer_pdu(conn, pdu, donnees)
+            compter_octets(compteurs, SORTANTS, volume)
+            reguler(session, volume)
+    return None
+
+
+def gerer_client(conn, addr, session=None, lecteur=None):
     """
     Fonction exécutée dans un thread pour chaque client connecté.
     Gère le cycle de vie de la session FTAM.
+    Sur le pool d'admission (session None), une session plafonnée en débit est confiée à
+    POOL_PLAFONNEES dès son F-INITIALIZE, qui la reprend avec sa session et son lecteur.
     """
-    logger_info(f"Connexion établie avec {addr}")
-    fsm = MachineEtats()
-    utilisateur_connecte = None
-    fichier_selectionne = None
-    role_user = None
-    offset_actuel = 0
+    depuis_le_pool = session is None
+    if depuis_le_pool:
+        logger_info(f"Connexion établie avec {addr}")
+        session = SessionFTAM(addr)
+        lecteur = LecteurTrames(conn)
+        # Le délai s'applique aussi aux envois : un client qui ne lit plus ne retient pas le thread
+        conn.settimeout(DELAI_PREMIERE_PDU)
+    # La session reste sur ce thread : ses compteurs sont ceux du thread
+    compteurs = compteurs_du_thread()
+    requete_differee = None
 
     while True:
         try:
-            data = conn.recv(4096).decode()
-            if not data:
+            if requete_differee:
+                requete, donnees_recues = requete_differee
+                requete_differee = None
+            else:
+                requete, donnees_recues = lecteur.recevoir_trame()
+            if requete is None:
                 break
-
-            requete = json.loads(data)
-            primitive = requete.get(K_PRIM)
-            parametres = requete.get(K_PARA, {})
-
-            # Réponse par défaut
-            reponse = {K_STAT: "ERREUR", K_CODE: 500, K_MESS: "Erreur serveur"}
-
-            # --- Vérification de la Machine à États ---
-            if not fsm.peut_executer(primitive):
-                logger_erreur(
-                    f"Action interdite : {primitive} en état {fsm.etat_actuel} pour {addr}"
-                )
-                reponse.update(
-                    {
-                        K_CODE: ERREUR_DROITS,
-                        K_MESS: f"Action interdite en l'état {fsm.etat_actuel}",
-                    }
-                )
-
-            # --- Traitement des Primitives ---
-            elif primitive == F_INITIALIZE:
-                """Initialise la session et authentifie l'utilisateur."""
-                role = authentifier(parametres.get("user"), parametres.get("mdp"))
-                if role:
-                    logger_info(
-                        f"Authentification réussie pour {parametres.get('user')} (Rôle: {role}) depuis {addr}"
-                    )
-                    fsm.transitionner("INITIALIZED")
-                    role_user = role
-                    utilisateur_connecte = parametres.get("user")
-                    print(
-                        f"[\033[94mAUTH\033[0m] {utilisateur_connecte} connecté (Rôle: {role})"
-                    )
-                    reponse.update(
-                        {
-                            K_STAT: "SUCCÈS",
-                            K_CODE: SUCCES,
-                            K_MESS: "Authentifié",
-                            "role": role,
-                        }
-                    )
-                else:
-                    logger_erreur(
-                        f"Échec d'authentification pour {parametres.get('user')} depuis {addr}"
-                    )
-                    reponse.update(
-                        {K_CODE: ERREUR_AUTH, K_MESS: "Identifiants invalides"}
-                    )
-
-            elif primitive == F_SELECT:
-                """Sélectionne un fichier ou liste le répertoire."""
-                nom_f = parametres.get("nom")
-                if nom_f == ".":
-                    try:
-                        from os import listdir
-
-                        logger_info(
-                            f"Liste des fichiers demandée par {utilisateur_connecte} depuis {addr}"
-                        )
-                        print(
-                            f"[\033[93mLIST\033[0m] Envoi de la liste des fichiers à {utilisateur_connecte}"
-                        )
-                        tous_les_fichiers = listdir(RACINE)
-                        fichiers_accessibles = [
-                            f
-                            for f in tous_les_fichiers
-                            if peut_lire(utilisateur_connecte, f)
-                        ]
-                        reponse.update(
-                            {
-                                K_STAT: "SUCCÈS",
-                                K_CODE: SUCCES,
-                                K_MESS: "Liste des fichiers récupérée",
-                                "fichiers": fichiers_accessibles,
-                            }
-                        )
-                    except Exception as e:
-                        reponse.update({K_MESS: str(e)})
-                elif verifier_existence(nom_f):
-                    if not peut_lire(utilisateur_connecte, nom_f):
-                        reponse.update(
-                            {
-                                K_CODE: ERREUR_DROITS,
-                                K_MESS: "Vous n'avez pas les droits de lecture sur ce fichier",
-                            }
-                        )
-                    else:
-                        logger_info(
-                            f"Fichier '{nom_f}' sélectionné par {utilisateur_connecte} depuis {addr}"
-                        )
-                        print(
-                            f"[\033[93mSELE\033[0m] {utilisateur_connecte} a sélectionné le fichier : {nom_f}"
-                        )
-                        fichier_selectionne = nom_f
-                        fsm.transitionner("SELECTED")
-                        reponse.update(
-                            {
-                                K_STAT: "SUCCÈS",
-                                K_CODE: SUCCES,
-                                K_MESS: f"Fichier {nom_f} sélectionné",
-                            }
-                        )
-                else:
-                    logger_erreur(
-                        f"Fichier '{nom_f}' introuvable pour {utilisateur_connecte} depuis {addr}"
-                    )
-                    reponse.update(
-                        {K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"}
-                    )
-
-            elif primitive == F_OPEN:
-                """Prépare le fichier pour le transfert."""
-                logger_info(
-                    f"Fichier '{fichier_selectionne}' ouvert pour {utilisateur_connecte} depuis {addr}"
-                )
-                print(
-                    f"[\033[32mOPEN\033[0m] Ouverture du fichier : {fichier_selectionne}"
-                )
-                fsm.transitionner("OPEN")
-                with VERROUS_LOCK:
-                    FICHIERS_VERROUS[fichier_selectionne] = True
-                taille = os.path.getsize(os.path.join(RACINE, fichier_selectionne))
-                reponse.update(
-                    {
-                        K_STAT: "SUCCÈS",
-                        K_CODE: SUCCES,
-                        K_MESS: "Fichier ouvert",
-                        "taille": taille,
-                    }
-                )
-
-            elif primitive == F_READ:
-                """Envoie les données par blocs et sauvegarde l'offset."""
-                try:
-                    logger_info(
-                        f"[\033[92mREAD\033[0m] Envoi bloc pour {fichier_selectionne} (Offset: {offset_actuel})"
-                    )
-                    print(
-                        f"[\033[92mREAD\033[0m] Envoi du bloc à partir de l'offset {offset_actuel} pour {fichier_selectionne}"
-                    )
-                    contenu = lire_bloc(fichier_selectionne, offset_actuel, TAILLE_BLOC)
-                    if contenu:
-                        logger_info(
-                            f"Bloc de {len(contenu)} octets envoyé pour {fichier_selectionne} à {utilisateur_connecte}"
-                        )
-                        donnees_b64 = base64.b64encode(contenu).decode("utf-8")
-                        offset_actuel += len(contenu)
-                        SESSIONS_RECOVERY[utilisateur_connecte] = {
-                            "fichier": fichier_selectionne,
-                            "offset": offset_actuel,
-                        }
-                        reponse.update(
-                            {K_STAT: "DONNÉES", K_CODE: SUCCES, "data": donnees_b64}
-                        )
-                        time.sleep(0.05)
-                    else:
-                        logger_info(
-                            f"Transfert terminé pour {fichier_selectionne} à {utilisateur_connecte}"
-                        )
-                        print(
-                            f"\n[\033[92mFIN\033[0m] Transfert terminé pour {fichier_selectionne}"
-                        )
-                        if utilisateur_connecte in SESSIONS_RECOVERY:
-                            del SESSIONS_RECOVERY[utilisateur_connecte]
-                        with VERROUS_LOCK:
-                            if fichier_selectionne in FICHIERS_VERROUS:
-                                del FICHIERS_VERROUS[fichier_selectionne]
-                        fsm.transitionner("SELECTED")
-                        reponse.update(
-                            {K_STAT: "FIN", K_CODE: SUCCES, K_MESS: "Transfert terminé"}
-                        )
-                except Exception as e:
-                    reponse.update({K_MESS: f"Erreur lecture : {str(e)}"})
-
-            elif primitive == F_TERMINATE:
-                """Ferme proprement la session."""
-                logger_info(f"Déconnexion de {utilisateur_connecte} depuis {addr}")
-                fsm.transitionner("IDLE")
-                reponse.update(
-                    {K_STAT: "SUCCÈS", K_CODE: SUCCES, K_MESS: "Déconnexion"}
-                )
-                conn.send(json.dumps(reponse).encode())
+            conn.settimeout(DELAI_INACTIVITE)
+
+            debut = time.perf_counter()
+            reponse, donnees_reponse, volume = session.traiter(requete, donnees_recues)
+            observer_requete(compteurs, requete, reponse, volume, debut)
+            if isinstance(reponse, FluxLecture):
+                # Toute requête arrivée pendant le flux l'interrompt, elle est traitée ensuite
+                requete_differee = diffuser_flux(conn, lecteur, session, reponse, compteurs)
+                reponse = reponse.conclusion()
+
+            # Les blocs d'un flux d'upload ne sont acquittés que par lots
+            if reponse is not None:
+                envoyer_pdu(conn, reponse, donnees_reponse)
+            reguler(session, volume)
+            if session.terminee:
                 break
-
-            elif primitive == F_WRITE:
-                """Réception de fichiers."""
-                logger_info(
-                    f"Réception de données pour {fichier_selectionne} de {utilisateur_connecte} depuis {addr}"
-                )
-                nom_f = parametres.get("nom")
-                data_b64 = parametres.get("data")
-                fin = parametres.get("fin", False)
-
-                if not nom_f:
-                    reponse.update({K_CODE: 400, K_MESS: "Nom de fichier manquant"})
-                    logger_erreur(
-                        f"Nom de fichier manquant dans la requête F_WRITE de {utilisateur_connecte} depuis {addr}"
-                    )
-                elif not peut_ecrire(utilisateur_connecte, nom_f):
-                    logger_erreur(
-                        f"Accès refusé pour l'écriture de '{nom_f}' par {utilisateur_connecte} depuis {addr}"
-                    )
-                    reponse.update(
-                        {K_CODE: ERREUR_DROITS, K_MESS: "Pas les droits d'écriture"}
-                    )
-                else:
-                    try:
-                        with VERROUS_LOCK:
-                            FICHIERS_VERROUS[nom_f] = True
-
-                        chemin = os.path.join(RACINE, nom_f)
-                        os.makedirs(RACINE, exist_ok=True)
-
-                        if data_b64:
-                            bloc = base64.b64decode(data_b64)
-                            mode = "ab" if os.path.exists(chemin) else "wb"
-                            with open(chemin, mode) as f:
-                                f.write(bloc)
-
-                        if fin:
-                            with VERROUS_LOCK:
-                                if nom_f in FICHIERS_VERROUS:
-                                    del FICHIERS_VERROUS[nom_f]
-
-                            meta = charger_meta()
-                            if nom_f not in meta:
-                                permissions_read = parametres.get(
-                                    "permissions_read", []
-                                )
-                                permissions_delete = parametres.get(
-                                    "permissions_delete", []
-                                )
-                                if utilisateur_connecte not in permissions_read:
-                                    permissions_read.append(utilisateur_connecte)
-                                if utilisateur_connecte not in permissions_delete:
-                                    permissions_delete.append(utilisateur_connecte)
-
-                                meta[nom_f] = {
-                                    "owner": utilisateur_connecte,
-                                    "permissions": {
-                                        "read": permissions_read,
-                                        "delete": permissions_delete,
-                                    },
-                                }
-                                with open(META_PATH, "w") as f:
-                                    json.dump(meta, f, indent=4)
-
-                            logger_info(
-                                f"[\033[92mWRITE\033[0m] Fichier '{nom_f}' uploadé par {utilisateur_connecte}"
-                            )
-                            print(
-                                f"[\033[92mWRITE\033[0m] Fichier '{nom_f}' uploadé par {utilisateur_connecte}"
-                            )
-
-                        # HARMONISATION : Ajout de K_CODE: SUCCES pour valider le test
-                        logger_info(
-                            f"Bloc de données reçu pour '{nom_f}' de {utilisateur_connecte} (Fin: {fin})"
-                        )
-                        reponse.update(
-                            {
-                                K_STAT: "SUCCÈS",
-                                K_CODE: SUCCES,
-                                K_MESS: "Bloc reçu" if not fin else "Fichier uploadé",
-                            }
-                        )
-                    except Exception as e:
-                        reponse.update({K_CODE: 500, K_MESS: str(e)})
-
-            elif primitive == F_SET_PERMISSIONS:
-                """Modification des droits."""
-                nom_f = parametres.get("nom")
-                if not verifier_existence(nom_f):
-                    logger_erreur(
-                        f"Fichier '{nom_f}' introuvable pour la modification des permissions par {utilisateur_connecte} depuis {addr}"
-                    )
-                    reponse.update(
-                        {K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"}
-                    )
-                else:
-                    meta = charger_meta()
-                    if (
-                        nom_f not in meta
-                        or meta[nom_f].get("owner") != utilisateur_connecte
-                    ):
-                        reponse.update(
-                            {
-                                K_CODE: ERREUR_DROITS,
-                                K_MESS: "Seul le propriétaire peut modifier",
-                            }
-                        )
-                    else:
-                        p_read = parametres.get("permissions_read", [])
-                        p_delete = parametres.get("permissions_delete", [])
-                        if utilisateur_connecte not in p_read:
-                            p_read.append(utilisateur_connecte)
-                        if utilisateur_connecte not in p_delete:
-                            p_delete.append(utilisateur_connecte)
-
-                        meta[nom_f]["permissions"] = {
-                            "read": p_read,
-                            "delete": p_delete,
-                        }
-                        with open(META_PATH, "w") as f:
-                            json.dump(meta, f, indent=4)
-
-                        # HARMONISATION : Ajout de K_CODE: SUCCES
-                        reponse.update(
-                            {
-                                K_STAT: "SUCCÈS",
-                                K_CODE: SUCCES,
-                                K_MESS: f"Permissions mises à jour pour {nom_f}",
-                            }
-                        )
-                        logger_info(
-                            f"[INFO] Permissions modifiées pour {nom_f} par {utilisateur_connecte}"
-                        )
-
-            elif primitive == F_RECOVER:
-                """Mécanisme de reprise."""
-                if utilisateur_connecte in SESSIONS_RECOVERY:
-                    contexte = SESSIONS_RECOVERY[utilisateur_connecte]
-                    fichier_selectionne = contexte["fichier"]
-                    offset_actuel = contexte["offset"]
-                    logger_info(
-                        f"[\033[35mRECO\033[0m] Demande de reprise pour {utilisateur_connecte} sur {fichier_selectionne}"
-                    )
-                    fsm.transitionner("OPEN")
-                    reponse.update(
-                        {
-                            K_STAT: "SUCCÈS",
-                            K_CODE: SUCCES,
-                            "fichier": fichier_selectionne,
-                            "offset": offset_actuel,
-                            K_MESS: f"Reprise à l'offset {offset_actuel}",
-                        }
-                    )
-                else:
-                    reponse.update(
-                        {
-                            K_CODE: ERREUR_NON_TROUVE,
-                            K_MESS: "Aucun contexte de reprise trouvé",
-                        }
-                    )
-
-            elif primitive == F_DELETE:
-                """Suppression de fichier - Sécurité vérifiée en priorité."""
-                nom_f = parametres.get("nom")
-                logger_info(
-                    f"[\033[91mDEL \033[0m] Requête de suppression : '{nom_f}' par {utilisateur_connecte}"
-                )
-
-                try:
-                    if not peut_supprimer(utilisateur_connecte, nom_f):
-                        reponse.update(
-                            {
-                                K_STAT: "ERREUR",
-                                K_CODE: ERREUR_DROITS,
-                                K_MESS: "Accès refusé : droits de suppression insuffisants",
-                            }
-                        )
-
-                    elif not verifier_existence(nom_f):
-                        reponse.update(
-                            {
-                                K_STAT: "ERREUR",
-                                K_CODE: ERREUR_NON_TROUVE,  # Renvoie 404
-                                K_MESS: "Fichier introuvable sur le serveur",
-                            }
-                        )
-                    else:
-                        with VERROUS_LOCK:
-                            verrouille = (
-                                nom_f in FICHIERS_VERROUS and FICHIERS_VERROUS[nom_f]
-                            )
-
-                        if verrouille:
-                            reponse.update(
-                                {
-                                    K_CODE: ERREUR_VERROU,
-                                    K_MESS: "Fichier en cours d'utilisation",
-                                }
-                            )
-                        else:
-                            os.remove(os.path.join(RACINE, nom_f))
-                            reponse.update(
-                                {
-                                    K_STAT: "SUCCÈS",
-                                    K_CODE: SUCCES,
-                                    K_MESS: f"Fichier {nom_f} supprimé avec succès",
-                                }
-                            )
-                            logger_info(f"[INFO] Suppression réussie de {nom_f}")
-
-                except Exception as e:
-                    reponse.update({K_CODE: 500, K_MESS: f"Erreur système: {str(e)}"})
-
-            conn.send(json.dumps(reponse).encode())
-            logger_info("\n\n + + + + ============== + + + +\n\n")
-
+            if (
+                depuis_le_pool
+                and session.limiteur
+                and requete_differee is None
+                and detacher_session(conn, addr, session, lecteur)
+            ):
+                return
+
+        except socket.timeout:
+            logger_info(f"Session de {addr} fermée : client inactif au-delà du délai")
+            break
         except Exception as e:
             logger_erreur(f"Erreur de communication avec {addr} : {e}")
             break
 
     # Nettoyage des verrous
-    if fichier_selectionne:
-        with VERROUS_LOCK:
-            if fichier_selectionne in FICHIERS_VERROUS:
-                del FICHIERS_VERROUS[fichier_selectionne]
+    session.fermer()
     conn.close()
 
 
-def demarrer_serveur():
-    """Lance le serveur TCP."""
+def executer_session(conn, addr, admise_le):
+    """ Exécute une session dans un thread du pool en tenant les compteurs d'admission à jour """
+    with ADMISSION_LOCK:
+        COMPTEURS_ADMISSION["en_attente"] -= 1
+        trop_tard = time.monotonic() - admise_le > DELAI_FILE_ATTENTE
+        if trop_tard:
+            COMPTEURS_ADMISSION["refusees"] += 1
+        else:
+            COMPTEURS_ADMISSION["actives"] += 1
+    if trop_tard:
+        refuser_connexion(conn, addr)
+        return
+    try:
+        gerer_client(conn, addr)
+    finally:
+        with ADMISSION_LOCK:
+            COMPTEURS_ADMISSION["actives"] -= 1
+
+
+def detacher_session(conn, addr, session, lecteur):
+    """ Confie une session plafonnée à POOL_PLAFONNEES et libère son thread du pool d'admission
+    Retourne False quand MAX_SESSIONS_PLAFONNEES sessions y sont déjà servies """
+    with ADMISSION_LOCK:
+        if COMPTEURS_ADMISSION["plafonnees"] >= MAX_SESSIONS_PLAFONNEES:
+            return False
+        COMPTEURS_ADMISSION["plafonnees"] += 1
+    POOL_PLAFONNEES.submit(executer_session_plafonnee, conn, addr, session, lecteur)
+    return True
+
+
+def executer_session_plafonnee(conn, addr, session, lecteur):
+    """ Poursuit une session plafonnée hors du pool d'admission, où elle ne compte plus """
+    try:
+        gerer_client(conn, addr, session, lecteur)
+    finally:
+        with ADMISSION_LOCK:
+            COMPTEURS_ADMISSION["plafonnees"] -= 1
+
+
+def refuser_connexion(conn, addr):
+    """ Répond immédiatement par une PDU d'erreur au lieu de laisser la connexion attendre """
+    logger_erreur(f"Connexion refusée pour {addr} : serveur surchargé")
+    try:
+        conn.settimeout(1.0)
+        envoyer_pdu(
+            conn,
+            {K_STAT: "ERREUR", K_CODE: ERREUR_SURCHARGE, K_MESS: "Serveur surchargé, réessayez plus tard"},
+        )
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def afficher_banniere(mode):
+    """ Affiche l'adresse d'écoute et le mode d'exécution du serveur """
+    print("\033[94m" + "=" * 40)
+    print("   SERVEUR FTAM Lancé...")
+    print(f"   Écoute sur : {ADRESSE_ECOUTE}:{PORT_DEFAUT}")
+    print(f"   Mode       : {mode}")
+    print("=" * 40 + "\033[0m")
+    print("Tapez 'QUIT' et appuyez sur Entrée pour arrêter le serveur ('STATS' pour les compteurs).\n")
+
+
+def demarrer_serveur(taille_pool=TAILLE_POOL_SESSIONS, max_connexions=MAX_CONNEXIONS, file_attente=FILE_ATTENTE):
+    """Lance le serveur TCP (sessions servies par un pool de threads borné)."""
+    # Une connexion n'attend un thread que dans une courte file : sinon elle est refusée tout de suite
+    capacite = min(max_connexions, taille_pool + file_attente)
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
         server_socket.bind((ADRESSE_ECOUTE, PORT_DEFAUT))
         server_socket.listen()
-        print("\033[94m" + "=" * 40)
-        print("   SERVEUR FTAM Lancé...")
-        print(f"   Écoute sur : {ADRESSE_ECOUTE}:{PORT_DEFAUT}")
-        print("=" * 40 + "\033[0m")
-        print("Tapez 'QUIT' et appuyez sur Entrée pour arrêter le serveur.\n")
+        afficher_banniere("threads")
+        if plafonds_actifs():
+            logger_info(
+                f"Plafonds de débit actifs : chaque session plafonnée occupe un thread dédié "
+                f"(au plus {MAX_SESSIONS_PLAFONNEES}) ; --mode asyncio est recommandé pour de nombreux clients plafonnés"
+            )
+        enregistrer_jauge(
+            "ftam_sessions", "Sessions du pool de threads (admission)", lambda: dict(COMPTEURS_ADMISSION), "etat"
+        )
+
+        pool = ThreadPoolExecutor(max_workers=taille_pool, thread_name_prefix="ftam-session")
 
         def accepter_clients():
             while True:
                 try:
                     conn, addr = server_socket.accept()
-                    threading.Thread(
-                        target=gerer_client, args=(conn, addr), daemon=True
-                    ).start()
-                except:
+                except OSError:
                     break
+                with ADMISSION_LOCK:
+                    admise = COMPTEURS_ADMISSION["actives"] + COMPTEURS_ADMISSION["en_attente"] < capacite
+                    if admise:
+                        COMPTEURS_ADMISSION["en_attente"] += 1
+                        COMPTEURS_ADMISSION["acceptees"] += 1
+                    else:
+                        COMPTEURS_ADMISSION["refusees"] += 1
+                if not admise:
+                    refuser_connexion(conn, addr)
+                    continue
+                # Pas d'algorithme de Nagle : les PDU d'un flux partent sans attendre d'ACK
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                pool.submit(executer_session, conn, addr, time.monotonic())
 
         thread_accept = threading.Thread(target=accepter_clients, daemon=True)
         thread_accept.start()
         while True:
-            if input().strip().upper() == "QUIT":
+            commande = input().strip().upper()
+            if commande == "QUIT":
                 logger_info("Arrêt du serveur...")
                 server_socket.close()
+                pool.shutdown(wait=False, cancel_futures=True)
+                POOL_PLAFONNEES.shutdown(wait=False, cancel_futures=True)
                 break
+            elif commande == "STATS":
+                with ADMISSION_LOCK:
+                    print(f"[STATS] {COMPTEURS_ADMISSION}")
 
     except Exception as e:
         logger_erreur(f"Erreur au démarrage : {e}")
 
 
 if __name__ == "__main__":
-    configurer_journalisation()
-    demarrer_serveur()
+    parser = argparse.ArgumentParser(description="Serveur FTAM")
+    parser.add_argument(
+        "--mode",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="cœur réseau : pool de threads borné, ou boucle asyncio unique",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=TAILLE_POOL_SESSIONS,
+        help="nombre de threads servant les sessions (mode threads)",
+    )
+    parser.add_argument(
+        "--max-connexions",
+        type=int,
+        default=MAX_CONNEXIONS,
+        help="au-delà, les nouvelles connexions sont refusées avec une PDU 503 (mode threads)",
+    )
+    parser.add_argument(
+        "--file-attente",
+        type=int,
+        default=FILE_ATTENTE,
+        help="connexions qui peuvent attendre un thread libre ; au-delà, refus 503 immédiat (mode threads)",
+    )
+    parser.add_argument(
+        "--niveau-log",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="niveau minimal des messages écrits dans serveur.log",
+    )
+    parser.add_argument(
+        "--port-metriques",
+        type=int,
+        default=PORT_METRIQUES,
+        help="port local (127.0.0.1) du point d'accès /metrics au format Prometheus, 0 pour le désactiver",
+    )
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="aucun affichage console des sessions ni des logs (fichier seulement)",
+    )
+    args = parser.parse_args()
+    configurer_journalisation(args.niveau_log, console=not args.production)
+    demarrer_serveur_metriques(args.port_metriques)
+    preparer_empreintes()
+    if args.mode == "asyncio":
+        from serveur.serveur_async import demarrer_serveur_async
+
+        demarrer_serveur_async(afficher_banniere)
+    else:
+        demarrer_serveur(args.workers, args.max_connexions, args.file_attente)
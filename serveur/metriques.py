@@ -0,0 +1,194 @@
+# =================================================================
+# MÉTRIQUES DU SERVEUR (FORMAT D'EXPOSITION PROMETHEUS)
+# =================================================================
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from commun.constantes import *
+from serveur.gestion_etats import TRANSITIONS
+from serveur.gestion_fichiers import statistiques_cache
+from serveur.gestion_reprises import nb_reprises_en_attente
+from serveur.gestion_verrous import statistiques_verrous
+from serveur.journalisation import logger_erreur, logger_info, statistiques_journal
+
+# Point d'accès texte, local uniquement : http://127.0.0.1:9121/metrics
+ADRESSE_METRIQUES = "127.0.0.1"
+PORT_METRIQUES = 9121
+
+# Bornes (s) des histogrammes de latence par primitive
+BORNES_LATENCE = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Primitives connues ; toute autre valeur reçue est comptée sous "inconnue"
+PRIMITIVES = frozenset(TRANSITIONS)
+
+# Sens des octets de données comptés
+ENTRANTS = "entrants"
+SORTANTS = "sortants"
+
+# Chaque thread enregistre dans ses propres compteurs : aucun verrou sur le chemin critique.
+# Le gestionnaire de connexion les obtient une fois (compteurs_du_thread) et les passe à chaque appel.
+# L'export additionne les compteurs de tous les threads.
+_LOCAL = threading.local()
+_SOMME = len(BORNES_LATENCE) + 1
+_OCTETS = _SOMME + 1
+_TOUS = []
+_TOUS_LOCK = threading.Lock()
+
+# nom -> (aide, fonction, libellé) ; la fonction retourne un nombre, ou {valeur du libellé: nombre}
+_JAUGES = {}
+
+
+class _Compteurs:
+    __slots__ = ("series", "octets")
+
+    def __init__(self):
+        # (primitive, code) -> [effectifs par borne (+Inf inclus)..., somme des durées, octets]
+        # Une série par couple de libellés : une seule recherche par requête, rien à créer ensuite.
+        # Les octets d'une série sont entrants pour F-WRITE, sortants sinon.
+        self.series = {}
+        self.octets = {ENTRANTS: 0, SORTANTS: 0}
+
+    def serie(self, primitive, code):
+        """ Série d'un couple pas encore vu ; toute primitive inconnue est comptée sous "inconnue" """
+        if not isinstance(primitive, str) or primitive not in PRIMITIVES:
+            primitive = "inconnue"
+        cle = (primitive, code)
+        serie = self.series.get(cle)
+        if serie is None:
+            serie = self.series[cle] = [0] * (len(BORNES_LATENCE) + 1) + [0.0, 0]
+        return serie
+
+
+def compteurs_du_thread():
+    """ Compteurs du thread appelant, à passer à observer_requete et compter_octets """
+    try:
+        return _LOCAL.compteurs
+    except AttributeError:
+        compteurs = _LOCAL.compteurs = _Compteurs()
+        with _TOUS_LOCK:
+            _TOUS.append(compteurs)
+        return compteurs
+
+
+def compter_octets(compteurs, sens, volume):
+    """ Ajoute des octets de données utiles (ENTRANTS ou SORTANTS) """
+    compteurs.octets[sens] += volume
+
+
+def observer_requete(compteurs, requete, reponse, volume, debut):
+    """ Enregistre une requête traitée par la session (debut : time.perf_counter() avant traiter)
+    Appelée pour chaque trame : une recherche de série et trois additions, sans verrou """
+    duree = time.perf_counter() - debut
+    if reponse is None and not volume:
+        # Crédit de flux arrivé après la fin du flux : ni réponse ni données
+        return
+    cle = (requete.get(K_PRIM), reponse.get(K_CODE, 0) if isinstance(reponse, dict) else SUCCES)
+    try:
+        serie = compteurs.series[cle]
+    except (KeyError, TypeError):
+        serie = compteurs.serie(*cle)
+    serie[bisect_left(BORNES_LATENCE, duree)] += 1
+    serie[_SOMME] += duree
+    serie[_OCTETS] += volume
+
+
+def enregistrer_jauge(nom, aide, fonction, libelle=None):
+    """ Déclare une jauge lue à chaque export (fonction sans argument) """
+    _JAUGES[nom] = (aide, fonction, libelle)
+
+
+# Jauges des gestionnaires partagés, communes aux deux cœurs réseau
+enregistrer_jauge("ftam_verrous", "Verrous de fichiers tenus ou attendus", statistiques_verrous, "type")
+enregistrer_jauge("ftam_reprises_en_attente", "Points de reprise pas encore écrits sur disque", nb_reprises_en_attente)
+enregistrer_jauge("ftam_cache_fichiers", "Occupation des caches de gestion_fichiers", statistiques_cache, "type")
+enregistrer_jauge("ftam_journal", "File des journaux et messages abandonnés", statistiques_journal, "type")
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def exporter():
+    """ Retourne toutes les métriques au format texte d'exposition Prometheus """
+    with _TOUS_LOCK:
+        tous = list(_TOUS)
+    series, codes, octets = {}, {}, {ENTRANTS: 0, SORTANTS: 0}
+    for compteurs in tous:
+        # Copies (atomiques) : le thread propriétaire continue d'enregistrer pendant l'export
+        for (primitive, code), serie in dict(compteurs.series).items():
+            serie = list(serie)
+            total = series.setdefault(primitive, [0] * _OCTETS)
+            for rang in range(_OCTETS):
+                total[rang] += serie[rang]
+            codes[(primitive, code)] = codes.get((primitive, code), 0) + sum(serie[:_SOMME])
+            octets[ENTRANTS if primitive == F_WRITE else SORTANTS] += serie[_OCTETS]
+        for sens, nombre in dict(compteurs.octets).items():
+            octets[sens] += nombre
+
+    lignes = [
+        "# HELP ftam_primitive_duree_secondes Durée de traitement des primitives",
+        "# TYPE ftam_primitive_duree_secondes histogram",
+    ]
+    for primitive in sorted(series):
+        cumul = 0
+        for borne, effectif in zip(BORNES_LATENCE + ("+Inf",), series[primitive][:_SOMME]):
+            cumul += effectif
+            lignes.append(f'ftam_primitive_duree_secondes_bucket{{primitive="{primitive}",le="{borne}"}} {cumul}')
+        lignes.append(f'ftam_primitive_duree_secondes_sum{{primitive="{primitive}"}} {series[primitive][_SOMME]:.6f}')
+        lignes.append(f'ftam_primitive_duree_secondes_count{{primitive="{primitive}"}} {cumul}')
+
+    lignes += ["# HELP ftam_reponses_total Réponses par primitive et code", "# TYPE ftam_reponses_total counter"]
+    for (primitive, code), nombre in sorted(codes.items(), key=lambda e: (e[0][0], str(e[0][1]))):
+        lignes.append(f'ftam_reponses_total{{primitive="{primitive}",code="{_echapper(code)}"}} {nombre}')
+
+    lignes += ["# HELP ftam_octets_donnees_total Octets de données transférés", "# TYPE ftam_octets_donnees_total counter"]
+    for sens, nombre in octets.items():
+        lignes.append(f'ftam_octets_donnees_total{{sens="{sens}"}} {nombre}')
+
+    for nom, (aide, fonction, libelle) in sorted(_JAUGES.items()):
+        try:
+            valeur = fonction()
+        except Exception:
+            continue
+        lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} gauge"]
+        if isinstance(valeur, dict):
+            for cle, nombre in valeur.items():
+                lignes.append(f'{nom}{{{libelle}="{_echapper(cle)}"}} {nombre}')
+        else:
+            lignes.append(f"{nom} {valeur}")
+    return "\n".join(lignes) + "\n"
+
+
+class _GestionnaireMetriques(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corps = exporter().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def demarrer_serveur_metriques(port=PORT_METRIQUES):
+    """ Sert /metrics sur l'interface locale dans un thread dédié (port 0 : désactivé) """
+    if not port:
+        return None
+    try:
+        serveur = ThreadingHTTPServer((ADRESSE_METRIQUES, port), _GestionnaireMetriques)
+    except OSError as e:
+        logger_erreur(f"Métriques indisponibles sur le port {port} : {e}")
+        return None
+    serveur.daemon_threads = True
+    threading.Thread(target=serveur.serve_forever, name="ftam-metriques", daemon=True).start()
+    logger_info(f"Métriques exposées sur http://{ADRESSE_METRIQUES}:{port}/metrics")
+    return serveur
@@ -0,0 +1,175 @@
+# =================================================================
+# SERVEUR FTAM - CŒUR ASYNCIO
+# =================================================================
+import asyncio
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from commun.constantes import *
+from commun.trames import ENTETE_TRAME, ErreurTrame, PlageFichier, encoder_pdu
+from serveur.session import FluxLecture, SessionFTAM
+from serveur.journalisation import logger_info, logger_erreur
+from serveur.metriques import SORTANTS, compter_octets, compteurs_du_thread, enregistrer_jauge, observer_requete
+
+# Les E/S disque des primitives passent par un pool borné : la boucle ne bloque jamais
+TAILLE_POOL_DISQUE = 32
+EXECUTEUR_DISQUE = ThreadPoolExecutor(
+    max_workers=TAILLE_POOL_DISQUE, thread_name_prefix="ftam-disque"
+)
+
+# Trames lues d'avance par connexion (crédits de flux, requêtes en attente)
+TAILLE_FILE_TRAMES = 64
+
+COMPTEURS_SESSIONS = {"actives": 0, "acceptees": 0}
+
+
+async def lire_trame(reader):
+    """ Lit une trame complète, retourne (pdu, donnees) ou (None, None) à la fermeture """
+    try:
+        entete = await reader.readexactly(ENTETE_TRAME.size)
+        taille_json, taille_donnees = ENTETE_TRAME.unpack(entete)
+        if taille_json + taille_donnees > TAILLE_MAX_TRAME:
+            raise ErreurTrame(f"Trame annoncée trop volumineuse ({taille_json + taille_donnees} octets)")
+        pdu = json.loads(await reader.readexactly(taille_json))
+        donnees = await reader.readexactly(taille_donnees) if taille_donnees else None
+        return pdu, donnees
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None, None
+
+
+async def ecrire_pdu(writer, pdu, donnees=None):
+    """ Envoie une PDU, suivie de ses données binaires éventuelles """
+    if isinstance(donnees, PlageFichier):
+        writer.write(encoder_pdu(pdu, len(donnees)))
+        try:
+            envoye = await asyncio.get_running_loop().sendfile(
+                writer.transport, donnees.fichier, donnees.offset, donnees.longueur, fallback=False
+            )
+        except asyncio.SendfileNotAvailableError:
+            writer.write(donnees.fichier.lire(donnees.offset, donnees.longueur))
+            envoye = donnees.longueur
+        if envoye != donnees.longueur:
+            raise ErreurTrame(f"Fichier tronqué pendant l'envoi ({envoye}/{donnees.longueur} octets)")
+    elif donnees:
+        writer.write(encoder_pdu(pdu, len(donnees)))
+        # Copie : le tampon de bloc de la session est réutilisé dès le bloc suivant
+        writer.write(bytes(donnees))
+    else:
+        writer.write(encoder_pdu(pdu))
+    await writer.drain()
+
+
+async def recevoir_trames(reader, file):
+    """ Tâche de lecture : pousse les trames reçues dans la file de la session, (None, None) en dernier """
+    try:
+        while True:
+            trame = await lire_trame(reader)
+            await file.put(trame)
+            if trame[0] is None:
+                break
+    except Exception as e:
+        logger_erreur(f"Trame invalide : {e}")
+        await file.put((None, None))
+
+
+async def reguler(session, volume):
+    """ Les sessions plafonnées cèdent la boucle au lieu de bloquer un thread """
+    delai = session.delai_debit(volume)
+    if delai:
+        await asyncio.sleep(delai)
+
+
+async def diffuser_flux(writer, file, session, flux, compteurs):
+    """ Envoie les blocs d'un flux F-READ en intégrant les crédits reçus entre-temps
+    Retourne la requête qui a interrompu le flux, None s'il est allé à son terme """
+    boucle = asyncio.get_running_loop()
+    while not flux.termine:
+        if flux.credit == 0 or not file.empty():
+            requete, donnees_recues = await file.get()
+            if requete is None:
+                raise ConnectionError("Connexion fermée pendant le flux")
+            if not flux.accepter(requete):
+                return requete, donnees_recues
+            continue
+        bloc = await boucle.run_in_executor(EXECUTEUR_DISQUE, flux.bloc_suivant)
+        if bloc:
+            pdu, donnees, volume = bloc
+            await ecrire_pdu(writer, pdu, donnees)
+            compter_octets(compteurs, SORTANTS, volume)
+            await reguler(session, volume)
+    return None
+
+
+async def gerer_client_async(reader, writer):
+    """ Coroutine exécutée pour chaque client connecté, équivalent asyncio de gerer_client """
+    addr = writer.get_extra_info("peername")
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    logger_info(f"Connexion établie avec {addr}")
+    boucle = asyncio.get_running_loop()
+    session = SessionFTAM(addr)
+    file = asyncio.Queue(maxsize=TAILLE_FILE_TRAMES)
+    lecture = asyncio.create_task(recevoir_trames(reader, file))
+    # Compteurs du thread de la boucle, le seul qui enregistre les métriques en mode asyncio
+    compteurs = compteurs_du_thread()
+    requete_differee = None
+    COMPTEURS_SESSIONS["actives"] += 1
+    COMPTEURS_SESSIONS["acceptees"] += 1
+
+    try:
+        while True:
+            if requete_differee:
+                requete, donnees_recues = requete_differee
+                requete_differee = None
+            else:
+                requete, donnees_recues = await file.get()
+            if requete is None:
+                break
+
+            debut = time.perf_counter()
+            reponse, donnees_reponse, volume = await boucle.run_in_executor(
+                EXECUTEUR_DISQUE, session.traiter, requete, donnees_recues
+            )
+            observer_requete(compteurs, requete, reponse, volume, debut)
+            if isinstance(reponse, FluxLecture):
+                requete_differee = await diffuser_flux(writer, file, session, reponse, compteurs)
+                reponse = reponse.conclusion()
+
+            if reponse is not None:
+                await ecrire_pdu(writer, reponse, donnees_reponse)
+            await reguler(session, volume)
+            if session.terminee:
+                break
+    except Exception as e:
+        logger_erreur(f"Erreur de communication avec {addr} : {e}")
+    finally:
+        COMPTEURS_SESSIONS["actives"] -= 1
+        lecture.cancel()
+        await boucle.run_in_executor(EXECUTEUR_DISQUE, session.fermer)
+        writer.close()
+
+
+async def servir(afficher_banniere):
+    """ Démarre l'écoute asyncio et attend la commande QUIT sur la console """
+    serveur = await asyncio.start_server(
+        gerer_client_async, ADRESSE_ECOUTE, PORT_DEFAUT, reuse_address=True, backlog=1024
+    )
+    afficher_banniere("asyncio")
+    enregistrer_jauge("ftam_sessions", "Sessions du cœur asyncio", lambda: dict(COMPTEURS_SESSIONS), "etat")
+    boucle = asyncio.get_running_loop()
+    async with serveur:
+        while True:
+            ligne = await boucle.run_in_executor(None, input)
+            if ligne.strip().upper() == "QUIT":
+                logger_info("Arrêt du serveur...")
+                break
+
+
+def demarrer_serveur_async(afficher_banniere):
+    """ Lance le serveur TCP sur une boucle asyncio unique """
+    try:
+        asyncio.run(servir(afficher_banniere))
+    except Exception as e:
+        logger_erreur(f"Erreur au démarrage : {e}")
@@ -0,0 +1,1066 @@
+# =================================================================
+# SESSION FTAM (TRAITEMENT DES PRIMITIVES, INDÉPENDANT DU TRANSPORT)
+# =================================================================
+import base64
+import time
+from commun.constantes import *
+from commun.compression import ESSAIS_COMPRESSION, negocier, est_deja_compresse, decompresser
+from commun.integrite import crc_bloc, nouvelle_empreinte, empreinte_fichier
+from commun.trames import PlageFichier
+from serveur.gestion_droits import (
+    creer_meta,
+    modifier_permissions,
+    indexer_fichier,
+    desindexer_fichier,
+    lister_lisibles,
+    lire_empreinte,
+    enregistrer_empreinte,
+    peut_lire,
+    peut_supprimer,
+    peut_ecrire,
+)
+from serveur.gestion_etats import MachineEtats
+from serveur.gestion_securite import authentifier
+from serveur.gestion_fichiers import (
+    verifier_existence,
+    acquerir_fichier,
+    relacher_fichier,
+    supprimer_fichier,
+    preparer_bloc,
+    crcs_blocs,
+    preparer_empreinte,
+    signature_document,
+    texte_signature,
+    chemin_partiel,
+    taille_partielle,
+    ouvrir_partiel,
+    publier_partiel,
+    supprimer_partiel,
+)
+from serveur.gestion_reprises import (
+    LECTURE,
+    ECRITURE,
+    enregistrer_reprise,
+    supprimer_reprise,
+    lire_reprise,
+)
+from serveur.gestion_verrous import acquerir_lecture, acquerir_ecriture, liberer, liberer_tout
+from serveur.limiteur_debit import creer_limiteur
+from serveur.journalisation import afficher, logger_info, logger_erreur, logger_bloc, journaliser_acces
+
+
+def est_credit(requete):
+    """ Indique si la PDU est un crédit de flux F-READ (sans réponse attendue) """
+    return requete.get(K_PRIM) == F_READ and "credit" in requete.get(K_PARA, {})
+
+
+class FluxLecture:
+    """ Flux F-READ en cours : les blocs partent d'avance dans la limite du crédit accordé par le client
+    Le transport envoie les blocs, lit les crédits et termine par la PDU de conclusion """
+
+    def __init__(self, session, fenetre, blocs=None):
+        self.session = session
+        self.credit = fenetre
+        self.restants = blocs  # None = tout le reste du fichier
+        self.fin_fichier = False
+        self.interrompu = False
+        self.erreur = None
+
+    @property
+    def termine(self):
+        if self.fin_fichier or self.interrompu or self.erreur:
+            return True
+        return self.restants is not None and self.restants <= 0
+
+    def accepter(self, requete):
+        """ Intègre un crédit reçu pendant le flux
+        Retourne False si la PDU est une autre requête : le flux s'interrompt et elle sera traitée ensuite """
+        if not est_credit(requete):
+            self.interrompu = True
+            return False
+        parametres = requete[K_PARA]
+        self.credit += int(parametres["credit"])
+        # En flux, la reprise se fait à l'offset acquitté par le client
+        if "recu" in parametres:
+            self.session.marquer_reprise(int(parametres["recu"]))
+        return True
+
+    def bloc_suivant(self):
+        """ Retourne (pdu, donnees, volume) du prochain bloc, ou None si le flux est terminé """
+        try:
+            pdu, donnees, taille = self.session.bloc_suivant(point_de_reprise=False)
+        except Exception as e:
+            self.erreur = str(e)
+            return None
+        if not taille:
+            self.fin_fichier = True
+            return None
+        self.credit -= 1
+        if self.restants is not None:
+            self.restants -= 1
+        return pdu, donnees, taille
+
+    def conclusion(self):
+        """ PDU qui clôt le flux """
+        if self.erreur:
+            return {K_STAT: "ERREUR", K_CODE: 500, K_MESS: f"Erreur lecture : {self.erreur}"}
+        if self.fin_fichier:
+            return self.session.terminer_lecture()
+        if self.interrompu:
+            return {
+                K_STAT: "ERREUR",
+                K_CODE: 409,
+                K_MESS: "Flux interrompu",
+                "offset": self.session.offset_actuel,
+            }
+        return {
+            K_STAT: "SUCCÈS",
+            K_CODE: SUCCES,
+            K_MESS: "Fenêtre de blocs envoyée",
+            "offset": self.session.offset_actuel,
+        }
+
+
+class SessionFTAM:
+    """ État et traitement des primitives d'une connexion FTAM
+    Le transport (threads ou asyncio) lit les trames, appelle traiter() et envoie le résultat """
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.fsm = MachineEtats()
+        self.utilisateur_connecte = None
+        self.fichier_selectionne = None
+        self.role_user = None
+        self.offset_actuel = 0
+        self.fin_plage = None  # Fin (exclue) de la plage demandée par F-READ, None = fin du fichier
+        self.transfert = ""  # Identifiant du téléchargement en cours, fourni par le client
+        self.mode_binaire = False
+        self.taille_bloc = TAILLE_BLOC
+        self.compression = None  # Algorithme de compression négocié, None = blocs bruts
+        self.essais_compression = 0  # Blocs encore à tenter de compresser pour la lecture en cours
+        self.tampon_bloc = None
+        self.fichier_lu = None  # Fichier ouvert de F-OPEN à la fin de la lecture
+        self.verrou_lecture = None  # Fichier dont la session tient le verrou de lecture (F-OPEN, F-RECOVER)
+        self.taille_lue = 0
+        self.crcs_lus = None  # Table des CRC par bloc du fichier lu (mode binaire)
+        self.empreinte_lue = None  # Empreinte du fichier lu, obtenue au premier besoin
+        self.empreinte_ecriture = None  # (fichier temporaire, octets empreintés, empreinte) de l'upload en cours
+        self.limiteur = None
+        self.televersement = None  # Flux d'upload en cours (fichier ouvert pour toute la durée)
+        self.suivis = {}  # sens -> compteurs du transfert en cours, résumés dans le journal d'accès
+        self.terminee = False
+        # Sorties de la dernière requête traitée
+        self.donnees_reponse = None
+        self.volume = 0
+
+    def traiter(self, requete, donnees_recues=None):
+        """ Traite une requête et retourne (reponse, donnees_binaires, volume)
+        reponse vaut None lorsqu'aucune réponse n'est due, ou un FluxLecture pour un F-READ en flux """
+        primitive = requete.get(K_PRIM)
+        parametres = requete.get(K_PARA, {})
+
+        # Crédit de flux arrivé après la fin du flux : sans réponse
+        if est_credit(requete):
+            return None, None, 0
+
+        # Réponse par défaut
+        reponse = {K_STAT: "ERREUR", K_CODE: 500, K_MESS: "Erreur serveur"}
+        self.donnees_reponse = None
+        self.volume = 0  # Octets de données utiles transférés par cette requête
+
+        # --- Vérification de la Machine à États ---
+        if not self.fsm.peut_executer(primitive):
+            logger_erreur(
+                f"Action interdite : {primitive} en état {self.fsm.etat_actuel} pour {self.addr}"
+            )
+            reponse.update(
+                {
+                    K_CODE: ERREUR_DROITS,
+                    K_MESS: f"Action interdite en l'état {self.fsm.etat_actuel}",
+                }
+            )
+
+        # --- Traitement des Primitives ---
+        else:
+            reponse = self.GESTIONNAIRES[primitive](self, reponse, parametres, donnees_recues)
+
+        # Requête pipelinée : la réponse reprend son identifiant
+        if K_ID in requete and isinstance(reponse, dict):
+            reponse[K_ID] = requete[K_ID]
+        return reponse, self.donnees_reponse, self.volume
+
+    def fermer(self):
+        """ Libère les ressources de la session à la déconnexion """
+        self.clore_suivi(LECTURE, "interrompu")
+        self.clore_suivi(ECRITURE, "interrompu")
+        self.fermer_televersement()
+        self.fermer_lecture()
+        liberer_tout(self)
+
+    def delai_debit(self, volume):
+        """ Délai (s) imposé par le plafond de débit de la session, 0 si elle n'en a pas """
+        if self.limiteur and volume:
+            return self.limiteur.consommer(volume)
+        return 0.0
+
+    # -----------------------------------------------------------------
+    # Suivi des transferts (journal d'accès)
+    # -----------------------------------------------------------------
+    def demarrer_suivi(self, sens, fichier, offset=0, reprise=False):
+        """ Commence le résumé d'un transfert ; celui du même sens encore ouvert est clos comme interrompu
+        (sauf s'il n'a encore rien transféré du même fichier, comme F-RECOVER suivi de F-OPEN) """
+        precedent = self.suivis.get(sens)
+        if precedent and precedent["fichier"] == fichier and not precedent["blocs"]:
+            reprise = reprise or precedent["reprises"]
+            del self.suivis[sens]
+        self.clore_suivi(sens, "interrompu")
+        self.suivis[sens] = {
+            "fichier": fichier,
+            "transfert": self.transfert if sens == LECTURE else "",
+            "debut": time.monotonic(),
+            "offset": offset,
+            # [début, fin[ lue par une session d'un téléchargement parallèle, None pour un fichier entier
+            "plage": None,
+            "octets": 0,
+            "blocs": 0,
+            "reprises": int(reprise),
+        }
+
+    def compter_bloc(self, sens, taille):
+        suivi = self.suivis.get(sens)
+        if suivi:
+            suivi["octets"] += taille
+            suivi["blocs"] += 1
+
+    def clore_suivi(self, sens, statut):
+        """ Écrit le résumé du transfert en cours dans le journal d'accès """
+        suivi = self.suivis.pop(sens, None)
+        if suivi is None:
+            return
+        duree = time.monotonic() - suivi["debut"]
+        journaliser_acces(
+            "transfert",
+            utilisateur=self.utilisateur_connecte,
+            adresse=self.addr[0] if isinstance(self.addr, tuple) else str(self.addr),
+            fichier=suivi["fichier"],
+            transfert=suivi["transfert"],
+            sens=sens,
+            statut=statut,
+            offset=suivi["offset"],
+            plage=suivi["plage"],
+            octets=suivi["octets"],
+            blocs=suivi["blocs"],
+            reprises=suivi["reprises"],
+            duree=round(duree, 3),
+            debit=round(suivi["octets"] / duree) if duree > 0 else None,
+            compression=self.compression,
+        )
+
+    # -----------------------------------------------------------------
+    # Outils de transfert
+    # -----------------------------------------------------------------
+    def marquer_reprise(self, offset):
+        """ Enregistre le point de reprise du téléchargement en cours """
+        if self.fin_plage is not None:
+            # Une plage d'un téléchargement parallèle n'est pas une reprise du fichier entier
+            return
+        enregistrer_reprise(
+            self.utilisateur_connecte, self.fichier_selectionne, LECTURE, offset, self.transfert, self.empreinte_lue
+        )
+
+    def ouvrir_lecture(self):
+        """ Ouvre le fichier sélectionné une fois pour toute la lecture (verrou déjà pris) """
+        if self.fichier_lu:
+            relacher_fichier(self.fichier_lu)
+            self.fichier_lu = None
+        self.fichier_lu = acquerir_fichier(self.fichier_selectionne)
+        self.taille_lue = self.fichier_lu.taille
+        self.crcs_lus = None
+        self.empreinte_lue = None
+        if self.compression and not est_deja_compresse(self.fichier_selectionne):
+            self.essais_compression = ESSAIS_COMPRESSION
+        else:
+            self.essais_compression = 0
+
+    def verrouiller_lecture(self, nom):
+        """ Prend le verrou de lecture de nom après avoir rendu celui de la lecture précédente """
+        self.fermer_lecture()
+        if not acquerir_lecture(nom, self):
+            return False
+        self.verrou_lecture = nom
+        return True
+
+    def fermer_lecture(self):
+        """ Ferme le fichier lu et rend son verrou de lecture """
+        if self.fichier_lu:
+            relacher_fichier(self.fichier_lu)
+            self.fichier_lu = None
+        if self.verrou_lecture:
+            liberer(self.verrou_lecture, self)
+            self.verrou_lecture = None
+
+    def empreinte_lecture(self):
+        """ Empreinte du fichier ouvert lue dans les métadonnées, None si elle n'y est pas encore
+        Une empreinte manquante est calculée en arrière-plan : F-OPEN ne relit jamais tout le fichier """
+        if self.empreinte_lue is None:
+            signature = texte_signature(self.fichier_lu.signature)
+            self.empreinte_lue = lire_empreinte(self.fichier_selectionne, signature)
+            if self.empreinte_lue is None:
+                # En mode binaire, la même lecture prépare les CRC des blocs qui partiront par sendfile
+                preparer_empreinte(
+                    self.fichier_selectionne, self.taille_bloc if self.mode_binaire else None, enregistrer_empreinte
+                )
+        return self.empreinte_lue
+
+    def empreinte_partielle(self, partiel, offset):
+        """ Empreinte des offset premiers octets d'un upload, relue sur disque
+        seulement si la session ne l'a pas déjà suivie bloc après bloc """
+        suivi = self.empreinte_ecriture
+        if suivi and suivi[0] == partiel and suivi[1] == offset:
+            return suivi[2]
+        empreinte = nouvelle_empreinte()
+        if offset:
+            empreinte_fichier(partiel, offset, empreinte)
+        return empreinte
+
+    def crc_envoi(self, taille):
+        """ CRC du bloc à l'offset courant pris dans la table du fichier quand elle est prête :
+        le bloc part par sendfile sans être lu ; sinon il est lu pour son seul CRC """
+        if self.crcs_lus is None:
+            self.crcs_lus = crcs_blocs(self.fichier_lu, self.taille_bloc)
+        rang, decalage = divmod(self.offset_actuel, self.taille_bloc)
+        if self.crcs_lus is not None and not decalage and rang < len(self.crcs_lus) and (
+            taille == self.taille_bloc or self.offset_actuel + taille == self.taille_lue
+        ):
+            return self.crcs_lus[rang]
+        # Table pas encore calculée, bloc non aligné ou tronqué par une plage : lu pour son CRC
+        return preparer_bloc(self.fichier_lu, self.offset_actuel, taille)[0]
+
+    def bloc_suivant(self, point_de_reprise=True):
+        """ Prépare le bloc à l'offset courant et avance l'offset
+        Retourne (pdu, donnees_binaires, taille), taille nulle en fin de fichier ou de plage
+        En mode binaire, les données sont une PlageFichier que le transport envoie par sendfile """
+        if self.fichier_lu is None:
+            self.ouvrir_lecture()
+        fin = self.taille_lue if self.fin_plage is None else min(self.fin_plage, self.taille_lue)
+        taille = min(self.taille_bloc, fin - self.offset_actuel)
+        if taille <= 0:
+            return None, None, 0
+        pdu = {K_STAT: "DONNÉES", K_CODE: SUCCES, "offset": self.offset_actuel}
+        crc = compresse = None
+        if self.essais_compression:
+            crc, compresse = preparer_bloc(self.fichier_lu, self.offset_actuel, taille, self.compression)
+            # Plusieurs blocs incompressibles d'affilée : contenu déjà compressé, on n'essaie plus
+            self.essais_compression = ESSAIS_COMPRESSION if compresse else self.essais_compression - 1
+        if compresse:
+            pdu["compression"] = self.compression
+            if self.mode_binaire:
+                donnees = compresse
+            else:
+                pdu["data"] = base64.b64encode(compresse).decode("utf-8")
+                donnees = None
+        elif self.mode_binaire:
+            if crc is None:
+                crc = self.crc_envoi(taille)
+            donnees = PlageFichier(self.fichier_lu, self.offset_actuel, taille)
+        else:
+            # Gros fichier : tranche de la projection partagée ; sinon tampon de la session
+            vue = self.fichier_lu.vue(self.offset_actuel, taille)
+            if vue is None:
+                if self.tampon_bloc is None:
+                    self.tampon_bloc = bytearray(self.taille_bloc)
+                vue = memoryview(self.tampon_bloc)[:taille]
+                taille = self.fichier_lu.lire_dans(self.offset_actuel, vue)
+            with vue:
+                crc = crc_bloc(vue[:taille])
+                pdu["data"] = base64.b64encode(vue[:taille]).decode("utf-8")
+            donnees = None
+        # CRC du bloc décompressé, vérifié par le client
+        pdu["crc"] = crc
+        self.compter_bloc(LECTURE, taille)
+        self.offset_actuel += taille
+        if point_de_reprise:
+            self.marquer_reprise(self.offset_actuel)
+        return pdu, donnees, taille
+
+    def terminer_lecture(self):
+        """ Clôture un transfert arrivé en fin de fichier et libère le verrou """
+        logger_info(
+            f"Transfert terminé pour {self.fichier_selectionne} à {self.utilisateur_connecte}"
+        )
+        afficher(f"\n[\033[92mFIN\033[0m] Transfert terminé pour {self.fichier_selectionne}")
+        if self.fin_plage is None:
+            supprimer_reprise(self.utilisateur_connecte, self.fichier_selectionne, LECTURE, self.transfert)
+        self.clore_suivi(LECTURE, "termine")
+        self.fermer_lecture()
+        self.offset_actuel = 0
+        self.fin_plage = None
+        self.transfert = ""
+        self.fsm.transitionner("SELECTED")
+        return {K_STAT: "FIN", K_CODE: SUCCES, K_MESS: "Transfert terminé"}
+
+    def bloc_recu(self, parametres, donnees_recues):
+        """ Retourne le bloc d'une requête F-WRITE (brut ou base64) après contrôle de sa taille """
+        bloc = None
+        if donnees_recues:
+            bloc = donnees_recues
+        elif parametres.get("data"):
+            bloc = base64.b64decode(parametres["data"])
+        if bloc and parametres.get("compression"):
+            if parametres["compression"] != self.compression:
+                raise ValueError(f"Compression '{parametres['compression']}' non négociée")
+            bloc = decompresser(self.compression, bloc, self.taille_bloc)
+        if bloc and len(bloc) > self.taille_bloc:
+            raise ValueError(
+                f"Bloc de {len(bloc)} octets supérieur à la taille négociée ({self.taille_bloc})"
+            )
+        if "crc" in parametres and crc_bloc(bloc or b"") != parametres["crc"]:
+            raise ValueError("Bloc corrompu (CRC invalide)")
+        return bloc
+
+    def fermer_televersement(self):
+        """ Ferme le fichier du flux d'upload en cours et libère son verrou """
+        if self.televersement:
+            if self.televersement["fichier"]:
+                self.televersement["fichier"].close()
+            liberer(self.televersement["nom"], self)
+            self.televersement = None
+
+    def interrompre_televersement(self, message):
+        """ Arrête un flux d'upload sur erreur : le fichier temporaire est ramené à sa dernière partie
+        contiguë valide et le flux reste en erreur jusqu'à ce que le client conclue ("fin" ou "annuler")
+        Retourne la PDU de rejet, envoyée une seule fois """
+        televersement = self.televersement
+        fichier, televersement["fichier"] = televersement["fichier"], None
+        try:
+            fichier.truncate(televersement["valide"])
+            fichier.close()
+        except OSError:
+            pass  # Disque en erreur : une reprise repart de toute façon de la taille réelle du fichier
+        liberer(televersement["nom"], self)
+        televersement["erreur"] = message
+        enregistrer_reprise(
+            self.utilisateur_connecte, televersement["nom"], ECRITURE, televersement["valide"], televersement["transfert"]
+        )
+        self.clore_suivi(ECRITURE, "erreur")
+        logger_erreur(
+            f"Upload de '{televersement['nom']}' interrompu pour {self.utilisateur_connecte} à l'offset {televersement['valide']} : {message}"
+        )
+        return {K_STAT: "REJET", K_CODE: 500, K_MESS: message, "offset": televersement["valide"]}
+
+    def finaliser_ecriture(self, nom_f, parametres, transfert="", empreinte=None):
+        """ Termine un upload : publie le fichier reçu, libère le verrou et enregistre le propriétaire et les droits
+        Retourne l'empreinte du fichier publié (calculée depuis le fichier temporaire si elle n'est pas fournie)
+        Si le client a joint son empreinte ("empreinte") et qu'elle diffère, le fichier temporaire est écarté
+        et ValueError est levée sans rien publier """
+        partiel = chemin_partiel(self.utilisateur_connecte, nom_f, transfert)
+        if empreinte is None:
+            empreinte = self.empreinte_partielle(partiel, taille_partielle(partiel) or 0).hexdigest()
+        self.empreinte_ecriture = None
+        attendue = parametres.get("empreinte")
+        if attendue and attendue != empreinte:
+            # Le contenu reçu diffère de celui du client : rien n'est publié, l'original reste en place
+            supprimer_partiel(partiel)
+            supprimer_reprise(self.utilisateur_connecte, nom_f, ECRITURE, transfert)
+            liberer(nom_f, self)
+            self.clore_suivi(ECRITURE, "erreur")
+            raise ValueError(f"Empreinte de '{nom_f}' différente de celle du client : fichier non publié")
+        publier_partiel(partiel, nom_f)
+        liberer(nom_f, self)
+        self.clore_suivi(ECRITURE, "termine")
+        supprimer_reprise(self.utilisateur_connecte, nom_f, ECRITURE, transfert)
+
+        # Un fichier déjà connu conserve son propriétaire et ses droits
+        permissions_read = parametres.get("permissions_read", [])
+        permissions_delete = parametres.get("permissions_delete", [])
+        if self.utilisateur_connecte not in permissions_read:
+            permissions_read.append(self.utilisateur_connecte)
+        if self.utilisateur_connecte not in permissions_delete:
+            permissions_delete.append(self.utilisateur_connecte)
+        creer_meta(nom_f, self.utilisateur_connecte, permissions_read, permissions_delete)
+        enregistrer_empreinte(nom_f, empreinte, signature_document(nom_f))
+        indexer_fichier(nom_f)
+
+        logger_info(
+            f"[\033[92mWRITE\033[0m] Fichier '{nom_f}' uploadé par {self.utilisateur_connecte}"
+        )
+        afficher(f"[\033[92mWRITE\033[0m] Fichier '{nom_f}' uploadé par {self.utilisateur_connecte}")
+        return empreinte
+
+    # -----------------------------------------------------------------
+    # Primitives
+    # -----------------------------------------------------------------
+    def f_initialize(self, reponse, parametres, donnees_recues):
+        """Initialise la session et authentifie l'utilisateur."""
+        role = authentifier(parametres.get("user"), parametres.get("mdp"))
+        if role:
+            logger_info(
+                f"Authentification réussie pour {parametres.get('user')} (Rôle: {role}) depuis {self.addr}"
+            )
+            self.fsm.avancer(F_INITIALIZE)
+            self.role_user = role
+            self.utilisateur_connecte = parametres.get("user")
+            self.limiteur = creer_limiteur(self.utilisateur_connecte)
+            # Négociation du canal binaire (données brutes hors JSON)
+            self.mode_binaire = bool(parametres.get("binaire", False))
+            # Compression des blocs : premier algorithme proposé par le client que l'on connaît
+            self.compression = negocier(parametres.get("compression"))
+            # Négociation de la taille de bloc, bornée par le maximum du serveur
+            taille_proposee = parametres.get("taille_bloc")
+            if isinstance(taille_proposee, int) and taille_proposee > 0:
+                self.taille_bloc = max(TAILLE_BLOC_MIN, min(taille_proposee, TAILLE_BLOC_MAX))
+            afficher(
+                f"[\033[94mAUTH\033[0m] {self.utilisateur_connecte} connecté (Rôle: {role})"
+            )
+            reponse.update(
+                {
+                    K_STAT: "SUCCÈS",
+                    K_CODE: SUCCES,
+                    K_MESS: "Authentifié",
+                    "role": role,
+                    "binaire": self.mode_binaire,
+                    "taille_bloc": self.taille_bloc,
+                    "compression": self.compression,
+                }
+            )
+        else:
+            logger_erreur(
+                f"Échec d'authentification pour {parametres.get('user')} depuis {self.addr}"
+            )
+            reponse.update({K_CODE: ERREUR_AUTH, K_MESS: "Identifiants invalides"})
+        return reponse
+
+    def f_select(self, reponse, parametres, donnees_recues):
+        """Sélectionne un fichier ou liste le répertoire."""
+        nom_f = parametres.get("nom")
+        if nom_f == ".":
+            try:
+                logger_info(
+                    f"Liste des fichiers demandée par {self.utilisateur_connecte} depuis {self.addr}"
+                )
+                afficher(
+                    f"[\033[93mLIST\033[0m] Envoi de la liste des fichiers à {self.utilisateur_connecte}"
+                )
+                # Consultation de l'index de lecture, paginée pour borner la taille de la PDU
+                limite = parametres.get("limite") or TAILLE_PAGE_LISTE
+                fichiers_accessibles, suivant = lister_lisibles(
+                    self.utilisateur_connecte,
+                    prefixe=parametres.get("prefixe", ""),
+                    apres=parametres.get("apres"),
+                    limite=max(1, min(int(limite), TAILLE_PAGE_LISTE)),
+                )
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: "Liste des fichiers récupérée",
+                        "fichiers": fichiers_accessibles,
+                        "suivant": suivant,
+                    }
+                )
+            except Exception as e:
+                reponse.update({K_MESS: str(e)})
+        elif verifier_existence(nom_f):
+            if not peut_lire(self.utilisateur_connecte, nom_f):
+                reponse.update(
+                    {
+                        K_CODE: ERREUR_DROITS,
+                        K_MESS: "Vous n'avez pas les droits de lecture sur ce fichier",
+                    }
+                )
+            else:
+                logger_info(
+                    f"Fichier '{nom_f}' sélectionné par {self.utilisateur_connecte} depuis {self.addr}"
+                )
+                afficher(
+                    f"[\033[93mSELE\033[0m] {self.utilisateur_connecte} a sélectionné le fichier : {nom_f}"
+                )
+                # Une nouvelle sélection abandonne la lecture en cours et rend son verrou.
+                # Le résumé d'une reprise (F-RECOVER) du même fichier, encore sans bloc envoyé,
+                # reste ouvert : le F-OPEN qui suit le poursuit au lieu d'en écrire un second
+                if self.verrou_lecture:
+                    suivi = self.suivis.get(LECTURE)
+                    if not (suivi and suivi["fichier"] == nom_f and not suivi["blocs"]):
+                        self.clore_suivi(LECTURE, "interrompu")
+                    self.fermer_lecture()
+                self.fichier_selectionne = nom_f
+                self.fsm.avancer(F_SELECT)
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: f"Fichier {nom_f} sélectionné",
+                    }
+                )
+        else:
+            logger_erreur(
+                f"Fichier '{nom_f}' introuvable pour {self.utilisateur_connecte} depuis {self.addr}"
+            )
+            reponse.update({K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"})
+        return reponse
+
+    def f_open(self, reponse, parametres, donnees_recues):
+        """Prépare le fichier pour le transfert."""
+        if not self.verrouiller_lecture(self.fichier_selectionne):
+            reponse.update({K_CODE: ERREUR_VERROU, K_MESS: "Fichier en cours d'écriture"})
+            return reponse
+        try:
+            self.ouvrir_lecture()
+            empreinte = self.empreinte_lecture()
+        except OSError:
+            self.fermer_lecture()
+            reponse.update({K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"})
+            return reponse
+        if "transfert" in parametres:
+            self.transfert = str(parametres["transfert"])
+        self.fin_plage = None
+        self.demarrer_suivi(LECTURE, self.fichier_selectionne, self.offset_actuel)
+        logger_info(
+            f"Fichier '{self.fichier_selectionne}' ouvert pour {self.utilisateur_connecte} depuis {self.addr}"
+        )
+        afficher(f"[\033[32mOPEN\033[0m] Ouverture du fichier : {self.fichier_selectionne}")
+        self.fsm.avancer(F_OPEN)
+        reponse.update(
+            {
+                K_STAT: "SUCCÈS",
+                K_CODE: SUCCES,
+                K_MESS: "Fichier ouvert",
+                "taille": self.taille_lue,
+                "empreinte": empreinte,
+            }
+        )
+        return reponse
+
+    def f_read(self, reponse, parametres, donnees_recues):
+        """Envoie les données par blocs et sauvegarde l'offset."""
+        try:
+            if "offset" in parametres:
+                # Plage explicite (téléchargement parallèle) : [offset, offset + longueur[
+                self.offset_actuel = max(0, int(parametres["offset"]))
+                longueur = parametres.get("longueur")
+                self.fin_plage = self.offset_actuel + int(longueur) if longueur is not None else None
+                if LECTURE in self.suivis and not self.suivis[LECTURE]["blocs"]:
+                    self.suivis[LECTURE]["offset"] = self.offset_actuel
+                    if self.fin_plage is not None:
+                        self.suivis[LECTURE]["plage"] = [self.offset_actuel, self.fin_plage]
+            if parametres.get("flux"):
+                # Mode flux : les blocs partent à la suite, régulés par le crédit du client
+                fenetre = max(1, int(parametres.get("fenetre", FENETRE_FLUX)))
+                logger_info(
+                    f"[\033[92mREAD\033[0m] Flux ouvert pour {self.fichier_selectionne} (Offset: {self.offset_actuel}, Fenêtre: {fenetre})"
+                )
+                self.marquer_reprise(self.offset_actuel)
+                return FluxLecture(self, fenetre, parametres.get("blocs"))
+
+            offset = self.offset_actuel
+            pdu_bloc, self.donnees_reponse, taille = self.bloc_suivant()
+            if taille:
+                logger_bloc(
+                    F_READ,
+                    f"Bloc de {taille} octets envoyé pour {self.fichier_selectionne} à {self.utilisateur_connecte} (Offset: {offset})",
+                )
+                self.volume = taille
+                reponse.update(pdu_bloc)
+            else:
+                reponse.update(self.terminer_lecture())
+        except Exception as e:
+            reponse.update({K_MESS: f"Erreur lecture : {str(e)}"})
+        return reponse
+
+    def f_terminate(self, reponse, parametres, donnees_recues):
+        """Ferme proprement la session."""
+        logger_info(f"Déconnexion de {self.utilisateur_connecte} depuis {self.addr}")
+        self.fsm.avancer(F_TERMINATE)
+        self.terminee = True
+        reponse.update({K_STAT: "SUCCÈS", K_CODE: SUCCES, K_MESS: "Déconnexion"})
+        return reponse
+
+    def f_write(self, reponse, parametres, donnees_recues):
+        """Réception de fichiers."""
+        nom_f = parametres.get("nom")
+        fin = parametres.get("fin", False)
+        if nom_f and parametres.get("flux") and self.televersement:
+            # Un nouveau flux remplace le précédent, même resté en erreur. Celui-ci est fermé avant
+            # que le nouveau ne prenne son verrou, qui peut porter sur le même fichier
+            self.fermer_televersement()
+        televersement = self.televersement
+
+        if not nom_f:
+            reponse.update({K_CODE: 400, K_MESS: "Nom de fichier manquant"})
+            logger_erreur(
+                f"Nom de fichier manquant dans la requête F_WRITE de {self.utilisateur_connecte} depuis {self.addr}"
+            )
+        elif televersement and televersement["nom"] == nom_f and not parametres.get("flux"):
+            if televersement["erreur"]:
+                # Flux interrompu par une erreur : les blocs déjà en route sont écartés sans réponse
+                # jusqu'à ce que le client conclue ("fin" ou "annuler")
+                if not (fin or parametres.get("annuler")):
+                    return None
+                self.televersement = None
+                reponse.update(
+                    {
+                        K_STAT: "ANNULÉ",
+                        K_CODE: 500,
+                        K_MESS: televersement["erreur"],
+                        "offset": televersement["valide"],
+                    }
+                )
+                return reponse
+            if parametres.get("annuler"):
+                # Abandon demandé par le client : la partie reçue reste disponible pour une reprise
+                self.clore_suivi(ECRITURE, "annule")
+                self.fermer_televersement()
+                reponse.update(
+                    {
+                        K_STAT: "ANNULÉ",
+                        K_CODE: SUCCES,
+                        K_MESS: "Upload annulé",
+                        "offset": televersement["valide"],
+                    }
+                )
+                return reponse
+            # Bloc d'un flux d'upload : fichier déjà ouvert, droits et verrou déjà vérifiés
+            try:
+                bloc = self.bloc_recu(parametres, donnees_recues)
+                if bloc:
+                    televersement["fichier"].write(bloc)
+                    televersement["valide"] += len(bloc)
+                    televersement["empreinte"].update(bloc)
+                    self.compter_bloc(ECRITURE, len(bloc))
+                    televersement["recu"] += len(bloc)
+                    televersement["blocs"] += 1
+                    self.volume = len(bloc)
+                    enregistrer_reprise(
+                        self.utilisateur_connecte,
+                        nom_f,
+                        ECRITURE,
+                        televersement["valide"],
+                        televersement["transfert"],
+                    )
+            except Exception as e:
+                return self.interrompre_televersement(str(e))
+            if fin:
+                # Le verrou reste tenu jusqu'au renommage du fichier complet
+                recu = televersement["recu"]
+                televersement["fichier"].close()
+                self.televersement = None
+                try:
+                    empreinte = self.finaliser_ecriture(
+                        nom_f, parametres, televersement["transfert"], televersement["empreinte"].hexdigest()
+                    )
+                except Exception as e:
+                    self.clore_suivi(ECRITURE, "erreur")
+                    liberer(nom_f, self)
+                    partiel = chemin_partiel(self.utilisateur_connecte, nom_f, televersement["transfert"])
+                    reponse.update({K_CODE: 500, K_MESS: str(e), "offset": taille_partielle(partiel) or 0})
+                    return reponse
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: "Fichier uploadé",
+                        "recu": recu,
+                        "empreinte": empreinte,
+                    }
+                )
+            elif televersement["blocs"] % televersement["ack_tous"] == 0:
+                # Les blocs d'un flux d'upload ne sont acquittés que par lots
+                reponse = {
+                    K_STAT: "ACK",
+                    K_CODE: SUCCES,
+                    "blocs": televersement["blocs"],
+                    "recu": televersement["recu"],
+                }
+            else:
+                reponse = None
+        elif not peut_ecrire(self.utilisateur_connecte, nom_f):
+            logger_erreur(
+                f"Accès refusé pour l'écriture de '{nom_f}' par {self.utilisateur_connecte} depuis {self.addr}"
+            )
+            reponse.update({K_CODE: ERREUR_DROITS, K_MESS: "Pas les droits d'écriture"})
+        elif not acquerir_ecriture(nom_f, self):
+            reponse.update({K_CODE: ERREUR_VERROU, K_MESS: "Fichier en cours d'utilisation"})
+        elif parametres.get("flux"):
+            # Ouverture d'un flux d'upload : les blocs suivants ne sont acquittés que par lots.
+            # Le fichier est reçu à part et ne remplace l'original qu'à la fin ("offset" > 0 : reprise)
+            try:
+                transfert = str(parametres.get("transfert", ""))
+                partiel = chemin_partiel(self.utilisateur_connecte, nom_f, transfert)
+                offset = int(parametres.get("offset", 0))
+                deja_recu = taille_partielle(partiel) or 0
+                if offset > deja_recu:
+                    liberer(nom_f, self)
+                    reponse.update(
+                        {K_CODE: 409, K_MESS: "Offset de reprise invalide", "offset": deja_recu}
+                    )
+                    return reponse
+                fenetre = max(1, int(parametres.get("fenetre", FENETRE_FLUX)))
+                self.televersement = {
+                    "nom": nom_f,
+                    "fichier": ouvrir_partiel(partiel, offset),
+                    "blocs": 0,
+                    "recu": 0,
+                    "valide": offset,  # Fin de la partie contiguë correctement écrite
+                    "erreur": None,  # Message de l'erreur qui a interrompu le flux
+                    "ack_tous": max(1, fenetre // 2),
+                    "transfert": transfert,
+                    # Empreinte calculée au fil des blocs (partie déjà reçue relue une fois en reprise)
+                    "empreinte": self.empreinte_partielle(partiel, offset),
+                }
+                self.demarrer_suivi(ECRITURE, nom_f, offset, reprise=offset > 0)
+                logger_info(
+                    f"[\033[92mWRITE\033[0m] Flux d'upload ouvert pour '{nom_f}' par {self.utilisateur_connecte} depuis {self.addr} (Offset: {offset})"
+                )
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: "Flux d'upload ouvert",
+                        "ack_tous": self.televersement["ack_tous"],
+                        "offset": offset,
+                    }
+                )
+            except Exception as e:
+                liberer(nom_f, self)
+                reponse.update({K_CODE: 500, K_MESS: str(e)})
+        else:
+            try:
+                transfert = str(parametres.get("transfert", ""))
+                partiel = chemin_partiel(self.utilisateur_connecte, nom_f, transfert)
+                deja_recu = taille_partielle(partiel) or 0
+                # Sans "offset", le bloc fait suite à ceux que cette session vient d'envoyer pour ce transfert ;
+                # sinon c'est un nouvel upload : le fichier temporaire d'un upload interrompu est écarté.
+                # Une reprise passe par un "offset" explicite, contrôlé ci-dessous.
+                suite = self.empreinte_ecriture
+                offset = int(parametres.get("offset", suite[1] if suite and suite[0] == partiel else 0))
+                if offset > deja_recu:
+                    reponse.update(
+                        {K_CODE: 409, K_MESS: "Offset de reprise invalide", "offset": deja_recu}
+                    )
+                    return reponse
+
+                bloc = self.bloc_recu(parametres, donnees_recues)
+                suivi = self.suivis.get(ECRITURE)
+                if suivi is None or suivi["fichier"] != nom_f:
+                    self.demarrer_suivi(ECRITURE, nom_f, offset, reprise=offset > 0)
+                empreinte = self.empreinte_partielle(partiel, offset)
+                # Le fichier temporaire est ramené à offset octets même sans bloc (fin d'un nouvel upload vide)
+                with ouvrir_partiel(partiel, offset) as f:
+                    if bloc:
+                        f.write(bloc)
+                        offset = f.tell()
+                if bloc:
+                    self.volume = len(bloc)
+                    self.compter_bloc(ECRITURE, len(bloc))
+                    empreinte.update(bloc)
+                    enregistrer_reprise(self.utilisateur_connecte, nom_f, ECRITURE, offset, transfert)
+                self.empreinte_ecriture = (partiel, offset, empreinte)
+
+                if fin:
+                    reponse["empreinte"] = self.finaliser_ecriture(nom_f, parametres, transfert)
+
+                # HARMONISATION : Ajout de K_CODE: SUCCES pour valider le test
+                logger_bloc(
+                    F_WRITE,
+                    f"Bloc de données reçu pour '{nom_f}' de {self.utilisateur_connecte} depuis {self.addr} (Fin: {fin})",
+                )
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: "Bloc reçu" if not fin else "Fichier uploadé",
+                    }
+                )
+            except Exception as e:
+                reponse.update({K_CODE: 500, K_MESS: str(e)})
+        return reponse
+
+    def f_set_permissions(self, reponse, parametres, donnees_recues):
+        """Modification des droits."""
+        nom_f = parametres.get("nom")
+        if not verifier_existence(nom_f):
+            logger_erreur(
+                f"Fichier '{nom_f}' introuvable pour la modification des permissions par {self.utilisateur_connecte} depuis {self.addr}"
+            )
+            reponse.update({K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"})
+            return reponse
+
+        p_read = parametres.get("permissions_read", [])
+        p_delete = parametres.get("permissions_delete", [])
+        if self.utilisateur_connecte not in p_read:
+            p_read.append(self.utilisateur_connecte)
+        if self.utilisateur_connecte not in p_delete:
+            p_delete.append(self.utilisateur_connecte)
+
+        # Le contrôle du propriétaire est fait par la mise à jour elle-même
+        if not modifier_permissions(nom_f, self.utilisateur_connecte, p_read, p_delete):
+            reponse.update(
+                {
+                    K_CODE: ERREUR_DROITS,
+                    K_MESS: "Seul le propriétaire peut modifier",
+                }
+            )
+        else:
+            indexer_fichier(nom_f)
+
+            # HARMONISATION : Ajout de K_CODE: SUCCES
+            reponse.update(
+                {
+                    K_STAT: "SUCCÈS",
+                    K_CODE: SUCCES,
+                    K_MESS: f"Permissions mises à jour pour {nom_f}",
+                }
+            )
+            logger_info(
+                f"[INFO] Permissions modifiées pour {nom_f} par {self.utilisateur_connecte}"
+            )
+        return reponse
+
+    def f_recover(self, reponse, parametres, donnees_recues):
+        """Mécanisme de reprise."""
+        # Paramètres optionnels : "nom" et "transfert" ciblent un transfert précis,
+        # "sens" = "ecriture" interroge un upload au lieu d'un téléchargement
+        sens = ECRITURE if parametres.get("sens") == ECRITURE else LECTURE
+        contexte = lire_reprise(
+            self.utilisateur_connecte, parametres.get("nom"), sens, parametres.get("transfert")
+        )
+        if contexte and sens == LECTURE and not peut_lire(self.utilisateur_connecte, contexte["fichier"]):
+            contexte = None
+        if sens == ECRITURE and (contexte or parametres.get("nom")):
+            # Upload : l'offset confirmé est ce que le fichier temporaire contient réellement
+            contexte = contexte or {
+                "fichier": parametres["nom"],
+                "transfert": str(parametres.get("transfert", "")),
+            }
+            contexte["offset"] = taille_partielle(
+                chemin_partiel(self.utilisateur_connecte, contexte["fichier"], contexte["transfert"])
+            )
+            if contexte["offset"] is None:
+                contexte = None
+
+        if contexte and sens == ECRITURE:
+            # Simple consultation, l'état de la session ne change pas
+            reponse.update(
+                {
+                    K_STAT: "SUCCÈS",
+                    K_CODE: SUCCES,
+                    "fichier": contexte["fichier"],
+                    "transfert": contexte["transfert"],
+                    "offset": contexte["offset"],
+                    K_MESS: f"Reprise de l'upload à l'offset {contexte['offset']}",
+                }
+            )
+        elif contexte:
+            if not self.verrouiller_lecture(contexte["fichier"]):
+                reponse.update({K_CODE: ERREUR_VERROU, K_MESS: "Fichier en cours d'écriture"})
+                return reponse
+            self.fichier_selectionne = contexte["fichier"]
+            try:
+                self.ouvrir_lecture()
+                empreinte = self.empreinte_lecture()
+            except OSError:
+                self.fermer_lecture()
+                reponse.update({K_CODE: ERREUR_NON_TROUVE, K_MESS: "Fichier introuvable"})
+                return reponse
+            offset = min(contexte["offset"], self.taille_lue)
+            if contexte["empreinte"] and contexte["empreinte"] != empreinte:
+                # Le fichier a changé depuis l'interruption : la partie déjà reçue ne vaut plus rien
+                offset = 0
+            # CRC du dernier bloc avant l'offset : le client vérifie sa copie partielle sans tout relire
+            debut_crc = max(0, offset - self.taille_bloc)
+            self.offset_actuel = offset
+            self.fin_plage = None
+            self.transfert = contexte["transfert"]
+            self.demarrer_suivi(LECTURE, self.fichier_selectionne, offset, reprise=True)
+            logger_info(
+                f"[\033[35mRECO\033[0m] Demande de reprise pour {self.utilisateur_connecte} sur {self.fichier_selectionne}"
+            )
+            self.fsm.avancer(F_RECOVER)
+            reponse.update(
+                {
+                    K_STAT: "SUCCÈS",
+                    K_CODE: SUCCES,
+                    "fichier": self.fichier_selectionne,
+                    "transfert": self.transfert,
+                    "offset": self.offset_actuel,
+                    "taille": self.taille_lue,
+                    "empreinte": empreinte,
+                    "debut_crc": debut_crc,
+                    "crc": crc_bloc(self.fichier_lu.lire(debut_crc, offset - debut_crc)),
+                    K_MESS: f"Reprise à l'offset {self.offset_actuel}",
+                }
+            )
+        else:
+            reponse.update(
+                {
+                    K_CODE: ERREUR_NON_TROUVE,
+                    K_MESS: "Aucun contexte de reprise trouvé",
+                }
+            )
+        return reponse
+
+    def f_delete(self, reponse, parametres, donnees_recues):
+        """Suppression de fichier - Sécurité vérifiée en priorité."""
+        nom_f = parametres.get("nom")
+        logger_info(
+            f"[\033[91mDEL \033[0m] Requête de suppression : '{nom_f}' par {self.utilisateur_connecte}"
+        )
+
+        try:
+            if not peut_supprimer(self.utilisateur_connecte, nom_f):
+                reponse.update(
+                    {
+                        K_STAT: "ERREUR",
+                        K_CODE: ERREUR_DROITS,
+                        K_MESS: "Accès refusé : droits de suppression insuffisants",
+                    }
+                )
+
+            elif not verifier_existence(nom_f):
+                reponse.update(
+                    {
+                        K_STAT: "ERREUR",
+                        K_CODE: ERREUR_NON_TROUVE,  # Renvoie 404
+                        K_MESS: "Fichier introuvable sur le serveur",
+                    }
+                )
+            elif not acquerir_ecriture(nom_f, self, delai=0):
+                # Fichier lu ou écrit par une autre session : refus immédiat
+                reponse.update(
+                    {
+                        K_CODE: ERREUR_VERROU,
+                        K_MESS: "Fichier en cours d'utilisation",
+                    }
+                )
+            else:
+                try:
+                    supprimer_fichier(nom_f)
+                finally:
+                    liberer(nom_f, self)
+                desindexer_fichier(nom_f)
+                reponse.update(
+                    {
+                        K_STAT: "SUCCÈS",
+                        K_CODE: SUCCES,
+                        K_MESS: f"Fichier {nom_f} supprimé avec succès",
+                    }
+                )
+                logger_info(f"[INFO] Suppression réussie de {nom_f}")
+
+        except Exception as e:
+            reponse.update({K_CODE: 500, K_MESS: f"Erreur système: {str(e)}"})
+        return reponse
+
+    # Primitive -> méthode de traitement, toutes de signature (self, reponse, parametres, donnees_recues).
+    # Toute primitive autorisée par la machine à états (TABLE_ETATS) doit y figurer.
+    GESTIONNAIRES = {
+        F_INITIALIZE: f_initialize,
+        F_SELECT: f_select,
+        F_OPEN: f_open,
+        F_READ: f_read,
+        F_WRITE: f_write,
+        F_RECOVER: f_recover,
+        F_TERMINATE: f_terminate,
+        F_DELETE: f_delete,
+        F_SET_PERMISSIONS: f_set_permissions,
+    }
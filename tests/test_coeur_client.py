@@ -0,0 +1,69 @@
+"""
+Tests unitaires de la connexion du client (client/coeur_client.py)
+Le serveur est remplacé par une socket qui accepte les requêtes mais ne répond jamais.
+"""
+import socket
+import unittest
+
+from client.coeur_client import ClientFTAM
+from commun.constantes import F_DELETE, F_SELECT
+from commun.trames import LecteurTrames
+
+
+class SocketMuette:
+    """ Accepte tout ce qui est envoyé ; chaque lecture expire comme un serveur qui ne répond plus """
+
+    def __init__(self):
+        self.envoye = bytearray()
+        self.fermee = False
+
+    def settimeout(self, delai):
+        pass
+
+    def sendall(self, donnees, *drapeaux):
+        self.envoye += donnees
+
+    def recv(self, n):
+        raise socket.timeout
+
+    def recv_into(self, vue):
+        raise socket.timeout
+
+    def close(self):
+        self.fermee = True
+
+
+class TestTimeoutClient(unittest.TestCase):
+    def setUp(self):
+        self.sock = SocketMuette()
+        self.client = ClientFTAM()
+        self.client.socket = self.sock
+        self.client.lecteur = LecteurTrames(self.sock)
+        self.client.est_connecte = True
+        self.client.etat_actuel = "INITIALIZED"
+
+    def verifier_deconnecte(self):
+        self.assertTrue(self.sock.fermee)
+        self.assertIsNone(self.client.socket)
+        self.assertFalse(self.client.est_connecte)
+        self.assertEqual(self.client.etat_actuel, "IDLE")
+
+    def test_timeout_ferme_la_connexion(self):
+        """Une réponse attendue en vain ferme la connexion : aucune réponse tardive ne sera mal attribuée"""
+        res = self.client.envoyer_requete(F_SELECT, {"nom": "a.txt"})
+        self.assertIn("Timeout", res["erreur"])
+        self.verifier_deconnecte()
+        self.assertEqual(self.client.envoyer_requete(F_SELECT, {"nom": "b.txt"}), {"erreur": "Non connecté"})
+
+    def test_timeout_en_vol(self):
+        """Les requêtes pipelinées échouent toutes et la connexion est fermée"""
+        futurs = [self.client.soumettre(F_DELETE, {"nom": f"{i}.txt"}) for i in range(3)]
+        for futur in futurs:
+            self.assertIn("erreur", futur.result(timeout=5))
+        self.client.attendre_en_vol()
+        self.verifier_deconnecte()
+        self.assertEqual(self.client.soumettre(F_SELECT, {"nom": "a.txt"}).result(timeout=5), {"erreur": "Non connecté"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests unitaires de la compression des blocs (commun/compression.py)
+decompresser ne doit jamais produire plus que la taille de bloc négociée.
+"""
+import os
+import unittest
+import zlib
+
+from commun.compression import compresser, decompresser, negocier, zstandard
+
+TAILLE_BLOC = 64 * 1024
+
+
+class TestDecompressionBornee(unittest.TestCase):
+    def test_aller_retour(self):
+        donnees = b"FTAM " * (TAILLE_BLOC // 5)
+        compresse = compresser("zlib", donnees)
+        self.assertIsNotNone(compresse)
+        self.assertEqual(decompresser("zlib", compresse, TAILLE_BLOC), donnees)
+
+    def test_taille_exacte_acceptee(self):
+        donnees = bytes(TAILLE_BLOC)
+        self.assertEqual(decompresser("zlib", zlib.compress(donnees), TAILLE_BLOC), donnees)
+
+    def test_bombe_refusee(self):
+        """Quelques Ko qui se décompresseraient en 64 Mo sont refusés sans être développés"""
+        bombe = zlib.compress(bytes(64 * 1024 * 1024), 9)
+        self.assertLess(len(bombe), 128 * 1024)
+        with self.assertRaises(ValueError):
+            decompresser("zlib", bombe, TAILLE_BLOC)
+
+    def test_un_octet_de_trop(self):
+        with self.assertRaises(ValueError):
+            decompresser("zlib", zlib.compress(bytes(TAILLE_BLOC + 1)), TAILLE_BLOC)
+
+    def test_flux_tronque(self):
+        compresse = zlib.compress(os.urandom(1024) * 8)
+        with self.assertRaises(ValueError):
+            decompresser("zlib", compresse[:-8], TAILLE_BLOC)
+
+    def test_corrompu(self):
+        with self.assertRaises(zlib.error):
+            decompresser("zlib", b"pas du zlib", TAILLE_BLOC)
+
+    def test_algorithme_non_negocie(self):
+        with self.assertRaises(ValueError):
+            decompresser("lzma", b"", TAILLE_BLOC)
+        if zstandard is None:
+            with self.assertRaises(ValueError):
+                decompresser("zstd", b"", TAILLE_BLOC)
+
+    @unittest.skipIf(zstandard is None, "zstandard non installé")
+    def test_zstd_borne(self):
+        compresseur = zstandard.ZstdCompressor()
+        donnees = bytes(TAILLE_BLOC)
+        self.assertEqual(decompresser("zstd", compresseur.compress(donnees), TAILLE_BLOC), donnees)
+        with self.assertRaises(ValueError):
+            decompresser("zstd", compresseur.compress(bytes(TAILLE_BLOC + 1)), TAILLE_BLOC)
+        # Trame sans taille annoncée : la borne vient de max_output_size
+        sans_taille = zstandard.ZstdCompressor(write_content_size=False).compress(bytes(16 * TAILLE_BLOC))
+        with self.assertRaises(zstandard.ZstdError):
+            decompresser("zstd", sans_taille, TAILLE_BLOC)
+
+    def test_negocier(self):
+        self.assertEqual(negocier(["lzma", "zlib"]), "zlib")
+        self.assertIsNone(negocier(["lzma"]))
+        self.assertIsNone(negocier("zlib"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests unitaires de la pagination de l'index de lecture (serveur/gestion_droits.py)
+L'index est fourni directement : aucune base n'est ouverte.
+"""
+import unittest
+from unittest import mock
+
+from serveur import gestion_droits
+from serveur.gestion_droits import lister_lisibles
+
+NOMS = sorted(
+    ["a.txt", "b.txt", "rapport.pdf", "rapport_2025.pdf", "rapport_2026.pdf", "rapports/mai.txt", "rappel.txt", "z.bin"]
+)
+
+
+class TestListerLisibles(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(gestion_droits, "_index_a_jour", return_value={"salia": list(NOMS), "invite": []})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def parcourir(self, limite, prefixe=""):
+        """ Enchaîne les pages avec le curseur retourné, comme le fait le client """
+        pages, apres = [], None
+        while True:
+            page, apres = lister_lisibles("salia", prefixe, apres, limite)
+            pages.append(page)
+            if apres is None:
+                return pages
+
+    def test_sans_limite(self):
+        self.assertEqual(lister_lisibles("salia"), (NOMS, None))
+        self.assertEqual(lister_lisibles("invite"), ([], None))
+        self.assertEqual(lister_lisibles("inconnu"), ([], None))
+
+    def test_pages(self):
+        """Les pages se suivent sans doublon ni trou ; la dernière n'a pas de curseur"""
+        for limite in range(1, len(NOMS) + 2):
+            with self.subTest(limite=limite):
+                pages = self.parcourir(limite)
+                self.assertEqual([nom for page in pages for nom in page], NOMS)
+                self.assertTrue(all(len(page) <= limite for page in pages))
+
+    def test_page_exacte(self):
+        """Une page pleine n'annonce une suite que s'il reste des noms"""
+        page, suivant = lister_lisibles("salia", limite=len(NOMS))
+        self.assertEqual((page, suivant), (NOMS, None))
+        page, suivant = lister_lisibles("salia", limite=2)
+        self.assertEqual((page, suivant), (NOMS[:2], NOMS[1]))
+
+    def test_curseur_absent_de_l_index(self):
+        """Un curseur supprimé entre deux pages reprend au nom suivant"""
+        self.assertEqual(lister_lisibles("salia", apres="c.txt"), (NOMS[2:], None))
+        self.assertEqual(lister_lisibles("salia", apres="zz"), ([], None))
+
+    def test_prefixe(self):
+        attendus = ["rapport.pdf", "rapport_2025.pdf", "rapport_2026.pdf", "rapports/mai.txt"]
+        self.assertEqual(lister_lisibles("salia", "rapport"), (attendus, None))
+        self.assertEqual(lister_lisibles("salia", "rapports/"), (["rapports/mai.txt"], None))
+        self.assertEqual(lister_lisibles("salia", "absent"), ([], None))
+        for limite in (1, 3):
+            with self.subTest(limite=limite):
+                pages = self.parcourir(limite, "rapport")
+                self.assertEqual([nom for page in pages for nom in page], attendus)
+
+    def test_prefixe_et_curseur(self):
+        """Le curseur peut précéder le préfixe sans faire sortir la page du préfixe"""
+        self.assertEqual(lister_lisibles("salia", "rapport_", apres="b.txt"), (["rapport_2025.pdf", "rapport_2026.pdf"], None))
+        self.assertEqual(lister_lisibles("salia", "rapport_", apres="rapport_2025.pdf"), (["rapport_2026.pdf"], None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests unitaires de la machine à états (serveur/gestion_etats.py)
+La table compilée TABLE_ETATS doit autoriser exactement ce qu'autorisait l'ancienne cascade de if/elif.
+"""
+import unittest
+
+from commun.constantes import *
+from serveur.gestion_etats import TABLE_ETATS, TRANSITIONS, MachineEtats
+
+PRIMITIVES = [F_INITIALIZE, F_SELECT, F_OPEN, F_READ, F_RECOVER, F_TERMINATE, F_DELETE, F_WRITE, F_SET_PERMISSIONS]
+
+
+def _ancien_peut_executer(etat, primitive):
+    """ Règles d'origine de MachineEtats.peut_executer, recopiées telles quelles """
+    if primitive == F_INITIALIZE:
+        return etat == "IDLE"
+    elif primitive == F_SELECT:
+        return etat in ["INITIALIZED", "SELECTED", "OPEN"]
+    elif primitive == F_OPEN:
+        return etat == "SELECTED"
+    elif primitive == F_READ:
+        return etat == "OPEN"
+    elif primitive == F_RECOVER:
+        return etat in ["INITIALIZED", "SELECTED"]
+    elif primitive == F_TERMINATE:
+        return etat != "IDLE"
+    elif primitive == F_DELETE:
+        return etat in ["INITIALIZED", "SELECTED"]
+    elif primitive == F_WRITE:
+        return etat in ["INITIALIZED", "SELECTED"]
+    elif primitive == F_SET_PERMISSIONS:
+        return etat in ["INITIALIZED", "SELECTED"]
+    return False
+
+
+# État atteint après succès, tel que les gestionnaires l'appliquaient avec transitionner()
+ETAT_APRES_SUCCES = {
+    F_INITIALIZE: "INITIALIZED",
+    F_SELECT: "SELECTED",
+    F_OPEN: "OPEN",
+    F_RECOVER: "OPEN",
+    F_TERMINATE: "IDLE",
+}
+
+
+class TestGestionEtats(unittest.TestCase):
+    def machine(self, etat):
+        fsm = MachineEtats()
+        self.assertTrue(fsm.transitionner(etat))
+        return fsm
+
+    def test_table_identique_aux_regles(self):
+        """Chaque couple (état, primitive) est autorisé exactement comme avant"""
+        for etat in ETATS:
+            for primitive in PRIMITIVES + ["F-INCONNUE", None]:
+                with self.subTest(etat=etat, primitive=primitive):
+                    self.assertEqual(
+                        self.machine(etat).peut_executer(primitive),
+                        _ancien_peut_executer(etat, primitive),
+                    )
+
+    def test_table_compilee(self):
+        """TABLE_ETATS ne contient que des états connus et couvre toutes les primitives"""
+        self.assertEqual(set(TRANSITIONS), set(PRIMITIVES))
+        for (etat, primitive), suivant in TABLE_ETATS.items():
+            self.assertIn(etat, ETATS)
+            self.assertIn(suivant, ETATS + [None])
+
+    def test_avancer(self):
+        """avancer applique l'état atteint après succès, et rien d'autre"""
+        for etat in ETATS:
+            for primitive in PRIMITIVES:
+                with self.subTest(etat=etat, primitive=primitive):
+                    fsm = self.machine(etat)
+                    fsm.avancer(primitive)
+                    if _ancien_peut_executer(etat, primitive):
+                        attendu = ETAT_APRES_SUCCES.get(primitive, etat)
+                    else:
+                        attendu = etat
+                    self.assertEqual(fsm.etat_actuel, attendu)
+
+    def test_transitionner_refuse_etat_inconnu(self):
+        fsm = MachineEtats()
+        self.assertFalse(fsm.transitionner("FERME"))
+        self.assertEqual(fsm.etat_actuel, "IDLE")
+
+
+if __name__ == "__main__":
+    unittest.main()
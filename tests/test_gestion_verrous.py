@@ -0,0 +1,116 @@
+"""
+Tests unitaires du gestionnaire de verrous (serveur/gestion_verrous.py)
+Aucun serveur n'est nécessaire : les propriétaires sont de simples objets.
+"""
+import threading
+import time
+import unittest
+
+from commun.constantes import DELAI_VERROU
+from serveur.gestion_verrous import (
+    NB_FRAGMENTS,
+    acquerir_ecriture,
+    acquerir_lecture,
+    liberer,
+    liberer_tout,
+    statistiques_verrous,
+)
+from serveur.session import SessionFTAM
+
+
+class TestGestionVerrous(unittest.TestCase):
+    def setUp(self):
+        self.lecteur = object()
+        self.ecrivain = object()
+        self.tiers = object()
+
+    def tearDown(self):
+        liberer_tout(self.lecteur)
+        liberer_tout(self.ecrivain)
+        liberer_tout(self.tiers)
+
+    def test_reselection_rend_le_verrou(self):
+        """Une session qui ouvre un autre fichier rend le verrou de lecture du précédent"""
+        session = SessionFTAM(("test", 0))
+        try:
+            self.assertTrue(session.verrouiller_lecture("reselection_1.txt"))
+            self.assertTrue(session.verrouiller_lecture("reselection_2.txt"))
+            self.assertTrue(acquerir_ecriture("reselection_1.txt", self.ecrivain, delai=0))
+            self.assertFalse(acquerir_ecriture("reselection_2.txt", self.ecrivain, delai=0))
+            session.fermer_lecture()
+            self.assertTrue(acquerir_ecriture("reselection_2.txt", self.ecrivain, delai=0))
+        finally:
+            liberer_tout(session)
+
+    def test_reselection_meme_fichier(self):
+        """Rouvrir le même fichier garde le verrou de lecture"""
+        session = SessionFTAM(("test", 0))
+        try:
+            self.assertTrue(session.verrouiller_lecture("reselection.txt"))
+            self.assertTrue(session.verrouiller_lecture("reselection.txt"))
+            self.assertFalse(acquerir_ecriture("reselection.txt", self.ecrivain, delai=0))
+        finally:
+            liberer_tout(session)
+
+    def test_liberer(self):
+        """liberer rend le fichier à un écrivain"""
+        self.assertTrue(acquerir_lecture("liberer.txt", self.lecteur))
+        self.assertFalse(acquerir_ecriture("liberer.txt", self.ecrivain, delai=0))
+        liberer("liberer.txt", self.lecteur)
+        self.assertTrue(acquerir_ecriture("liberer.txt", self.ecrivain, delai=0))
+
+    def test_reentrance(self):
+        """Le même propriétaire reprend ses verrous sans se bloquer lui-même"""
+        self.assertTrue(acquerir_lecture("reentrance.txt", self.lecteur, delai=0))
+        self.assertTrue(acquerir_lecture("reentrance.txt", self.lecteur, delai=0))
+        # Seul lecteur : il peut passer en écriture, puis relire sous son propre verrou exclusif
+        self.assertTrue(acquerir_ecriture("reentrance.txt", self.lecteur, delai=0))
+        self.assertTrue(acquerir_ecriture("reentrance.txt", self.lecteur, delai=0))
+        self.assertTrue(acquerir_lecture("reentrance.txt", self.lecteur, delai=0))
+        self.assertFalse(acquerir_lecture("reentrance.txt", self.tiers, delai=0))
+        # Un seul liberer rend tout, quel que soit le nombre d'acquisitions
+        liberer("reentrance.txt", self.lecteur)
+        self.assertTrue(acquerir_ecriture("reentrance.txt", self.ecrivain, delai=0))
+
+    def test_delai_expire(self):
+        """Un écrivain bloqué abandonne après DELAI_VERROU secondes, sans laisser de trace"""
+        self.assertTrue(acquerir_lecture("delai.txt", self.lecteur))
+        debut = time.monotonic()
+        self.assertFalse(acquerir_ecriture("delai.txt", self.ecrivain))
+        duree = time.monotonic() - debut
+        self.assertGreaterEqual(duree, DELAI_VERROU)
+        self.assertLess(duree, DELAI_VERROU + 1)
+        # L'écrivain abandonné ne retient plus les nouveaux lecteurs
+        self.assertEqual(statistiques_verrous()["ecrivains_en_attente"], 0)
+        self.assertTrue(acquerir_lecture("delai.txt", self.tiers, delai=0))
+
+    def test_ecrivain_reveille(self):
+        """Un écrivain en attente obtient le verrou dès que le lecteur le rend"""
+        self.assertTrue(acquerir_lecture("reveil.txt", self.lecteur))
+        resultat = []
+        attente = threading.Thread(target=lambda: resultat.append(acquerir_ecriture("reveil.txt", self.ecrivain)))
+        attente.start()
+        time.sleep(0.1)
+        # Écrivain prioritaire : un nouveau lecteur doit attendre derrière lui
+        self.assertFalse(acquerir_lecture("reveil.txt", self.tiers, delai=0))
+        liberer("reveil.txt", self.lecteur)
+        attente.join(DELAI_VERROU)
+        self.assertEqual(resultat, [True])
+
+    def test_liberer_tout(self):
+        """liberer_tout rend les verrous d'une session sur tous les fragments, et seulement les siens"""
+        noms = [f"session_{i}.txt" for i in range(4 * NB_FRAGMENTS)]
+        for nom in noms:
+            self.assertTrue(acquerir_lecture(nom, self.lecteur, delai=0))
+        self.assertTrue(acquerir_ecriture("autre.txt", self.ecrivain, delai=0))
+        self.assertTrue(acquerir_lecture(noms[0], self.ecrivain, delai=0))
+        liberer_tout(self.lecteur)
+        for nom in noms[1:]:
+            self.assertTrue(acquerir_ecriture(nom, self.ecrivain, delai=0))
+        self.assertFalse(acquerir_ecriture("autre.txt", self.lecteur, delai=0))
+        liberer_tout(self.ecrivain)
+        self.assertEqual(statistiques_verrous(), {"fichiers": 0, "lecteurs": 0, "ecrivains": 0, "ecrivains_en_attente": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Tests unitaires de la limitation de débit (serveur/limiteur_debit.py)
+L'horloge est simulée : les délais calculés sont exacts et aucun test ne dort.
+"""
+import unittest
+from unittest import mock
+
+from serveur import limiteur_debit
+from serveur.limiteur_debit import LimiteurDebit, SeauJetons, creer_limiteur
+
+
+class HorlogeSimulee:
+    def __init__(self):
+        self.maintenant = 1000.0
+
+    def monotonic(self):
+        return self.maintenant
+
+
+class TestSeauJetons(unittest.TestCase):
+    def setUp(self):
+        self.horloge = HorlogeSimulee()
+        patch = mock.patch.object(limiteur_debit, "time", self.horloge)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_rafale_sans_delai(self):
+        """Le seau part plein : une rafale jusqu'à la capacité passe sans attente"""
+        seau = SeauJetons(1000, capacite=4000)
+        self.assertEqual(seau.consommer(3000), 0.0)
+        self.assertEqual(seau.consommer(1000), 0.0)
+
+    def test_delai_du_deficit(self):
+        """Le délai est le temps de regagner les jetons manquants au débit moyen"""
+        seau = SeauJetons(1000)
+        self.assertEqual(seau.consommer(1000), 0.0)
+        self.assertAlmostEqual(seau.consommer(500), 0.5)
+        # Le déficit se cumule tant que l'appelant n'a pas attendu
+        self.assertAlmostEqual(seau.consommer(500), 1.0)
+
+    def test_remplissage(self):
+        seau = SeauJetons(1000)
+        seau.consommer(1500)
+        self.horloge.maintenant += 0.5
+        self.assertEqual(seau.consommer(0), 0.0)
+        self.horloge.maintenant += 0.25
+        self.assertAlmostEqual(seau.consommer(500), 0.25)
+
+    def test_capacite_plafonnee(self):
+        """Une longue inactivité ne donne pas droit à plus d'une rafale"""
+        seau = SeauJetons(1000, capacite=2000)
+        self.horloge.maintenant += 3600
+        self.assertEqual(seau.consommer(2000), 0.0)
+        self.assertAlmostEqual(seau.consommer(1000), 1.0)
+
+    def test_debit_moyen(self):
+        """En respectant chaque délai, le débit obtenu est celui du seau"""
+        seau = SeauJetons(64 * 1024)
+        debut = self.horloge.maintenant
+        for _ in range(100):
+            self.horloge.maintenant += seau.consommer(16 * 1024)
+        # 100 blocs de 16 Kio à 64 Kio/s, dont 4 blocs servis par la rafale initiale
+        self.assertAlmostEqual(self.horloge.maintenant - debut, 24.0)
+
+    def test_plus_restrictif(self):
+        """Le limiteur d'une session applique le plus long des délais session et global"""
+        with mock.patch.object(limiteur_debit, "SEAU_GLOBAL", SeauJetons(1000)):
+            limiteur = LimiteurDebit(4000)
+            self.assertAlmostEqual(limiteur.consommer(2000), 1.0)
+        with mock.patch.object(limiteur_debit, "SEAU_GLOBAL", SeauJetons(8000)):
+            limiteur = LimiteurDebit(1000)
+            self.assertAlmostEqual(limiteur.consommer(2000), 1.0)
+        with mock.patch.object(limiteur_debit, "SEAU_GLOBAL", None):
+            self.assertEqual(LimiteurDebit(None).consommer(10 ** 9), 0.0)
+
+    def test_creer_limiteur(self):
+        """Pas de limiteur du tout pour une session sans aucun plafond"""
+        with mock.patch.object(limiteur_debit, "SEAU_GLOBAL", None):
+            with mock.patch.object(limiteur_debit, "debit_autorise", return_value=None):
+                self.assertIsNone(creer_limiteur("salia"))
+            with mock.patch.object(limiteur_debit, "debit_autorise", return_value=1000):
+                self.assertIsInstance(creer_limiteur("invite"), LimiteurDebit)
+        with mock.patch.object(limiteur_debit, "SEAU_GLOBAL", SeauJetons(1000)):
+            with mock.patch.object(limiteur_debit, "debit_autorise", return_value=None):
+                self.assertIsInstance(creer_limiteur("salia"), LimiteurDebit)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests unitaires du tramage (commun/trames.py)
+Les sockets simulées rendent les octets par petits morceaux, comme un lien TCP réel peut le faire.
+"""
+import socket
+import unittest
+
+from commun.constantes import TAILLE_MAX_TRAME
+from commun.trames import ENTETE_TRAME, ErreurTrame, LecteurTrames, _envoyer_morceaux, encoder_pdu, envoyer_pdu
+
+
+def trame(pdu, donnees=b""):
+    return encoder_pdu(pdu, len(donnees)) + donnees
+
+
+class SocketLente:
+    """ Rend le flux reçu par morceaux d'au plus `pas` octets, et n'envoie qu'une partie de chaque sendmsg """
+
+    def __init__(self, flux=b"", pas=1):
+        self.flux = bytearray(flux)
+        self.pas = pas
+        self.envoye = bytearray()
+
+    def recv(self, n):
+        morceau = bytes(self.flux[:min(n, self.pas)])
+        del self.flux[:len(morceau)]
+        return morceau
+
+    def recv_into(self, vue):
+        morceau = self.recv(len(vue))
+        vue[:len(morceau)] = morceau
+        return len(morceau)
+
+    def sendmsg(self, tampons):
+        reste = self.pas
+        for tampon in tampons:
+            morceau = bytes(tampon[:reste])
+            self.envoye += morceau
+            reste -= len(morceau)
+            if not reste:
+                break
+        return self.pas - reste
+
+
+class TestLecteurTrames(unittest.TestCase):
+    def test_octet_par_octet(self):
+        """Une trame reçue un octet à la fois est reconstituée, données comprises"""
+        sock = SocketLente(trame({"primitive": "F-READ", "offset": 3}, b"\x00\x01donnees"), pas=1)
+        pdu, donnees = LecteurTrames(sock).recevoir_trame()
+        self.assertEqual(pdu, {"primitive": "F-READ", "offset": 3})
+        self.assertEqual(bytes(donnees), b"\x00\x01donnees")
+        self.assertEqual(LecteurTrames(sock).recevoir_trame(), (None, None))
+
+    def test_trames_collees(self):
+        """Plusieurs trames arrivées d'un seul recv sont rendues une à une"""
+        flux = trame({"n": 1}) + trame({"n": 2}, b"abc") + trame({"n": 3}, bytes(100000))
+        for pas in (7, 4096, len(flux)):
+            with self.subTest(pas=pas):
+                lecteur = LecteurTrames(SocketLente(flux, pas), taille_recv=1024)
+                self.assertEqual(lecteur.recevoir_trame(), ({"n": 1}, None))
+                pdu, donnees = lecteur.recevoir_trame()
+                self.assertEqual((pdu, bytes(donnees)), ({"n": 2}, b"abc"))
+                pdu, donnees = lecteur.recevoir_trame()
+                self.assertEqual((pdu, bytes(donnees)), ({"n": 3}, bytes(100000)))
+                self.assertEqual(lecteur.recevoir_trame(), (None, None))
+
+    def test_fermeture_en_cours_de_trame(self):
+        """Une connexion coupée au milieu de l'en-tête, du JSON ou des données rend (None, None)"""
+        complete = trame({"primitive": "F-WRITE"}, b"0123456789")
+        for coupure in (1, ENTETE_TRAME.size - 1, ENTETE_TRAME.size + 3, len(complete) - 1):
+            with self.subTest(coupure=coupure):
+                lecteur = LecteurTrames(SocketLente(complete[:coupure], pas=3))
+                self.assertEqual(lecteur.recevoir_trame(), (None, None))
+
+    def test_trame_trop_volumineuse(self):
+        sock = SocketLente(ENTETE_TRAME.pack(16, TAILLE_MAX_TRAME), pas=2)
+        with self.assertRaises(ErreurTrame):
+            LecteurTrames(sock).recevoir_trame()
+
+    def test_envoi_partiel(self):
+        """Des sendmsg qui n'envoient que quelques octets ne perdent ni ne répètent rien"""
+        morceaux = [encoder_pdu({"n": 1}, 9), b"123456789", bytearray(b"suite"), memoryview(b"fin")]
+        for pas in (1, 5, 13, 1000):
+            with self.subTest(pas=pas):
+                sock = SocketLente(pas=pas)
+                _envoyer_morceaux(sock, morceaux)
+                self.assertEqual(bytes(sock.envoye), b"".join(bytes(m) for m in morceaux))
+
+    def test_aller_retour(self):
+        """Sur une vraie paire de sockets, avec un tampon de réception minuscule"""
+        gauche, droite = socket.socketpair()
+        with gauche, droite:
+            lecteur = LecteurTrames(droite, taille_recv=3)
+            envoyer_pdu(gauche, {"primitive": "F-OPEN"})
+            envoyer_pdu(gauche, {"primitive": "F-WRITE"}, memoryview(b"x" * 5000))
+            self.assertEqual(lecteur.recevoir_trame(), ({"primitive": "F-OPEN"}, None))
+            pdu, donnees = lecteur.recevoir_trame()
+            self.assertEqual((pdu, bytes(donnees)), ({"primitive": "F-WRITE"}, b"x" * 5000))
+            gauche.close()
+            self.assertEqual(lecteur.recevoir_trame(), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,8 +6,12 @@ import unittest
 import os
 import time
 import base64
+import hashlib
+import json
 from client.coeur_client import ClientFTAM
 from commun.constantes import *
+from commun.integrite import crc_bloc
+from commun.trames import envoyer_pdu
 
 
 class TestFTAM(unittest.TestCase):
@@ -95,8 +99,11 @@ class TestFTAM(unittest.TestCase):
 
         self.journaliser_echange("Validation de la primitive F-WRITE (Upload)", res_up)
         self.assertEqual(res_up.get(K_CODE), SUCCES)
+        self.assertEqual(res_up.get("empreinte"), hashlib.blake2b(bloc, digest_size=32).hexdigest())
         res_down = self.client.telecharger(nom_test)
         self.assertIn("succes", res_down)
+        with open(os.path.join("telechargements", self.user_admin, nom_test), "rb") as f:
+            self.assertEqual(f.read(), bloc, "Le fichier téléchargé diffère du fichier envoyé.")
         print("[SUCCÈS] Intégrité du transfert bidirectionnel confirmée")
 
     def test_05_mecanisme_reprise(self):
@@ -136,6 +143,220 @@ class TestFTAM(unittest.TestCase):
         finally:
             client_guest.quitter()
 
+    def test_08_requetes_pipelinees(self):
+        """Test : Plusieurs requêtes en vol sur une connexion, réponses associées par identifiant"""
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        params = {
+            "nom": "test_integration.txt",
+            "permissions_read": [self.user_admin, self.user_guest],
+            "permissions_delete": [self.user_admin],
+        }
+        futurs = [
+            self.client.soumettre(F_SELECT, {"nom": "absent_pipeline.txt"}),
+            self.client.soumettre(F_SELECT, {"nom": "."}),
+        ] + [self.client.soumettre(F_SET_PERMISSIONS, params) for _ in range(100)]
+        reponses = [futur.result(timeout=10) for futur in futurs]
+
+        self.assertEqual(reponses[0].get(K_CODE), ERREUR_NON_TROUVE)
+        self.assertIn("fichiers", reponses[1])
+        self.assertTrue(all(r.get(K_CODE) == SUCCES for r in reponses[2:]))
+        self.assertEqual(len({r.get(K_ID) for r in reponses}), len(futurs))
+        # La connexion reste utilisable en mode requête/réponse
+        self.assertEqual(self.client.envoyer_requete(F_SELECT, {"nom": "."}).get(K_CODE), SUCCES)
+        print("[SUCCÈS] Requêtes pipelinées associées à leurs réponses")
+
+    def test_09_upload_apres_interruption(self):
+        """Test : Un nouvel upload n'hérite pas du fichier temporaire d'un upload interrompu"""
+        nom_f = "test_upload_interrompu.txt"
+        client_coupe = ClientFTAM()
+        client_coupe.connecter(self.ip, self.user_admin, self.mdp_admin)
+        res = client_coupe.envoyer_requete(F_WRITE, {"nom": nom_f, "flux": True})
+        self.assertEqual(res.get(K_CODE), SUCCES)
+        client_coupe.envoyer_bloc({"nom": nom_f}, b"OLD-GARBAGE-" * 10)
+        client_coupe.socket.close()
+        time.sleep(0.5)
+
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        res_up = self.client.envoyer_requete(
+            F_WRITE, {"nom": nom_f, "data": base64.b64encode(b"NEW").decode("utf-8"), "fin": True}
+        )
+        self.assertEqual(res_up.get(K_CODE), SUCCES)
+        self.assertIn("succes", self.client.telecharger(nom_f))
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "rb") as f:
+            self.assertEqual(f.read(), b"NEW", "Le fichier publié contient les restes d'un upload interrompu.")
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Fichier temporaire d'un upload interrompu écarté")
+
+    def test_10_bloc_rejete_en_flux(self):
+        """Test : Un bloc rejeté arrête le flux d'upload sans laisser de trou dans le fichier reçu"""
+        nom_f = "test_bloc_rejete.txt"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        res = self.client.envoyer_requete(F_WRITE, {"nom": nom_f, "flux": True, "fenetre": 8})
+        self.assertEqual(res.get(K_CODE), SUCCES)
+        for bloc, crc in ((b"AAAA", None), (b"BBBB", 0), (b"CCCC", None), (b"DDDD", None)):
+            self.client.envoyer_bloc({"nom": nom_f, "crc": crc_bloc(bloc) if crc is None else crc}, bloc)
+        envoyer_pdu(self.client.socket, {K_PRIM: F_WRITE, K_PARA: {"nom": nom_f, "annuler": True}})
+
+        rejet = self.client.recevoir_reponse()
+        self.assertEqual((rejet.get(K_STAT), rejet.get("offset")), ("REJET", 4))
+        conclusion = self.client.recevoir_reponse()
+        self.assertEqual((conclusion.get(K_STAT), conclusion.get("offset")), ("ANNULÉ", 4))
+        self.assertEqual(self.client.offset_upload(nom_f), 4)
+
+        with open("test_local.txt", "wb") as f:
+            f.write(b"AAAABBBBCCCCDDDD")
+        self.assertIn("succes", self.client.reprendre_upload("test_local.txt", nom_f))
+        self.assertIn("succes", self.client.telecharger(nom_f))
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "rb") as f:
+            self.assertEqual(f.read(), b"AAAABBBBCCCCDDDD")
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Flux d'upload arrêté proprement au premier bloc rejeté")
+
+    def test_13_flux_relance_garde_le_verrou(self):
+        """Test : Un flux relancé sur le même fichier après un rejet garde son verrou d'écriture"""
+        nom_f = "test_flux_relance.txt"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        res = self.client.envoyer_requete(F_WRITE, {"nom": nom_f, "flux": True})
+        self.assertEqual(res.get(K_CODE), SUCCES)
+        self.client.envoyer_bloc({"nom": nom_f, "crc": crc_bloc(b"AAAA")}, b"AAAA")
+        self.client.envoyer_bloc({"nom": nom_f, "crc": 0}, b"BBBB")
+        rejet = self.client.recevoir_reponse()
+        self.assertEqual((rejet.get(K_STAT), rejet.get("offset")), ("REJET", 4))
+
+        # Nouveau flux sur le même fichier, sans conclure le précédent
+        res = self.client.envoyer_requete(F_WRITE, {"nom": nom_f, "flux": True, "offset": 4})
+        self.assertEqual(res.get(K_CODE), SUCCES)
+        autre = ClientFTAM()
+        try:
+            autre.connecter(self.ip, self.user_admin, self.mdp_admin)
+            res_autre = autre.envoyer_requete(
+                F_WRITE, {"nom": nom_f, "data": base64.b64encode(b"INTRUS").decode("utf-8"), "fin": True}
+            )
+            self.assertEqual(res_autre.get(K_CODE), ERREUR_VERROU, "Le flux relancé a perdu son verrou.")
+        finally:
+            autre.quitter()
+
+        self.client.envoyer_bloc({"nom": nom_f, "crc": crc_bloc(b"BBBB")}, b"BBBB")
+        envoyer_pdu(self.client.socket, {K_PRIM: F_WRITE, K_PARA: {"nom": nom_f, "fin": True}})
+        reponse = self.client.recevoir_reponse()
+        while reponse.get(K_STAT) == "ACK":
+            reponse = self.client.recevoir_reponse()
+        self.assertEqual(reponse.get(K_CODE), SUCCES)
+        self.assertIn("succes", self.client.telecharger(nom_f))
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "rb") as f:
+            self.assertEqual(f.read(), b"AAAABBBB")
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Verrou conservé par le flux relancé")
+
+    def test_11_empreinte_client_refusee(self):
+        """Test : Un upload dont l'empreinte diffère de celle du client n'est pas publié"""
+        nom_f = "test_empreinte_refusee.txt"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        params = {"nom": nom_f, "data": base64.b64encode(b"contenu").decode("utf-8"), "fin": True}
+        res_up = self.client.envoyer_requete(F_WRITE, dict(params, empreinte="0" * 64))
+        self.assertNotEqual(res_up.get(K_CODE), SUCCES)
+        self.assertEqual(self.client.envoyer_requete(F_SELECT, {"nom": nom_f}).get(K_CODE), ERREUR_NON_TROUVE)
+
+        empreinte = hashlib.blake2b(b"contenu", digest_size=32).hexdigest()
+        res_up = self.client.envoyer_requete(F_WRITE, dict(params, empreinte=empreinte))
+        self.assertEqual(res_up.get(K_CODE), SUCCES)
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Publication refusée sur empreinte différente")
+
+    def test_12_journal_reprise(self):
+        """Test : Un téléchargement repris laisse un seul résumé de reprise dans acces.log"""
+        nom_f = "test_journal_reprise.bin"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        contenu = os.urandom(3 * self.client.taille_bloc + 100)
+        with open("test_local.txt", "wb") as f:
+            f.write(contenu)
+        self.assertIn("succes", self.client.uploader("test_local.txt", nom_f))
+
+        # Téléchargement coupé après le premier bloc, dont le client a confirmé la réception
+        client_coupe = ClientFTAM()
+        client_coupe.connecter(self.ip, self.user_admin, self.mdp_admin)
+        client_coupe.envoyer_requete(F_SELECT, {"nom": nom_f})
+        client_coupe.envoyer_requete(F_OPEN)
+        res = client_coupe.envoyer_requete(F_READ, {"flux": True, "fenetre": 1})
+        bloc = client_coupe.extraire_bloc(res)
+        os.makedirs(os.path.join("telechargements", self.user_admin), exist_ok=True)
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "wb") as f:
+            f.write(bloc)
+        client_coupe.accorder_credit(1, len(bloc))
+        time.sleep(0.3)
+        client_coupe.socket.close()
+        time.sleep(0.5)
+
+        self.assertIn("succes", self.client.reprendre_telechargement(nom_f))
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "rb") as f:
+            self.assertEqual(f.read(), contenu)
+
+        # Le journal d'accès est écrit par un thread dédié : on attend le résumé final
+        for _ in range(20):
+            time.sleep(0.1)
+            with open("acces.log", encoding="utf-8") as f:
+                lectures = [
+                    r for r in map(json.loads, f)
+                    if r.get("fichier") == nom_f and r.get("sens") == "lecture"
+                ]
+            if any(r["statut"] == "termine" for r in lectures):
+                break
+        self.assertEqual([r["statut"] for r in lectures], ["interrompu", "termine"])
+        self.assertEqual(lectures[1]["reprises"], 1)
+        self.assertEqual(lectures[1]["offset"], len(bloc))
+        self.assertEqual(lectures[1]["octets"], len(contenu) - len(bloc))
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Reprise résumée en un seul enregistrement")
+
+    def test_14_empreinte_hors_ouverture(self):
+        """Test : F-OPEN n'attend pas l'empreinte d'un fichier modifié hors du serveur, calculée en arrière-plan"""
+        nom_f = "test_empreinte_differee.bin"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        with open("test_local.txt", "wb") as f:
+            f.write(b"version publiee")
+        self.assertIn("succes", self.client.uploader("test_local.txt", nom_f))
+
+        # Remplacé directement dans le stockage : l'empreinte enregistrée ne correspond plus
+        contenu = os.urandom(2 * self.client.taille_bloc + 10)
+        with open(os.path.join("serveur", "stockage", nom_f), "wb") as f:
+            f.write(contenu)
+        time.sleep(1.1)  # Validité du cache de stat du serveur
+        attendue = hashlib.blake2b(contenu, digest_size=32).hexdigest()
+
+        empreintes = []
+        for _ in range(20):
+            self.client.envoyer_requete(F_SELECT, {"nom": nom_f})
+            res_open = self.client.envoyer_requete(F_OPEN)
+            self.assertEqual(res_open.get(K_CODE), SUCCES)
+            empreintes.append(res_open.get("empreinte"))
+            if empreintes[-1] == attendue:
+                break
+            time.sleep(0.1)
+        self.assertIn(empreintes[0], (None, attendue))
+        self.assertEqual(empreintes[-1], attendue)
+        self.client.envoyer_requete(F_SELECT, {"nom": nom_f})
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Empreinte calculée hors de F-OPEN")
+
+    def test_15_parallele_repli(self):
+        """Test : Sans sessions supplémentaires, le téléchargement parallèle se replie sur la session courante"""
+        nom_f = "test_parallele_repli.bin"
+        self.client.connecter(self.ip, self.user_admin, self.mdp_admin)
+        contenu = os.urandom(3 * self.client.taille_bloc + 100)
+        with open("test_local.txt", "wb") as f:
+            f.write(contenu)
+        self.assertIn("succes", self.client.uploader("test_local.txt", nom_f))
+
+        # Les sessions supplémentaires échouent à l'authentification
+        self.client.mdp = "mauvais"
+        res = self.client.telecharger_parallele(nom_f, nb_flux=3)
+        self.assertIn("succes", res)
+        with open(os.path.join("telechargements", self.user_admin, nom_f), "rb") as f:
+            self.assertEqual(f.read(), contenu)
+        self.client.envoyer_requete(F_SELECT, {"nom": nom_f})
+        self.client.supprimer_fichier(nom_f)
+        print("[SUCCÈS] Repli sur un seul flux")
+
 
 if __name__ == "__main__":
     unittest.main()